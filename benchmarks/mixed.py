@@ -0,0 +1,143 @@
+# benchmarks/mixed.py
+# Tráfego misto no gunicorn: clientes leves (GET /books/<id>) medem latência
+# enquanto clientes pesados baixam /ml/training-data e enviam lotes grandes de
+# predições. Cada configuração roda duas fases — só tráfego leve e tráfego
+# misto — para mostrar quanto as rotas leves degradam sob carga pesada.
+#
+#   python -m benchmarks.mixed --rows 100000 --seconds 10
+#   python -m benchmarks.mixed --configs legacy default --heavy 4
+import argparse
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import requests
+
+from benchmarks.run import (
+    BENCH_PASS, BENCH_USER, REPO_ROOT, _free_port, _sample_ids, _wait_ready, child_env, summarize,
+)
+from benchmarks.synthetic import generate_silver
+
+# "legacy" reproduz o render.yaml anterior (gthread com 1 thread, sem executor);
+# "no_admission" é o padrão atual sem o controle de admissão
+CONFIGS = {
+    "legacy": {"GUNICORN_THREADS": "1", "BULK_WORKERS": "0", "ADMISSION_ENABLED": "0"},
+    "no_admission": {"ADMISSION_ENABLED": "0"},
+    "default": {},
+}
+
+def _light(base: str, ids: list[str], stop: threading.Event, out: list, errors: list) -> None:
+    s = requests.Session()
+    i = 0
+    while not stop.is_set():
+        t = time.perf_counter()
+        try:
+            r = s.get(f"{base}/api/v1/books/{ids[i % len(ids)]}", timeout=30)
+            ok = r.status_code < 400
+        except requests.RequestException:
+            ok = False
+        out.append(time.perf_counter() - t)
+        if not ok:
+            errors.append(1)
+        i += 1
+
+def _heavy(base: str, token: str, ids: list[str], n: int, kind: int,
+           stop: threading.Event, done: list, shed: list) -> None:
+    s = requests.Session()
+    s.headers["Authorization"] = f"Bearer {token}"
+    preds = {"model": "mixed", "predictions": [
+        {"id": ids[j % len(ids)], "y_pred": (j % 100) / 100} for j in range(n)
+    ]}
+    while not stop.is_set():
+        try:
+            if kind % 3 == 0:
+                r = s.post(f"{base}/api/v1/ml/predictions", json=preds, timeout=120)
+            elif kind % 3 == 1:
+                r = s.get(f"{base}/api/v1/ml/training-data?format=json", timeout=120,
+                          headers={"Accept-Encoding": "identity"})
+            else:
+                r = s.get(f"{base}/api/v1/ml/training-data", timeout=120,
+                          headers={"Accept-Encoding": "gzip"})
+        except requests.RequestException:
+            continue
+        if r.status_code in (429, 503):
+            # recusada pelo controle de admissão: espera o Retry-After, como um cliente bem-comportado
+            shed.append(1)
+            stop.wait(float(r.headers.get("Retry-After", 1)))
+        else:
+            done.append(1)
+
+def run_phase(base: str, token: str, ids: list[str], seconds: float, light: int,
+              heavy: int, batch: int) -> dict:
+    stop = threading.Event()
+    lat, errors, heavy_done, heavy_shed = [], [], [], []
+    threads = [threading.Thread(target=_light, args=(base, ids, stop, lat, errors)) for _ in range(light)]
+    threads += [threading.Thread(target=_heavy, args=(base, token, ids, batch, k, stop, heavy_done, heavy_shed))
+                for k in range(heavy)]
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+    res = summarize(lat, seconds, len(errors))
+    res["heavy_done"] = len(heavy_done)
+    res["heavy_shed"] = len(heavy_shed)
+    return res
+
+def run_config(name: str, silver_dir: Path, args) -> dict:
+    port = _free_port()
+    base = f"http://127.0.0.1:{port}"
+    with tempfile.TemporaryDirectory(prefix="bench-ml-") as ml_dir:
+        env = child_env(silver_dir, Path(ml_dir))
+        env.update({"PORT": str(port), "WEB_CONCURRENCY": str(args.workers)})
+        env.update(CONFIGS[name])
+        cmd = [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py",
+               "-b", f"127.0.0.1:{port}", "services.api.src.wsgi:app"]
+        proc = subprocess.Popen(cmd, cwd=REPO_ROOT, env=env,
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            _wait_ready(base, timeout=120)
+            token = requests.post(f"{base}/api/v1/auth/login",
+                                  json={"username": BENCH_USER, "password": BENCH_PASS}).json()["access_token"]
+            ids = _sample_ids(silver_dir)
+            # aquece caches (dataset, exportações) antes de medir
+            for fmt in ("csv", "json"):
+                requests.get(f"{base}/api/v1/ml/training-data?format={fmt}",
+                             headers={"Authorization": f"Bearer {token}"}, timeout=120)
+            return {
+                "light_only": run_phase(base, token, ids, args.seconds, args.light, 0, args.batch),
+                "mixed": run_phase(base, token, ids, args.seconds, args.light, args.heavy, args.batch),
+            }
+        finally:
+            proc.terminate()
+            try:
+                proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+
+def main():
+    ap = argparse.ArgumentParser(description="Latência das rotas leves sob tráfego pesado.")
+    ap.add_argument("--rows", type=int, default=100_000)
+    ap.add_argument("--configs", nargs="+", default=list(CONFIGS), choices=list(CONFIGS))
+    ap.add_argument("--seconds", type=float, default=10.0, help="duração de cada fase")
+    ap.add_argument("--light", type=int, default=4, help="clientes leves simultâneos")
+    ap.add_argument("--heavy", type=int, default=3, help="clientes pesados simultâneos")
+    ap.add_argument("--batch", type=int, default=5_000, help="predições por POST dos clientes pesados")
+    ap.add_argument("--workers", type=int, default=2)
+    args = ap.parse_args()
+
+    silver_dir = generate_silver(args.rows)
+    print(f"{'config':10} {'fase':12} {'n':>7} {'err':>5} {'rps':>8} {'p50 ms':>9} {'p95 ms':>9} "
+          f"{'p99 ms':>9} {'pesadas':>8} {'recusas':>8}")
+    for name in args.configs:
+        for phase, r in run_config(name, silver_dir, args).items():
+            print(f"{name:10} {phase:12} {r['n']:>7} {r['errors']:>5} {r['rps'] or 0:>8.1f} "
+                  f"{r['p50_ms']:>9.3f} {r['p95_ms']:>9.3f} {r['p99_ms']:>9.3f} {r['heavy_done']:>8} "
+                  f"{r['heavy_shed']:>8}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,356 @@
+# benchmarks/run.py
+# Benchmark da API: micro-benchmarks dos helpers + todos os endpoints via
+# test client do Flask (em processo) e via gunicorn local (HTTP real).
+# Cada combinação (modo, linhas) roda num processo filho com BOOKS_SILVER_DIR
+# apontando para a silver sintética, já que o caminho é lido no import.
+#
+#   python -m benchmarks.run --rows 1000 100000 --modes flask gunicorn
+#   python -m benchmarks.run --update-baseline
+import argparse
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Optional
+
+import numpy as np
+import pyarrow.parquet as pq
+import requests
+
+from benchmarks.synthetic import generate_silver
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+BASELINE_PATH = Path(__file__).resolve().parent / "baseline.json"
+
+BENCH_USER, BENCH_PASS = "bench", "bench"
+
+@dataclass
+class Scenario:
+    name: str
+    method: str
+    path: str
+    auth: bool = False
+    body: Optional[Callable[[int], dict]] = None
+    headers: dict = field(default_factory=dict)
+
+def scenarios(ids: list[str], rows: int) -> list[Scenario]:
+    """Um cenário por endpoint (alguns com variações de parâmetros relevantes)."""
+    pick = lambda i: ids[i % len(ids)]
+    last_page = max(rows // 20, 1)
+    preds = lambda i: {"model": "bench", "predictions": [
+        {"id": pick(i + j), "y_pred": (i + j) % 100 / 100} for j in range(100)
+    ]}
+    return [
+        Scenario("health", "GET", "/api/v1/health"),
+        Scenario("health_live", "GET", "/api/v1/health/live"),
+        Scenario("categories", "GET", "/api/v1/categories"),
+        Scenario("books", "GET", "/api/v1/books?size=20"),
+        Scenario("books_q", "GET", "/api/v1/books?q=love&size=20"),
+        Scenario("books_deep_page", "GET", f"/api/v1/books?page={last_page}&size=20"),
+        Scenario("books_cursor_first", "GET", "/api/v1/books?after=&size=20"),
+        Scenario("book_detail", "GET", "/api/v1/books/{id}"),
+        Scenario("book_similar", "GET", "/api/v1/books/{id}/similar?k=10"),
+        Scenario("books_batch_100", "POST", "/api/v1/books/batch",
+                 body=lambda i: {"ids": [pick(i + j) for j in range(100)]}),
+        Scenario("search", "GET", "/api/v1/books/search?title=night&category=fic&size=20"),
+        Scenario("search_ranked", "GET", "/api/v1/books/search?mode=ranked&title=the+nigh&size=20"),
+        Scenario("suggest", "GET", "/api/v1/books/suggest?prefix=the+ni&limit=10"),
+        Scenario("suggest_fuzzy", "GET", "/api/v1/books/suggest?prefix=nigth+lov&limit=10"),
+        Scenario("query_combined", "GET", "/api/v1/books/query?category=fic&min_price=20&max_price=30&min_rating=3&sort=-rating,price&size=20"),
+        Scenario("price_range", "GET", "/api/v1/books/price-range?min=20&max=30&size=20", auth=True),
+        Scenario("top_rated", "GET", "/api/v1/books/top-rated?min_rating=4&limit=10", auth=True),
+        Scenario("stats_categories", "GET", "/api/v1/stats/categories", auth=True),
+        Scenario("stats_overview", "GET", "/api/v1/stats/overview", auth=True),
+        Scenario("ml_features", "GET", "/api/v1/ml/features?size=100", auth=True),
+        Scenario("ml_features_csv", "GET", "/api/v1/ml/features?format=csv", auth=True),
+        Scenario("ml_training_csv", "GET", "/api/v1/ml/training-data", auth=True),
+        Scenario("ml_training_csv_gzip", "GET", "/api/v1/ml/training-data", auth=True,
+                 headers={"Accept-Encoding": "gzip"}),
+        Scenario("ml_training_csv_sample", "GET",
+                 "/api/v1/ml/training-data?sample=0.1&split=train&stratify=target_high_rating", auth=True),
+        Scenario("ml_predictions_post_100", "POST", "/api/v1/ml/predictions", auth=True, body=preds),
+        Scenario("ml_predictions_top", "GET", "/api/v1/ml/predictions/bench/top?n=10", auth=True),
+        Scenario("auth_login", "POST", "/api/v1/auth/login",
+                 body=lambda i: {"username": BENCH_USER, "password": BENCH_PASS}),
+    ]
+
+def summarize(latencies: list[float], wall: float, errors: int) -> dict:
+    lat = np.asarray(latencies) * 1000.0
+    return {
+        "n": int(len(lat)),
+        "errors": int(errors),
+        "rps": round(len(lat) / wall, 1) if wall > 0 else None,
+        "p50_ms": round(float(np.percentile(lat, 50)), 3),
+        "p95_ms": round(float(np.percentile(lat, 95)), 3),
+        "p99_ms": round(float(np.percentile(lat, 99)), 3),
+    }
+
+def _num_rows(silver_dir: Path) -> int:
+    return pq.read_metadata(silver_dir / "books.parquet").num_rows
+
+def _sample_ids(silver_dir: Path, k: int = 500) -> list[str]:
+    ids = pq.read_table(silver_dir / "books.parquet", columns=["id"]).column("id").to_pylist()
+    step = max(len(ids) // k, 1)
+    return ids[::step][:k]
+
+# --- micro-benchmarks dos helpers (no processo filho) ---
+def run_micro(repeat: int) -> dict:
+    from flask_jwt_extended import verify_jwt_in_request
+    from services.api.src.app import create_app
+    from services.api.utils import helpers
+    from services.api.utils.auth import verify_jwt
+    from services.api.utils.pagination import make_sorted_view
+
+    df = helpers._read_books_df()
+    app = create_app()
+    token = app.test_client().post("/api/v1/auth/login", json={
+        "username": BENCH_USER, "password": BENCH_PASS}).get_json()["access_token"]
+    auth_ctx = app.test_request_context(headers={"Authorization": f"Bearer {token}"})
+    auth_ctx.push()
+    cases = {
+        "read_books_df": helpers._read_books_df,
+        "load_books_df_cached": helpers.load_books_df,
+        # pushdown na silver particionada: uma categoria, só as colunas da listagem
+        "read_silver_one_category": lambda: helpers.read_silver(
+            columns=helpers.LIST_COLS, categories=[helpers.silver_categories()[0]]),
+        "project_list": lambda: helpers.project_list(df),
+        "sort_title_view": lambda: make_sorted_view(helpers.project_list(df), "title"),
+        "build_ml_features": lambda: helpers.build_ml_features(df),
+        "to_dict_100": lambda: df.head(100).to_dict(orient="records"),
+        # custo de autenticação por requisição: decodificação completa x cache de tokens
+        "jwt_verify_full": verify_jwt_in_request,
+        "jwt_verify_cached": verify_jwt,
+    }
+    out = {}
+    for name, fn in cases.items():
+        fn()
+        lat = []
+        t0 = time.perf_counter()
+        for _ in range(repeat):
+            t = time.perf_counter()
+            fn()
+            lat.append(time.perf_counter() - t)
+        out[f"micro/{name}"] = summarize(lat, time.perf_counter() - t0, 0)
+    auth_ctx.pop()
+    return out
+
+# --- test client do Flask (no processo filho) ---
+def run_flask(silver_dir: Path, requests_per: int, warmup: int) -> dict:
+    from services.api.src.app import create_app
+
+    app = create_app()
+    client = app.test_client()
+    token = client.post("/api/v1/auth/login",
+                        json={"username": BENCH_USER, "password": BENCH_PASS}).get_json()["access_token"]
+    ids = _sample_ids(silver_dir)
+    rows = _num_rows(silver_dir)
+
+    # a readiness aquece dataset e índices em segundo plano; mede só depois
+    deadline = time.monotonic() + 120
+    while client.get("/api/v1/health/ready").status_code != 200:
+        if time.monotonic() > deadline:
+            raise RuntimeError("API não ficou pronta a tempo")
+        time.sleep(0.05)
+
+    results = {}
+    for sc in scenarios(ids, rows):
+        headers = dict(sc.headers)
+        if sc.auth:
+            headers["Authorization"] = f"Bearer {token}"
+
+        def call(i: int) -> int:
+            path = sc.path.replace("{id}", ids[i % len(ids)])
+            body = sc.body(i) if sc.body else None
+            return client.open(path, method=sc.method, json=body, headers=headers).status_code
+
+        for i in range(warmup):
+            call(i)
+        lat, errors = [], 0
+        t0 = time.perf_counter()
+        for i in range(requests_per):
+            t = time.perf_counter()
+            status = call(i)
+            lat.append(time.perf_counter() - t)
+            errors += status >= 400
+        results[sc.name] = summarize(lat, time.perf_counter() - t0, errors)
+    return results
+
+# --- gunicorn local (HTTP real, concorrente) ---
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def _wait_ready(base: str, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if requests.get(f"{base}/api/v1/health", timeout=2).status_code < 500:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("gunicorn não ficou pronto a tempo")
+
+def run_gunicorn(silver_dir: Path, requests_per: int, warmup: int, concurrency: int,
+                 workers: int, threads: int, env: dict) -> dict:
+    port = _free_port()
+    base = f"http://127.0.0.1:{port}"
+    cmd = [sys.executable, "-m", "gunicorn", "-w", str(workers), "-k", "gthread",
+           "--threads", str(threads), "-b", f"127.0.0.1:{port}", "services.api.src.wsgi:app"]
+    proc = subprocess.Popen(cmd, cwd=REPO_ROOT, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        _wait_ready(base, timeout=120)
+        token = requests.post(f"{base}/api/v1/auth/login",
+                              json={"username": BENCH_USER, "password": BENCH_PASS}).json()["access_token"]
+        ids = _sample_ids(silver_dir)
+        rows = _num_rows(silver_dir)
+
+        results = {}
+        for sc in scenarios(ids, rows):
+            headers = dict(sc.headers)
+            if sc.auth:
+                headers["Authorization"] = f"Bearer {token}"
+            sessions: dict[int, requests.Session] = {}
+
+            def call(i: int) -> tuple[float, int]:
+                s = sessions.setdefault(threading.get_ident(), requests.Session())
+                path = sc.path.replace("{id}", ids[i % len(ids)])
+                body = sc.body(i) if sc.body else None
+                t = time.perf_counter()
+                r = s.request(sc.method, base + path, json=body, headers=headers)
+                return time.perf_counter() - t, r.status_code
+
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                list(pool.map(call, range(warmup)))
+                t0 = time.perf_counter()
+                out = list(pool.map(call, range(requests_per)))
+                wall = time.perf_counter() - t0
+            results[sc.name] = summarize([o[0] for o in out], wall, sum(o[1] >= 400 for o in out))
+        return results
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+# --- orquestração ---
+def child_env(silver_dir: Path, ml_dir: Path) -> dict:
+    env = dict(os.environ)
+    env.update({
+        "BOOKS_SILVER_DIR": str(silver_dir),
+        "ML_DATA_DIR": str(ml_dir),
+        "JWT_REVOKED_PATH": str(ml_dir / "revoked.txt"),
+        # todos os clientes do benchmark saem do mesmo IP: sem token bucket
+        "ADMISSION_RATE": "0",
+        "ADMIN_USER": BENCH_USER,
+        "ADMIN_PASS": BENCH_PASS,
+        "PYTHONPATH": str(REPO_ROOT) + os.pathsep + env.get("PYTHONPATH", ""),
+    })
+    return env
+
+def run_child(args) -> None:
+    """Executado no processo filho: imprime o JSON de resultados na última linha."""
+    silver_dir = Path(os.environ["BOOKS_SILVER_DIR"])
+    if args.modes == ["flask"]:
+        res = run_micro(args.micro_repeat) if args.micro_repeat else {}
+        res.update(run_flask(silver_dir, args.requests, args.warmup))
+    else:
+        res = run_gunicorn(silver_dir, args.requests, args.warmup, args.concurrency,
+                           args.workers, args.threads, dict(os.environ))
+    print(json.dumps(res))
+
+def compare(results: dict, baseline: dict, tolerance: float, floor_ms: float) -> list[str]:
+    """Regressão: p95 acima de (1+tol)·baseline (e acima do ruído) ou rps abaixo de (1-tol)·baseline."""
+    regressions = []
+    for key, cur in results.items():
+        base = baseline.get(key)
+        if not base:
+            continue
+        if cur["p95_ms"] > base["p95_ms"] * (1 + tolerance) and cur["p95_ms"] - base["p95_ms"] > floor_ms:
+            regressions.append(f"{key}: p95 {base['p95_ms']:.2f} -> {cur['p95_ms']:.2f} ms")
+        if base.get("rps") and cur.get("rps") and cur["rps"] < base["rps"] * (1 - tolerance) \
+                and not key.startswith("micro/"):
+            regressions.append(f"{key}: rps {base['rps']:.0f} -> {cur['rps']:.0f}")
+    return regressions
+
+def print_table(title: str, res: dict) -> None:
+    print(f"\n== {title}")
+    print(f"{'endpoint':32} {'n':>6} {'err':>4} {'rps':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for name, r in res.items():
+        print(f"{name:32} {r['n']:>6} {r['errors']:>4} {r['rps'] or 0:>9.1f} "
+              f"{r['p50_ms']:>9.3f} {r['p95_ms']:>9.3f} {r['p99_ms']:>9.3f}")
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark da API de livros.")
+    ap.add_argument("--rows", type=int, nargs="+", default=[1_000])
+    ap.add_argument("--modes", nargs="+", default=["flask"], choices=["flask", "gunicorn"])
+    ap.add_argument("--requests", type=int, default=200, help="requisições medidas por endpoint")
+    ap.add_argument("--warmup", type=int, default=10)
+    ap.add_argument("--concurrency", type=int, default=8, help="clientes simultâneos (gunicorn)")
+    ap.add_argument("--workers", type=int, default=2)
+    ap.add_argument("--threads", type=int, default=4)
+    ap.add_argument("--micro-repeat", type=int, default=20, help="0 desativa os micro-benchmarks")
+    ap.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    ap.add_argument("--update-baseline", action="store_true")
+    ap.add_argument("--tolerance", type=float, default=0.25)
+    ap.add_argument("--noise-floor-ms", type=float, default=0.5)
+    ap.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.child:
+        run_child(args)
+        return
+
+    all_results: dict[str, dict] = {}
+    for rows in args.rows:
+        silver_dir = generate_silver(rows)
+        for mode in args.modes:
+            with tempfile.TemporaryDirectory(prefix="bench-ml-") as ml_dir:
+                cmd = [sys.executable, "-m", "benchmarks.run", "--child", "--modes", mode,
+                       "--requests", str(args.requests), "--warmup", str(args.warmup),
+                       "--concurrency", str(args.concurrency), "--workers", str(args.workers),
+                       "--threads", str(args.threads), "--micro-repeat", str(args.micro_repeat)]
+                out = subprocess.run(cmd, cwd=REPO_ROOT, env=child_env(silver_dir, Path(ml_dir)),
+                                     capture_output=True, text=True)
+            if out.returncode != 0:
+                print(out.stderr, file=sys.stderr)
+                raise SystemExit(f"[ERRO] benchmark {mode}/{rows} falhou")
+            res = json.loads(out.stdout.strip().splitlines()[-1])
+            print_table(f"{mode} | {rows} linhas", res)
+            all_results.update({f"{mode}/{rows}/{k}": v for k, v in res.items()})
+
+    if args.update_baseline:
+        baseline = json.loads(args.baseline.read_text()) if args.baseline.exists() else {"results": {}}
+        baseline["results"].update(all_results)
+        baseline["meta"] = {
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "updated_at": time.strftime("%Y-%m-%d"),
+        }
+        args.baseline.write_text(json.dumps(baseline, indent=2, sort_keys=True) + "\n")
+        print(f"\n[OK] baseline atualizada: {args.baseline}")
+        return
+
+    if args.baseline.exists():
+        baseline = json.loads(args.baseline.read_text()).get("results", {})
+        regressions = compare(all_results, baseline, args.tolerance, args.noise_floor_ms)
+        if regressions:
+            print("\n[REGRESSÃO]")
+            for r in regressions:
+                print("  " + r)
+            raise SystemExit(1)
+        print("\n[OK] sem regressões em relação à baseline")
+
+if __name__ == "__main__":
+    main()
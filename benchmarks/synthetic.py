@@ -0,0 +1,132 @@
+# benchmarks/synthetic.py
+# Gera silvers sintéticas com o mesmo esquema de clean_books.py (REQUIRED_COLS + book_title).
+import argparse
+import hashlib
+import json
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+BENCH_DATA_DIR = Path(__file__).resolve().parent / ".data"
+
+# vocabulário já normalizado (minúsculas, ASCII), como _normalize_text deixa os títulos
+WORDS = (
+    "the a of and in to love night house secret garden war peace history life "
+    "world city dark light girl boy king queen star sea river stone fire shadow "
+    "blood heart time lost road home winter summer book last first little great "
+    "story dream song wild black white red blue golden silent mountain island "
+    "journey storm moon sun empire ghost voice glass iron paper letters"
+).split()
+
+CATEGORIES = (
+    "travel mystery historical fiction sequential art classics philosophy romance "
+    "womens fiction fiction childrens religion nonfiction music default science fiction "
+    "sports and games add a comment fantasy new adult young adult science poetry "
+    "paranormal art psychology autobiography parenting adult fiction humor horror "
+    "history food and drink christian fiction business biography thriller contemporary "
+    "spirituality academic self help historical christian suspense short stories "
+    "novels health politics cultural erotica crime"
+).split()
+
+def synthetic_books(rows: int, seed: int = 42) -> pd.DataFrame:
+    """DataFrame com `rows` livros sintéticos (determinístico para um `seed`)."""
+    rng = np.random.default_rng(seed)
+    words = np.array(WORDS, dtype=object)
+
+    n_words = rng.integers(1, 9, size=rows)
+    picks = rng.integers(0, len(words), size=int(n_words.sum()))
+    bounds = np.concatenate([[0], np.cumsum(n_words)])
+    titles = [" ".join(words[picks[bounds[i]:bounds[i + 1]]]) for i in range(rows)]
+
+    slugs = [t.replace(" ", "-") for t in titles]
+    ids = [f"{slug}_{i}" for i, slug in enumerate(slugs)]
+    urls = [f"https://books.toscrape.com/catalogue/{i}/index.html" for i in ids]
+    upc = [f"{x:016x}" for x in rng.integers(0, 2**63, size=rows)]
+
+    df = pd.DataFrame({
+        "id": pd.array(ids, dtype="string"),
+        "title": pd.array(titles, dtype="string"),
+        "book_title": pd.array(titles, dtype="string"),
+        "category": pd.array(rng.choice(CATEGORIES, size=rows), dtype="string"),
+        "price": np.round(rng.uniform(10, 60, size=rows), 2),
+        "rating": rng.integers(0, 6, size=rows).astype("int64"),
+        "instock": pd.array(rng.integers(0, 23, size=rows), dtype="Int64"),
+        "UPC": pd.array(upc, dtype="string"),
+        "product_url": pd.array(urls, dtype="string"),
+        "image_url": pd.array([u.replace("index.html", "cover.jpg") for u in urls], dtype="string"),
+        "image_path": pd.array([None] * rows, dtype="string"),
+    })
+    return df
+
+def write_partitioned(df: pd.DataFrame, out_dir: Path, row_group_rows: int = 16_384) -> None:
+    """Mesmo layout de clean_books.py: category=<valor>/part-0.parquet, ordenado por title/id."""
+    table = pa.Table.from_pandas(df.sort_values(["category", "title", "id"], kind="stable"), preserve_index=False)
+    ds.write_dataset(
+        table, out_dir, format="parquet",
+        partitioning=ds.partitioning(pa.schema([("category", pa.string())]), flavor="hive"),
+        basename_template="part-{i}.parquet",
+        max_rows_per_group=row_group_rows,
+        preserve_order=True,
+        existing_data_behavior="delete_matching",
+    )
+
+def write_index_sidecars(df: pd.DataFrame, parquet: Path, out_dir: Path) -> None:
+    """Mesmos sidecars de clean_books.py (layout em services/api/utils/sidecars.py)."""
+    d = df.reset_index(drop=True)
+    first = np.flatnonzero((~d["id"].duplicated(keep="first") & d["id"].notna()).to_numpy())
+    hashes = pd.util.hash_array(d["id"].astype(object).to_numpy()[first])
+    by_hash = np.argsort(hashes, kind="stable")
+    codes, labels = pd.factorize(d["category"].astype(object).to_numpy(), sort=True)
+    arrays = {
+        "order_title": d.sort_values(["title", "id"], kind="stable").index.to_numpy(np.int64),
+        "order_price": d[d["price"].notna()].sort_values(["price", "title", "id"], kind="stable")
+                       .index.to_numpy(np.int64),
+        "id_hash": hashes[by_hash],
+        "id_pos": first[by_hash].astype(np.int64),
+        "category_codes": codes.astype(np.int32),
+    }
+    out_dir.mkdir(parents=True, exist_ok=True)
+    for name, arr in arrays.items():
+        np.save(out_dir / f"{name}.npy", arr)
+    (out_dir / "category_labels.json").write_text(json.dumps([str(c) for c in labels]), encoding="utf-8")
+    with open(parquet, "rb") as f:
+        sha = hashlib.file_digest(f, "sha256").hexdigest()
+    manifest = {"format": 1, "dataset": {"file": parquet.name, "rows": int(len(d)),
+                                         "size": parquet.stat().st_size, "sha256": sha}}
+    (out_dir / "manifest.json").write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+
+def generate_silver(rows: int, out_dir: Path | None = None, seed: int = 42, csv: bool = False) -> Path:
+    """
+    Grava books.parquet, books_by_category/ e books_index/ (e opcionalmente
+    books.csv) em `out_dir`; reaproveita o que já existir.
+    """
+    out_dir = Path(out_dir or BENCH_DATA_DIR / f"silver_{rows}")
+    out_dir.mkdir(parents=True, exist_ok=True)
+    parquet = out_dir / "books.parquet"
+    parts = out_dir / "books_by_category"
+    index = out_dir / "books_index"
+    if (not parquet.exists() or not parts.is_dir() or not (index / "manifest.json").exists()
+            or (csv and not (out_dir / "books.csv").exists())):
+        df = synthetic_books(rows, seed)
+        df.to_parquet(parquet, index=False)
+        write_partitioned(df, parts)
+        write_index_sidecars(df, parquet, index)
+        if csv:
+            df.to_csv(out_dir / "books.csv", index=False, encoding="utf-8")
+    return out_dir
+
+def main():
+    ap = argparse.ArgumentParser(description="Gera silvers sintéticas para benchmark.")
+    ap.add_argument("--rows", type=int, nargs="+", default=[1_000, 100_000, 1_000_000])
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--csv", action="store_true", help="também grava books.csv")
+    args = ap.parse_args()
+    for rows in args.rows:
+        out = generate_silver(rows, seed=args.seed, csv=args.csv)
+        print(f"[OK] {rows} linhas: {out}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,14 @@
+# gunicorn.conf.py
+# Configuração de produção (render.yaml: gunicorn -c gunicorn.conf.py ...).
+# Com gthread, cada worker atende até `threads` requisições ao mesmo tempo;
+# o padrão do gunicorn é 1 thread, o que deixa um download grande bloquear
+# todas as rotas leves do worker. Trabalho pesado ainda passa pelo executor
+# dedicado (BULK_WORKERS por worker; ver services/api/utils/offload.py).
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", 2))
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", 8))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 120))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", 5))
@@ -1,23 +1,57 @@
-from flask import Flask, jsonify, request, redirect
+from flask import Flask, jsonify, request, redirect, g, copy_current_request_context
+from flask.json.provider import DefaultJSONProvider
+import numpy as np
 import pandas as pd
 import os
+import threading
+from collections import OrderedDict
 from datetime import timedelta
 from dotenv import load_dotenv
 from pathlib import Path
-import json
-import time
 from flask_jwt_extended import (
     JWTManager, create_access_token, create_refresh_token,
-    jwt_required, get_jwt, get_jwt_identity
+    get_jwt, get_jwt_identity
 )
-from services.api.utils.helpers import load_books_df, project_list, dataset_path, REQUIRED_COLS, build_ml_features
+from services.api.utils.helpers import (
+    load_books_df, project_list, build_ml_features,
+    sorted_books, sorted_ml_features, book_lookup, with_catalog, dataset_version, cached_for_version,
+    search_index, suggester, query_index, similarity_index,
+    books_in_categories, silver_categories, change_log, book_history, ML_SOURCE_COLS,
+)
+from services.api.utils.changes import iter_changes
+from services.api.utils.history import HistoryError, iso, parse_instant
+from services.api.utils.sampling import SamplingError, parse_sampling, select_rows
+from services.api.utils.admission import AdmissionController, classify, retry_after_header
+from services.api.utils.auth import (
+    jwt_required, verify_jwt, revoke_current_token, token_identity, install as install_revocation
+)
+from services.api.utils.health import readiness, validate_dataset
+from services.api.utils.metrics import timed, start_request, finish_request, render_prometheus
+from services.api.utils.pagination import CursorError, cursor_page
+from services.api.utils.query import FACET_FIELDS, QueryError, parse_sort
+from services.api.utils.profiling import ProfilerBusy, RequestProfiler, WORKER_SAMPLER
+from services.api.utils.predictions import (
+    INDEX_CACHE_SIZE as PREDICTION_INDEX_CACHE_SIZE, MODEL_NAME_RE, get_prediction_sink, get_prediction_index,
+    has_predictions, orphan_wals, prediction_model_dir, validate_predictions,
+)
+from services.api.utils.compression import negotiate_encoding, compress_response, cached_payload, payload_ready
+from services.api.utils.offload import BulkTimeout, CommitGate, get_bulk_executor
 from flask_cors import CORS
+from werkzeug.middleware.proxy_fix import ProxyFix
 from flasgger import Swagger
 
 load_dotenv()
 
+class TimedJSONProvider(DefaultJSONProvider):
+    """jsonify medido como etapa "jsonify" (Server-Timing e /metrics)."""
+
+    def response(self, *args, **kwargs):
+        with timed("jsonify"):
+            return super().response(*args, **kwargs)
+
 def create_app() -> Flask:
     app = Flask(__name__)
+    app.json = TimedJSONProvider(app)
 
     app.config['SWAGGER'] = {
         'title': 'API Pública de Livros - Tech Challenge',
@@ -47,6 +81,175 @@ def create_app() -> Flask:
     app.config["JWT_ACCESS_TOKEN_EXPIRES"] = timedelta(minutes=30)
     app.config["JWT_REFRESH_TOKEN_EXPIRES"] = timedelta(days=7)
     jwt = JWTManager(app)
+    install_revocation(jwt)
+
+    # limite de ids por chamada em /books/batch
+    app.config["BATCH_MAX_IDS"] = int(os.getenv("BATCH_MAX_IDS", 500))
+
+    # compressão negociada (gzip/deflate); respostas menores que o mínimo vão sem compressão
+    app.config["COMPRESS_LEVEL"] = int(os.getenv("COMPRESS_LEVEL", 6))
+    app.config["COMPRESS_MIN_SIZE"] = int(os.getenv("COMPRESS_MIN_SIZE", 1024))
+
+    # instrumentação: Server-Timing por resposta e histogramas em /metrics
+    app.before_request(start_request)
+    app.after_request(finish_request)
+
+    # controle de admissão: limite de simultâneas por classe de rota (cheap,
+    # heavy, bulk) + token bucket por cliente; recusa rápido com Retry-After
+    app.config.setdefault("ADMISSION_ENABLED", os.getenv("ADMISSION_ENABLED", "1") != "0")
+    admission = AdmissionController(
+        limits={
+            "cheap": int(os.getenv("ADMISSION_CHEAP_LIMIT", 32)),
+            "heavy": int(os.getenv("ADMISSION_HEAVY_LIMIT", 4)),
+            "bulk": int(os.getenv("ADMISSION_BULK_LIMIT", 2)),
+        },
+        costs={"cheap": 1.0, "heavy": 5.0, "bulk": 20.0},
+        rate=float(os.getenv("ADMISSION_RATE", 50)),
+        burst=float(os.getenv("ADMISSION_BURST", 100)),
+        retry_after=float(os.getenv("ADMISSION_RETRY_AFTER", 1)),
+    )
+
+    # X-Forwarded-For só é confiável nos hops do proxy da frente (no Render, 1);
+    # request.remote_addr passa a ser o IP que esse proxy viu
+    proxy_hops = int(os.getenv("TRUSTED_PROXY_HOPS", 1))
+    if proxy_hops > 0:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=proxy_hops)
+
+    def admission_client() -> str:
+        """Chave do token bucket: identidade do JWT ou, sem token válido, o IP da conexão."""
+        identity = token_identity()
+        if identity is not None:
+            return f"user:{identity}"
+        return f"ip:{request.remote_addr or '-'}"
+
+    @app.before_request
+    def admit_request():
+        if not app.config["ADMISSION_ENABLED"]:
+            return None
+        klass = classify(request.endpoint)
+        if klass is None:
+            return None
+        status, wait = admission.admit(klass, admission_client())
+        if status is None:
+            g._admission_class = klass
+            return None
+        msg = "limite de requisições excedido" if status == 429 else f"servidor ocupado (classe {klass})"
+        resp = jsonify({"error": msg, "class": klass})
+        resp.status_code = status
+        resp.headers["Retry-After"] = retry_after_header(wait)
+        return resp
+
+    @app.teardown_request
+    def release_admission(_exc=None):
+        klass = g.pop("_admission_class", None)
+        if klass is not None:
+            admission.release(klass)
+
+    @app.get("/metrics")
+    def prometheus_metrics():
+        """
+        Métricas no formato Prometheus.
+        Histogramas de duração por rota e por etapa (load, filter, sort,
+        serialize, jsonify, jwt), leituras do dataset e hits/misses de cache.
+        Cada worker expõe o próprio registro (label 'pid').
+        ---
+        tags:
+          - Status
+        responses:
+          200:
+            description: Texto no formato de exposição do Prometheus.
+        """
+        return app.response_class(render_prometheus(), mimetype="text/plain; version=0.0.4")
+
+    @app.after_request
+    def compress(response):
+        encoding = negotiate_encoding(request.headers.get("Accept-Encoding"))
+        return compress_response(
+            response, encoding,
+            app.config["COMPRESS_LEVEL"], app.config["COMPRESS_MIN_SIZE"],
+        )
+
+    # trabalho pesado (geração de exportações, uploads grandes) roda no executor
+    # dedicado, com no máximo BULK_WORKERS tarefas simultâneas por worker
+    app.config.setdefault("BULK_TIMEOUT", float(os.getenv("BULK_TIMEOUT", 120)))
+    app.config.setdefault("BULK_OFFLOAD_MIN_ROWS", int(os.getenv("BULK_OFFLOAD_MIN_ROWS", 1000)))
+    app.config.setdefault("BULK_RETRY_AFTER", float(os.getenv("BULK_RETRY_AFTER", 5)))
+    bulk_executor = get_bulk_executor()
+
+    @app.errorhandler(BulkTimeout)
+    def bulk_timeout(e: BulkTimeout):
+        """Tarefa pesada fora do prazo: 503 com Retry-After, em vez de 500."""
+        msg = ("ainda em processamento; tente de novo" if e.in_progress
+               else "não processado (nada foi gravado); reenvie")
+        resp = jsonify({"error": f"tarefa pesada excedeu BULK_TIMEOUT: {msg}", "in_progress": e.in_progress})
+        resp.status_code = 503
+        resp.headers["Retry-After"] = retry_after_header(app.config["BULK_RETRY_AFTER"])
+        return resp
+
+    def bulk_response(key: str, build, mimetype: str, variant: bool = False):
+        """
+        Exportação em massa servida do cache (já comprimida) da versão atual.
+        `variant=True` para chaves montadas com parâmetros do cliente (LRU limitado).
+        """
+        encoding = negotiate_encoding(request.headers.get("Accept-Encoding"))
+        level, min_size = app.config["COMPRESS_LEVEL"], app.config["COMPRESS_MIN_SIZE"]
+        if payload_ready(key, encoding, level, min_size):
+            body, encoding = cached_payload(key, encoding, level, min_size, build, variant)
+        else:
+            payload = copy_current_request_context(
+                lambda: cached_payload(key, encoding, level, min_size, build, variant))
+            with timed("bulk"):
+                body, encoding = bulk_executor.run(
+                    payload, key=(key, encoding, level, dataset_version()), timeout=app.config["BULK_TIMEOUT"],
+                )
+        resp = app.response_class(body, mimetype=mimetype)
+        resp.vary.add("Accept-Encoding")
+        if encoding is not None:
+            resp.headers["Content-Encoding"] = encoding
+        return resp
+
+    def cursor_response(view, size: int, mask=None, lo: int = 0, hi=None, extra=None):
+        """Resposta no modo cursor (?after=): seek direto na ordem pré-calculada."""
+        try:
+            with timed("seek"):
+                page_df, next_cursor = cursor_page(view, request.args.get("after"), size, mask, lo, hi)
+        except CursorError as e:
+            return jsonify({"error": str(e)}), 400
+        with timed("serialize"):
+            items = page_df.to_dict(orient="records")
+        return jsonify({
+            **(extra or {}),
+            "items": items,
+            "size": size,
+            "next_cursor": next_cursor,
+        })
+
+    def requested_facets() -> list[str]:
+        """?facets=category,rating,price_bucket -> lista validada (QueryError se inválida)."""
+        fields = [f.strip() for f in request.args.get("facets", "").split(",") if f.strip()]
+        if any(f not in FACET_FIELDS for f in fields):
+            raise QueryError(f"facets: use {', '.join(FACET_FIELDS)}")
+        return fields
+
+    def facet_counts(positions, fields: list[str]) -> dict:
+        """Contagens das facetas sobre as posições casadas (ordem de sorted_books("title"))."""
+        with timed("aggregate"):
+            return query_index().facets(np.asarray(positions, dtype=np.int64), fields)
+
+    def history_range() -> tuple:
+        """?from=&to= (data ou ISO 8601) -> (início, fim) em epoch s (HistoryError se inválido)."""
+        start = parse_instant(request.args.get("from"))
+        end = parse_instant(request.args.get("to"), end=True)
+        if start is not None and end is not None and start > end:
+            raise HistoryError("'from' deve ser anterior a 'to'")
+        return start, end
+
+    def history_points(frame: pd.DataFrame) -> list[dict]:
+        with timed("serialize"):
+            points = frame.astype(object).where(frame.notna(), None).to_dict(orient="records")
+            for p in points:
+                p["ts"] = iso(p["ts"])
+        return points
 
     ADMIN_USER = os.getenv("ADMIN_USER")
     ADMIN_PASS = os.getenv("ADMIN_PASS")
@@ -59,7 +262,65 @@ def create_app() -> Flask:
         if claims.get("role") != "admin":
             return jsonify({"msg": "admin only"}), 403
         return None
-    
+
+    # profiling sob demanda (admin): ?profile=1|text|pstats|sample ou header X-Profile
+    PROFILE_MODES = {"1": "text", "text": "text", "pstats": "pstats", "sample": "sample"}
+
+    @app.before_request
+    def start_profile():
+        flag = request.args.get("profile") or request.headers.get("X-Profile")
+        if not flag or flag == "0":
+            return None
+        mode = PROFILE_MODES.get(flag.lower())
+        if mode is None:
+            return jsonify({"error": "profile deve ser 1, text, pstats ou sample"}), 400
+        verify_jwt()
+        not_admin = assert_admin()
+        if not_admin:
+            return not_admin
+        try:
+            g._profile_limit = max(int(request.args.get("profile_limit", 40)), 1)
+        except ValueError:
+            return jsonify({"error": "'profile_limit' deve ser inteiro"}), 400
+        profiler = RequestProfiler(mode)
+        try:
+            profiler.start()
+        except ProfilerBusy as e:
+            return jsonify({"error": str(e)}), 409
+        g._profiler = profiler
+        return None
+
+    @app.teardown_request
+    def release_profile(_exc=None):
+        # requisição que terminou sem passar pelo after_request: libera o profiler
+        profiler = g.pop("_profiler", None)
+        if profiler is not None:
+            profiler.stop()
+
+    @app.after_request
+    def finish_profile(response):
+        profiler = g.pop("_profiler", None)
+        if profiler is None:
+            return response
+        profiler.stop()
+
+        filename = None
+        if profiler.mode == "pstats":
+            body, mimetype, filename = profiler.pstats_dump(), "application/octet-stream", "profile.pstats"
+        elif profiler.mode == "sample":
+            body, mimetype, filename = profiler.folded(), "text/plain", "profile.folded"
+        else:
+            sort = request.args.get("profile_sort", "cumulative")
+            if sort not in {"cumulative", "tottime", "ncalls", "time"}:
+                sort = "cumulative"
+            body, mimetype = profiler.text(sort, g.get("_profile_limit", 40)), "text/plain"
+
+        out = app.response_class(body, mimetype=mimetype)
+        out.headers["X-Profiled-Status"] = str(response.status_code)
+        if filename:
+            out.headers["Content-Disposition"] = f"attachment; filename={filename}"
+        return out
+
     @app.get("/")
     def root_redirect():
         """
@@ -149,6 +410,28 @@ def create_app() -> Flask:
         new_access = create_access_token(identity=username, additional_claims=additional_claims)
         return jsonify({"access_token": new_access})
 
+    @app.post("/api/v1/auth/logout")
+    @jwt_required()
+    def auth_logout():
+        """
+        Revoga o access_token usado na chamada.
+        O jti do token entra na lista de revogação (compartilhada entre os
+        workers via arquivo) e ele passa a ser recusado com 401, inclusive por
+        quem já o tinha no cache de tokens verificados.
+        ---
+        tags:
+          - Autenticação
+        security:
+          - Bearer: []
+        responses:
+          200:
+            description: Token revogado.
+          401:
+            description: Token ausente, inválido ou já revogado.
+        """
+        revoke_current_token()
+        return jsonify({"msg": "token revogado"})
+
     @app.post("/api/v1/scraping/trigger")
     @jwt_required()
     def trigger_scraping():
@@ -175,18 +458,165 @@ def create_app() -> Flask:
         
         return jsonify({"msg": "trigger recebido (stub). Em produção chamaria o job ETL."}), 202
 
+    @app.post("/api/v1/admin/profiler/start")
+    @jwt_required()
+    def profiler_start():
+        """
+        [Admin] Inicia o amostrador de pilhas deste worker.
+        Amostra as pilhas de todas as threads ativas (ignorando as ociosas)
+        durante 'seconds' segundos, a cada 'interval_ms'. O resultado fica
+        disponível em GET /api/v1/admin/profiler. Requer token de admin.
+        ---
+        tags:
+          - Admin
+        security:
+          - Bearer: []
+        parameters:
+          - name: seconds
+            in: query
+            type: number
+            required: false
+            default: 30
+            description: Janela de amostragem (máx. 600).
+          - name: interval_ms
+            in: query
+            type: number
+            required: false
+            default: 10
+            description: Intervalo entre amostras (mín. 1).
+        responses:
+          202:
+            description: Amostragem iniciada.
+          403:
+            description: Acesso negado (usuário não é admin).
+          409:
+            description: Já existe uma amostragem em execução.
+        """
+        not_admin = assert_admin()
+        if not_admin:
+            return not_admin
+        try:
+            seconds = min(max(float(request.args.get("seconds", 30)), 0.1), 600.0)
+            interval = max(float(request.args.get("interval_ms", 10)), 1.0) / 1000
+        except ValueError:
+            return jsonify({"error": "'seconds' e 'interval_ms' devem ser numéricos"}), 400
+        try:
+            WORKER_SAMPLER.start(seconds, interval)
+        except RuntimeError as e:
+            return jsonify({"error": str(e)}), 409
+        return jsonify({"pid": os.getpid(), **WORKER_SAMPLER.status()}), 202
+
+    @app.post("/api/v1/admin/profiler/stop")
+    @jwt_required()
+    def profiler_stop():
+        """
+        [Admin] Interrompe o amostrador de pilhas deste worker.
+        ---
+        tags:
+          - Admin
+        security:
+          - Bearer: []
+        responses:
+          200:
+            description: Amostragem encerrada.
+          403:
+            description: Acesso negado (usuário não é admin).
+        """
+        not_admin = assert_admin()
+        if not_admin:
+            return not_admin
+        WORKER_SAMPLER.stop()
+        return jsonify({"pid": os.getpid(), **WORKER_SAMPLER.status()})
+
+    @app.get("/api/v1/admin/profiler")
+    @jwt_required()
+    def profiler_report():
+        """
+        [Admin] Resultado do amostrador de pilhas deste worker.
+        Em JSON, lista as funções mais quentes (amostras no topo da pilha e
+        em qualquer nível). Com format=folded, retorna as pilhas agregadas
+        no formato do flamegraph.pl / speedscope.
+        ---
+        tags:
+          - Admin
+        security:
+          - Bearer: []
+        parameters:
+          - name: top
+            in: query
+            type: integer
+            required: false
+            default: 30
+          - name: format
+            in: query
+            type: string
+            required: false
+            default: "json"
+            enum: ["json", "folded"]
+        responses:
+          200:
+            description: Funções mais quentes ou arquivo folded.
+          400:
+            description: Parâmetro 'top' inválido.
+          403:
+            description: Acesso negado (usuário não é admin).
+        """
+        not_admin = assert_admin()
+        if not_admin:
+            return not_admin
+        if request.args.get("format", "json").lower() == "folded":
+            resp = app.response_class(WORKER_SAMPLER.folded(), mimetype="text/plain")
+            resp.headers["Content-Disposition"] = "attachment; filename=worker.folded"
+            return resp
+        try:
+            top = max(int(request.args.get("top", 30)), 1)
+        except ValueError:
+            return jsonify({"error": "'top' deve ser inteiro"}), 400
+        return jsonify({"pid": os.getpid(), **WORKER_SAMPLER.status(), "top": WORKER_SAMPLER.top(top)})
+
+    @app.get("/api/v1/health/live")
+    def health_live():
+        """
+        Liveness: responde em tempo constante, sem tocar no dataset.
+        ---
+        tags:
+          - Status
+        responses:
+          200:
+            description: Processo vivo.
+            schema:
+              type: object
+              properties:
+                status:
+                  type: string
+                  example: "ok"
+                pid:
+                  type: integer
+        """
+        return jsonify({"status": "ok", "pid": os.getpid()})
+
     @app.get("/api/v1/health")
+    @app.get("/api/v1/health/ready")
     def health():
         """
-        Verifica a saúde da API e a disponibilidade dos dados.
-        Retorna o status da API e detalhes sobre o dataset carregado (caminho, 
-        número de linhas, colunas presentes e se as colunas obrigatórias existem).
+        Readiness: responde a partir dos metadados em memória (versão do
+        dataset, linhas, horário e duração da carga, status dos índices), sem
+        ler a silver. Se os dados ainda não foram carregados (ou mudaram de
+        versão), dispara o aquecimento em segundo plano e responde "loading".
+        Com deep=1, faz a validação completa do dataset.
         ---
         tags:
           - Status
+        parameters:
+          - name: deep
+            in: query
+            type: integer
+            enum: [0, 1]
+            default: 0
+            description: "1 = carrega (se preciso) e valida esquema, linhas e ids."
         responses:
           200:
-            description: API operacional e dados carregados.
+            description: API pronta e dados carregados.
             schema:
               type: object
               properties:
@@ -196,27 +626,22 @@ def create_app() -> Flask:
                 details:
                   type: object
           503:
-            description: API operacional, mas os dados estão degradados ou ausentes.
+            description: Dados ainda carregando ("loading"), degradados ou ausentes ("degraded").
             schema:
               type: object
               properties:
                 status:
                   type: string
-                  example: "degraded"
+                  example: "loading"
                 details:
                   type: object
         """
-        df = load_books_df()
-        path = dataset_path()
-        ok = (df is not None) and (not df.empty) and REQUIRED_COLS.issubset(set(df.columns))
-        details = {
-            "dataset_path": str(path),
-            "exists": path.exists(),
-            "rows": 0 if df is None else int(len(df)),
-            "columns_present": [] if df is None else sorted(df.columns.tolist()),
-            "columns_required_ok": ok,
-        }
-        return jsonify({"status": "ok" if ok else "degraded", "details": details}), (200 if ok else 503)
+        if request.args.get("deep", "0") == "1":
+            ok, details = validate_dataset()
+            status = "ok" if ok else "degraded"
+        else:
+            status, details = readiness()
+        return jsonify({"status": status, "details": details}), (200 if status == "ok" else 503)
 
     @app.get("/api/v1/books")
     def list_books():
@@ -243,11 +668,357 @@ def create_app() -> Flask:
             in: query
             type: integer
             required: false
-            default: 20
-            description: Número de itens por página.
+            default: 20
+            description: Número de itens por página.
+          - name: after
+            in: query
+            type: string
+            required: false
+            description: Cursor opaco (next_cursor da página anterior). Vazio inicia a paginação por cursor.
+          - name: facets
+            in: query
+            type: string
+            required: false
+            description: "Contagens sobre todo o resultado, separadas por vírgula: category, rating, instock, price_bucket."
+        responses:
+          200:
+            description: Lista de livros retornada com sucesso.
+          400:
+            description: Parâmetros inválidos.
+          503:
+            description: Dataset indisponível.
+        """
+        df = load_books_df()
+        if df is None or df.empty:
+            return jsonify({"error": "dataset indisponível"}), 503
+
+        q    = request.args.get("q")
+        page = int(request.args.get("page", 1))
+        size = int(request.args.get("size", 20))
+        start = max((page - 1) * size, 0)
+        try:
+            facets = requested_facets()
+        except QueryError as e:
+            return jsonify({"error": str(e)}), 400
+
+        view = sorted_books("title")
+        mask = None
+        if q and "title" in view.frame.columns:
+            mask = lambda d: d["title"].str.contains(q, case=False, na=False)
+
+        if "after" in request.args:
+            extra = None
+            if facets:
+                with timed("filter"):
+                    matched = view.frame.index if mask is None else view.frame.index[mask(view.frame).to_numpy()]
+                extra = {"facets": facet_counts(matched, facets)}
+            return cursor_response(view, size, mask, extra=extra)
+
+        with timed("filter"):
+            dfl = view.frame if mask is None else view.frame[mask(view.frame)]
+        total = int(len(dfl))
+        with timed("serialize"):
+            items = dfl.iloc[start:start + size].to_dict(orient="records")
+        body = {"items": items, "page": page, "size": size, "total": total}
+        if facets:
+            body["facets"] = facet_counts(dfl.index, facets)
+        return jsonify(body)
+
+    @app.get("/api/v1/books/<string:book_id>")
+    def book_detail(book_id: str):
+        """
+        Busca detalhes de um livro específico por ID.
+        Retorna todos os campos de um único livro baseado no seu ID.
+        ---
+        tags:
+          - Livros (Core)
+        parameters:
+          - name: book_id
+            in: path
+            type: string
+            required: true
+            description: O ID (ou UPC) do livro.
+        responses:
+          200:
+            description: Detalhes do livro.
+          404:
+            description: Livro não encontrado.
+          503:
+            description: Dataset indisponível.
+        """
+        # df e índice do mesmo snapshot: a silver pode trocar no meio da requisição
+        lookup = book_lookup()
+        if lookup is None or lookup.df.empty:
+            return jsonify({"error": "dataset indisponível"}), 503
+        with timed("lookup"):
+            pos = int(lookup.positions([book_id])[0])
+        if pos < 0:
+            return jsonify({"error": f"book id '{book_id}' não encontrado"}), 404
+        return jsonify(lookup.df.iloc[pos].to_dict())
+
+    @app.get("/api/v1/books/<string:book_id>/similar")
+    def similar_books(book_id: str):
+        """
+        Livros parecidos com um livro ("mais como este").
+        Similaridade de cosseno sobre as features de /ml/features (preço,
+        rating, categoria, tamanho do título) e os tokens do título.
+        ---
+        tags:
+          - Livros (Core)
+        parameters:
+          - name: book_id
+            in: path
+            type: string
+            required: true
+          - name: k
+            in: query
+            type: integer
+            required: false
+            default: 10
+            description: Número de vizinhos (até 100).
+        responses:
+          200:
+            description: Vizinhos em ordem de similaridade, com 'score' em cada item.
+          404:
+            description: Livro não encontrado.
+          503:
+            description: Dataset indisponível.
+        """
+        # ids, matriz e linhas do mesmo snapshot (a silver pode trocar no meio)
+        snapshot = similarity_index()
+        if snapshot is None or snapshot[0].df.empty:
+            return jsonify({"error": "dataset indisponível"}), 503
+        lookup, index = snapshot
+        df = lookup.df
+        k = min(max(int(request.args.get("k", 10)), 0), 100)
+        with timed("lookup"):
+            pos = int(lookup.positions([book_id])[0])
+        if pos < 0:
+            return jsonify({"error": f"book id '{book_id}' não encontrado"}), 404
+        with timed("search"):
+            neighbours, scores = index.neighbours(pos, k)
+        with timed("serialize"):
+            items = project_list(df.iloc[neighbours]).to_dict(orient="records")
+            for item, score in zip(items, scores.tolist()):
+                item["score"] = round(score, 4)
+        return jsonify({"id": book_id, "k": k, "items": items})
+
+    @app.get("/api/v1/books/<string:book_id>/history")
+    def book_history_points(book_id: str):
+        """
+        Histórico de preço e estoque de um livro entre scrapes.
+        Só as mudanças são gravadas: cada ponto vale até o próximo. O primeiro
+        ponto é o valor vigente no início do intervalo (pode ser anterior a
+        'from'). listed=false marca a saída do livro do catálogo.
+        ---
+        tags:
+          - Livros (Core)
+        parameters:
+          - name: book_id
+            in: path
+            type: string
+            required: true
+          - name: from
+            in: query
+            type: string
+            required: false
+            description: Início do intervalo (YYYY-MM-DD ou ISO 8601, UTC se sem fuso).
+          - name: to
+            in: query
+            type: string
+            required: false
+            description: Fim do intervalo (inclusivo; uma data pura vale até o fim do dia).
+        responses:
+          200:
+            description: Pontos {ts, price, instock, listed} em ordem de tempo.
+          400:
+            description: Datas inválidas.
+          404:
+            description: Livro sem histórico.
+        """
+        try:
+            start, end = history_range()
+        except HistoryError as e:
+            return jsonify({"error": str(e)}), 400
+        events = book_history().events
+        with timed("lookup"):
+            frame = None if events is None else events.window(book_id, start, end, as_of=True)
+        if frame is None:
+            return jsonify({"error": f"book id '{book_id}' sem histórico"}), 404
+        return jsonify({"id": book_id, "points": history_points(frame), "total": int(len(frame))})
+
+    @app.route("/api/v1/books/batch", methods=["GET", "POST"])
+    def books_batch():
+        """
+        Busca vários livros por ID em uma única chamada.
+        Aceita os IDs via JSON (POST {"ids": [...]}) ou query string
+        (GET ?ids=a,b,c). Os itens voltam na ordem pedida; IDs inexistentes
+        aparecem como null em 'items' e listados em 'not_found'.
+        ---
+        tags:
+          - Livros (Core)
+        parameters:
+          - name: ids
+            in: query
+            type: string
+            required: false
+            description: IDs separados por vírgula (GET).
+          - in: body
+            name: body
+            required: false
+            schema:
+              type: object
+              properties:
+                ids:
+                  type: array
+                  items:
+                    type: string
+                  example: ["its-only-the-himalayas_981", "inexistente"]
+        responses:
+          200:
+            description: Livros encontrados (null para IDs inexistentes).
+          400:
+            description: Lista de IDs ausente, inválida ou acima do limite.
+          503:
+            description: Dataset indisponível.
+        """
+        if request.method == "POST":
+            payload = request.get_json(silent=True) or {}
+            ids = payload.get("ids")
+        else:
+            ids = [i for i in (request.args.get("ids") or "").split(",") if i.strip()]
+
+        if not isinstance(ids, list) or not ids or not all(isinstance(i, str) for i in ids):
+            return jsonify({"error": "informe 'ids' como lista de strings"}), 400
+        max_ids = app.config["BATCH_MAX_IDS"]
+        if len(ids) > max_ids:
+            return jsonify({"error": f"máximo de {max_ids} ids por chamada"}), 400
+
+        lookup = book_lookup()
+        if lookup is None or lookup.df.empty:
+            return jsonify({"error": "dataset indisponível"}), 503
+
+        ids = [i.strip() for i in ids]
+        with timed("lookup"):
+            pos = lookup.positions(ids)
+        found = pos >= 0
+        with timed("serialize"):
+            records = iter(lookup.df.iloc[pos[found]].to_dict(orient="records"))
+        items = [next(records) if ok else None for ok in found]
+        not_found = [i for i, ok in zip(ids, found) if not ok]
+
+        return jsonify({
+            "items": items,
+            "found": int(found.sum()),
+            "not_found": not_found,
+        })
+
+    @app.get("/api/v1/books/changes")
+    def books_changes():
+        """
+        Mudanças no catálogo desde uma versão (sincronização incremental).
+        Cada build da silver registra a diferença por id em relação ao build
+        anterior. Quem já tem o catálogo pede só as mudanças desde a versão que
+        conhece e aplica: insert/update trazem o livro completo (upsert),
+        delete só o id. Vários builds no intervalo chegam compactados (uma
+        linha por id, com o efeito líquido).
+        ---
+        tags:
+          - Livros (Core)
+        produces:
+          - application/x-ndjson
+        parameters:
+          - name: since
+            in: query
+            type: string
+            required: true
+            description: Versão já sincronizada pelo cliente (header X-Changes-Version de uma resposta anterior).
+        responses:
+          200:
+            description: >
+              NDJSON, uma mudança por linha ({"op", "id", "book"}); vazio se já
+              está na versão atual. O header X-Changes-Version traz a versão a
+              usar no próximo 'since'.
+          400:
+            description: Parâmetro 'since' ausente.
+          410:
+            description: Versão desconhecida ou fora da retenção; sincronize o catálogo inteiro.
+          503:
+            description: Change log indisponível para a silver atual.
+        """
+        log = change_log()
+        if log is None:
+            return jsonify({"error": "change log indisponível"}), 503
+        since = request.args.get("since", "").strip()
+        if not since:
+            return jsonify({"error": "informe 'since'", "current": log.current}), 400
+        entries = log.since(since)
+        if entries is None or any(not e.get("file") for e in entries):
+            return jsonify({
+                "error": f"versão '{since}' fora do change log; sincronize o catálogo inteiro",
+                "current": log.current,
+            }), 410
+        resp = app.response_class(iter_changes(log, entries), mimetype="application/x-ndjson")
+        resp.headers["X-Changes-Version"] = log.current
+        resp.headers["X-Changes-Since"] = since
+        return resp
+
+    @app.get("/api/v1/books/search")
+    def search_books():
+        """
+        Busca livros por título e/ou categoria (paginado).
+        Endpoint obrigatório. Retorna livros filtrando por 'title' (substring,
+        case-insensitive) e/ou 'category' (substring, case-insensitive).
+        Com mode=ranked, 'title' vira consulta full-text: casa por termos (o
+        último também por prefixo) e ordena por relevância BM25.
+        ---
+        tags:
+          - Livros (Core)
+        parameters:
+          - name: title
+            in: query
+            type: string
+            required: false
+            description: Termo de busca para filtrar por título (case-insensitive).
+          - name: category
+            in: query
+            type: string
+            required: false
+            description: Termo de busca para filtrar por categoria (case-insensitive).
+          - name: page
+            in: query
+            type: integer
+            required: false
+            default: 1
+            description: Número da página.
+          - name: size
+            in: query
+            type: integer
+            required: false
+            default: 20
+            description: Número de itens por página.
+          - name: after
+            in: query
+            type: string
+            required: false
+            description: Cursor opaco (next_cursor da página anterior). Vazio inicia a paginação por cursor.
+          - name: mode
+            in: query
+            type: string
+            required: false
+            default: substring
+            enum: [substring, ranked]
+            description: "'ranked' ordena por relevância (BM25) e inclui 'score' em cada item; não aceita 'after'."
+          - name: facets
+            in: query
+            type: string
+            required: false
+            description: "Contagens sobre todo o resultado, separadas por vírgula: category, rating, instock, price_bucket."
         responses:
           200:
-            description: Lista de livros retornada com sucesso.
+            description: Lista de livros filtrada.
+          400:
+            description: Parâmetros inválidos.
           503:
             description: Dataset indisponível.
         """
@@ -255,56 +1026,135 @@ def create_app() -> Flask:
         if df is None or df.empty:
             return jsonify({"error": "dataset indisponível"}), 503
 
-        q    = request.args.get("q")
-        page = int(request.args.get("page", 1))
-        size = int(request.args.get("size", 20))
-        start = max((page - 1) * size, 0)
+        title    = request.args.get("title")
+        category = request.args.get("category")
+        page     = int(request.args.get("page", 1))
+        size     = int(request.args.get("size", 20))
+        start    = max((page - 1) * size, 0)
+
+        mode     = request.args.get("mode", "substring")
+        if mode not in ("substring", "ranked"):
+            return jsonify({"error": "mode deve ser 'substring' ou 'ranked'"}), 400
+        try:
+            facets = requested_facets()
+        except QueryError as e:
+            return jsonify({"error": str(e)}), 400
+
+        view = sorted_books("title")
+        cols = view.frame.columns
+        # categoria por bitmap (posições de query_index == posições de view.frame)
+        cat_bits = query_index().category_bitmap(category) if category and "category" in cols else None
+
+        if mode == "ranked":
+            if "after" in request.args:
+                return jsonify({"error": "mode=ranked não suporta paginação por cursor"}), 400
+            index = search_index()
+            matched, hits = np.empty(0, dtype=np.int64), []
+            if title and index is not None:
+                allowed = cat_bits.contains if cat_bits is not None else None
+                with timed("search"):
+                    hits, matched = index.top_k(title, start + size, allowed=allowed)
+            hits = hits[start:]
+            with timed("serialize"):
+                items = view.frame.iloc[[d for d, _ in hits]].to_dict(orient="records")
+                for item, (_, score) in zip(items, hits):
+                    item["score"] = round(score, 4)
+            body = {"items": items, "page": page, "size": size, "total": int(len(matched)), "mode": mode}
+            if facets:
+                body["facets"] = facet_counts(matched, facets)
+            return jsonify(body)
+
+        def mask(d: pd.DataFrame) -> pd.Series:
+            m = pd.Series(True, index=d.index)
+            if title and "title" in cols:
+                m &= d["title"].str.contains(title, case=False, na=False)
+            if cat_bits is not None:
+                m &= cat_bits.contains(d.index.to_numpy())
+            return m
 
-        dfl = df
-        if q and "title" in dfl.columns:
-            dfl = dfl[dfl["title"].str.contains(q, case=False, na=False)]
+        filtered = bool((title and "title" in cols) or cat_bits is not None)
+        if "after" in request.args:
+            extra = None
+            if facets:
+                with timed("filter"):
+                    matched = cat_bits.positions() if cat_bits is not None else view.frame.index.to_numpy()
+                    if title and "title" in cols:
+                        sub = view.frame.iloc[matched]
+                        matched = sub.index[mask(sub).to_numpy()]
+                extra = {"facets": facet_counts(matched, facets)}
+            return cursor_response(view, size, mask if filtered else None, extra=extra)
 
-        dfl = project_list(dfl).sort_values(["title", "id"], ascending=[True, True], kind="stable")
+        with timed("filter"):
+            if cat_bits is not None:
+                # parte das posições da categoria; o título só é testado nelas
+                dfl = view.frame.iloc[cat_bits.positions()]
+                if title and "title" in cols:
+                    dfl = dfl[mask(dfl)]
+            else:
+                dfl = view.frame[mask(view.frame)] if filtered else view.frame
         total = int(len(dfl))
-        items = dfl.iloc[start:start + size].to_dict(orient="records")
-        return jsonify({"items": items, "page": page, "size": size, "total": total})
+        with timed("serialize"):
+            items = dfl.iloc[start:start + size].to_dict(orient="records")
+        body = {"items": items, "page": page, "size": size, "total": total}
+        if facets:
+            body["facets"] = facet_counts(dfl.index, facets)
+        return jsonify(body)
 
-    @app.get("/api/v1/books/<string:book_id>")
-    def book_detail(book_id: str):
+    @app.get("/api/v1/books/suggest")
+    def suggest_books():
         """
-        Busca detalhes de um livro específico por ID.
-        Retorna todos os campos de um único livro baseado no seu ID.
+        Autocomplete de títulos para a caixa de busca.
+        Prefixo do título via busca binária; se faltar resultado, casa palavras
+        (a última por prefixo) e, por fim, tolera erros de digitação.
         ---
         tags:
           - Livros (Core)
         parameters:
-          - name: book_id
-            in: path
+          - name: prefix
+            in: query
             type: string
             required: true
-            description: O ID (ou UPC) do livro.
+            description: Texto digitado até o momento.
+          - name: limit
+            in: query
+            type: integer
+            required: false
+            default: 10
+            description: Máximo de sugestões (até 50).
+          - name: fuzzy
+            in: query
+            type: boolean
+            required: false
+            default: true
+            description: Corrige termos fora do vocabulário por distância de edição quando nada casa.
         responses:
           200:
-            description: Detalhes do livro.
-          404:
-            description: Livro não encontrado.
+            description: Sugestões (id e título), e a consulta corrigida quando houve correção.
           503:
             description: Dataset indisponível.
         """
-        df = load_books_df()
-        if df is None or df.empty:
+        prefix = request.args.get("prefix", "")
+        limit  = min(max(int(request.args.get("limit", 10)), 0), 50)
+        fuzzy  = request.args.get("fuzzy", "true").lower() not in ("0", "false", "no")
+
+        index = suggester()
+        if index is None:
             return jsonify({"error": "dataset indisponível"}), 503
-        hit = df[df["id"] == book_id]
-        if hit.empty:
-            return jsonify({"error": f"book id '{book_id}' não encontrado"}), 404
-        return jsonify(hit.iloc[0].to_dict())
+        with timed("search"):
+            found, corrected = index.suggest(prefix, limit, fuzzy=fuzzy)
+        return jsonify({
+            "prefix": prefix,
+            "suggestions": [{"id": i, "title": t} for i, t in found],
+            "corrected": corrected,
+        })
 
-    @app.get("/api/v1/books/search")
-    def search_books():
+    @app.get("/api/v1/books/query")
+    def query_books():
         """
-        Busca livros por título e/ou categoria (paginado).
-        Endpoint obrigatório. Retorna livros filtrando por 'title' (substring,
-        case-insensitive) e/ou 'category' (substring, case-insensitive).
+        Consulta combinada: título, categoria, faixa de preço, faixa de rating e estoque.
+        Um planejador começa pelo índice mais seletivo (lista por categoria,
+        preço ordenado, bucket de rating, estoque) e aplica os demais filtros só
+        sobre os candidatos. Com explain=1, a resposta inclui o plano executado.
         ---
         tags:
           - Livros (Core)
@@ -313,50 +1163,114 @@ def create_app() -> Flask:
             in: query
             type: string
             required: false
-            description: Termo de busca para filtrar por título (case-insensitive).
+            description: Substring do título (case-insensitive).
           - name: category
             in: query
             type: string
             required: false
-            description: Termo de busca para filtrar por categoria (case-insensitive).
+            description: Substring da categoria (case-insensitive).
+          - name: min_price
+            in: query
+            type: number
+            required: false
+          - name: max_price
+            in: query
+            type: number
+            required: false
+          - name: min_rating
+            in: query
+            type: integer
+            required: false
+          - name: max_rating
+            in: query
+            type: integer
+            required: false
+          - name: instock
+            in: query
+            type: boolean
+            required: false
+            description: true = com estoque; false = sem estoque.
+          - name: sort
+            in: query
+            type: string
+            required: false
+            default: title
+            description: "Chaves separadas por vírgula, '-' para decrescente (ex.: price,-rating). Campos: title, id, category, price, rating, instock."
           - name: page
             in: query
             type: integer
             required: false
             default: 1
-            description: Número da página.
           - name: size
             in: query
             type: integer
             required: false
             default: 20
-            description: Número de itens por página.
+          - name: explain
+            in: query
+            type: boolean
+            required: false
+            default: false
+            description: Inclui o plano executado (ordem dos passos, método e linhas restantes).
+          - name: facets
+            in: query
+            type: string
+            required: false
+            description: "Contagens por valor sobre o resultado, separadas por vírgula: category, rating, instock, price_bucket."
         responses:
           200:
-            description: Lista de livros filtrada.
+            description: Livros que satisfazem todos os filtros.
+          400:
+            description: Parâmetros inválidos.
           503:
             description: Dataset indisponível.
         """
-        df = load_books_df()
-        if df is None or df.empty:
-            return jsonify({"error": "dataset indisponível"}), 503
+        args = request.args
 
-        title    = request.args.get("title")
-        category = request.args.get("category")
-        page     = int(request.args.get("page", 1))
-        size     = int(request.args.get("size", 20))
-        start    = max((page - 1) * size, 0)
+        def number(name: str, cast=float):
+            v = args.get(name)
+            if v in (None, ""):
+                return None
+            try:
+                return cast(v)
+            except ValueError:
+                raise QueryError(f"{name} deve ser numérico")
 
-        dfl = df
-        if title and "title" in dfl.columns:
-            dfl = dfl[dfl["title"].str.contains(title, case=False, na=False)]
-        if category and "category" in dfl.columns:
-            dfl = dfl[dfl["category"].str.contains(category, case=False, na=False)]
+        try:
+            filters = {
+                "title": args.get("title") or None,
+                "category": args.get("category") or None,
+                "min_price": number("min_price"),
+                "max_price": number("max_price"),
+                "min_rating": number("min_rating"),
+                "max_rating": number("max_rating"),
+                "instock": None if args.get("instock") in (None, "") else args["instock"].lower() in ("1", "true", "yes"),
+            }
+            cols, ascending = parse_sort(args.get("sort", "title"))
+            facets = requested_facets()
+            page = number("page", int) or 1
+            size = number("size", int) or 20
+        except QueryError as e:
+            return jsonify({"error": str(e)}), 400
 
-        dfl = project_list(dfl).sort_values(["title", "id"], ascending=[True, True], kind="stable")
-        total = int(len(dfl))
-        items = dfl.iloc[start:start + size].to_dict(orient="records")
-        return jsonify({"items": items, "page": page, "size": size, "total": total})
+        index, view = query_index(), sorted_books("title")
+        if index is None or view is None:
+            return jsonify({"error": "dataset indisponível"}), 503
+
+        start = max((page - 1) * size, 0)
+        with timed("filter"):
+            positions, plan = index.execute(index.plan(**filters))
+        with timed("sort"):
+            if cols != ["title"] or not ascending[0]:
+                positions = index.sort(positions, cols, ascending)
+        with timed("serialize"):
+            items = view.frame.iloc[positions[start:start + size]].to_dict(orient="records")
+        body = {"items": items, "page": page, "size": size, "total": int(len(positions))}
+        if facets:
+            body["facets"] = facet_counts(positions, facets)
+        if args.get("explain", "").lower() in ("1", "true", "yes"):
+            body["plan"] = plan
+        return jsonify(body)
 
     @app.get("/api/v1/categories")
     def list_categories():
@@ -399,6 +1313,55 @@ def create_app() -> Flask:
         )
         return jsonify({"items": cats, "total": len(cats)})
 
+    @app.get("/api/v1/categories/<string:category>/price-trend")
+    @jwt_required()
+    def category_price_trend(category: str):
+        """
+        [Insights] Tendência de preço e estoque de uma categoria entre scrapes.
+        Um ponto por scrape, com os agregados calculados no momento do build.
+        Requer autenticação JWT.
+        ---
+        tags:
+          - Livros (Insights)
+        security:
+          - Bearer: []
+        parameters:
+          - name: category
+            in: path
+            type: string
+            required: true
+            description: Nome normalizado da categoria (como em /api/v1/categories).
+          - name: from
+            in: query
+            type: string
+            required: false
+            description: Início do intervalo (YYYY-MM-DD ou ISO 8601).
+          - name: to
+            in: query
+            type: string
+            required: false
+            description: Fim do intervalo (inclusivo).
+        responses:
+          200:
+            description: Pontos {ts, books, in_stock, price_mean, price_min, price_max, price_median}.
+          400:
+            description: Datas inválidas.
+          401:
+            description: Token JWT ausente ou inválido.
+          404:
+            description: Categoria sem histórico.
+        """
+        try:
+            start, end = history_range()
+        except HistoryError as e:
+            return jsonify({"error": str(e)}), 400
+        trends = book_history().trends
+        with timed("lookup"):
+            frame = None if trends is None else trends.window(category.strip().lower(), start, end)
+        if frame is None:
+            return jsonify({"error": f"categoria '{category}' sem histórico"}), 404
+        return jsonify({"category": category, "points": history_points(frame), "total": int(len(frame))})
+
     @app.get("/api/v1/books/price-range")
     @jwt_required()
     def books_price_range():
@@ -432,6 +1395,11 @@ def create_app() -> Flask:
             type: integer
             required: false
             default: 20
+          - name: after
+            in: query
+            type: string
+            required: false
+            description: Cursor opaco (next_cursor da página anterior). Vazio inicia a paginação por cursor.
         responses:
           200:
             description: Lista de livros filtrada por preço.
@@ -458,18 +1426,28 @@ def create_app() -> Flask:
         if min_val > max_val:
             return jsonify({"error": "'min' não pode ser maior que 'max'"}), 400
 
-        dff = df[df["price"].notna() & (df["price"].between(min_val, max_val, inclusive="both"))]
+        # a ordem (price,title,id) já é a do filtro: a faixa é um intervalo contíguo
+        view = sorted_books("price")
+        with timed("filter"):
+            prices = view.keys["price"]
+            lo = int(np.searchsorted(prices, min_val, side="left"))
+            hi = int(np.searchsorted(prices, max_val, side="right"))
 
         page = int(request.args.get("page", 1))
         size = int(request.args.get("size", 20))
         start = max((page - 1) * size, 0)
 
-        dfl = project_list(dff).sort_values(["price","title","id"], ascending=[True, True, True], kind="stable")
+        filters = {"min": None if min_q is None else min_val, "max": None if max_q is None else max_val}
+        if "after" in request.args:
+            return cursor_response(view, size, lo=lo, hi=hi, extra={"filters": filters})
+
+        dfl = view.frame.iloc[lo:hi]
         total = int(len(dfl))
-        items = dfl.iloc[start:start + size].to_dict(orient="records")
+        with timed("serialize"):
+            items = dfl.iloc[start:start + size].to_dict(orient="records")
 
         return jsonify({
-            "filters": {"min": None if min_q is None else min_val, "max": None if max_q is None else max_val},
+            "filters": filters,
             "items": items,
             "page": page,
             "size": size,
@@ -481,8 +1459,8 @@ def create_app() -> Flask:
     def top_rated_books():
         """
         [Insights] Lista os livros com melhor avaliação.
-        Retorna livros com 'rating' maior ou igual a 'min_rating'.
-        Requer autenticação JWT.
+        Retorna livros com 'rating' maior ou igual a 'min_rating' (livros sem
+        avaliação ficam de fora). Requer autenticação JWT.
         ---
         tags:
           - Livros (Insights)
@@ -494,7 +1472,7 @@ def create_app() -> Flask:
             type: integer
             required: false
             default: 4
-            description: Rating mínimo (de 0 a 5).
+            description: Rating mínimo (de 0 a 5). Livros sem rating nunca entram, nem com 0.
           - name: limit
             in: query
             type: integer
@@ -522,18 +1500,29 @@ def create_app() -> Flask:
         limit      = int(request.args.get("limit", 10))
         category   = request.args.get("category")
 
-        dff = df[df["rating"].fillna(0) >= min_rating]
-        if category and "category" in dff.columns:
-            dff = dff[dff["category"].str.contains(category, case=False, na=False)]
+        index, view = query_index(), sorted_books("title")
+        with timed("filter"):
+            # um bitmap por rating, do maior para o menor; livro sem rating não
+            # entra no "top rated", nem com min_rating=0
+            buckets = [index.rating_bits[r] for r in sorted(index.rating_bits, reverse=True) if r >= min_rating]
+            if category and index.category is not None:
+                cat_bits = index.category_bitmap(category)
+                buckets = [b & cat_bits for b in buckets]
+            total = sum(b.count() for b in buckets)
 
-        dfl = project_list(dff).sort_values(
-            ["rating", "title", "id"],
-            ascending=[False, True, True],
-            kind="stable"
-        )
+        with timed("sort"):
+            # dentro de cada bucket as posições já estão em ordem (title, id)
+            picked, need = [], max(0, limit)
+            for b in buckets:
+                if need <= 0:
+                    break
+                pos = b.positions()[:need]
+                picked.append(pos)
+                need -= len(pos)
+            positions = np.concatenate(picked) if picked else np.empty(0, dtype=np.int64)
 
-        total = int(len(dfl))
-        items = dfl.head(max(0, limit)).to_dict(orient="records")
+        with timed("serialize"):
+            items = view.frame.iloc[positions].to_dict(orient="records")
 
         return jsonify({
             "filters": {"min_rating": min_rating, "limit": limit, "category": category},
@@ -588,26 +1577,27 @@ def create_app() -> Flask:
         if "category" not in df.columns or "price" not in df.columns:
             return jsonify({"error": "dataset sem colunas necessárias (category/price)"}), 400
 
-        cnt = (
-            df.groupby("category", dropna=False)
-              .agg(books=("id", "nunique"))
-              .reset_index()
-        )
-
-        price_df = df[df["price"].notna()]
-        if not price_df.empty:
-            metrics = (
-                price_df.groupby("category", dropna=False)
-                        .agg(price_min=("price", "min"),
-                             price_max=("price", "max"),
-                             price_mean=("price", "mean"),
-                             price_median=("price", "median"))
-                        .reset_index()
+        with timed("aggregate"):
+            cnt = (
+                df.groupby("category", dropna=False)
+                  .agg(books=("id", "nunique"))
+                  .reset_index()
             )
-            out = cnt.merge(metrics, on="category", how="left")
-        else:
-            out = cnt.assign(price_min=pd.NA, price_max=pd.NA,
-                             price_mean=pd.NA, price_median=pd.NA)
+
+            price_df = df[df["price"].notna()]
+            if not price_df.empty:
+                metrics = (
+                    price_df.groupby("category", dropna=False)
+                            .agg(price_min=("price", "min"),
+                                 price_max=("price", "max"),
+                                 price_mean=("price", "mean"),
+                                 price_median=("price", "median"))
+                            .reset_index()
+                )
+                out = cnt.merge(metrics, on="category", how="left")
+            else:
+                out = cnt.assign(price_min=pd.NA, price_max=pd.NA,
+                                 price_mean=pd.NA, price_median=pd.NA)
 
         min_count = int(request.args.get("min_count", 1))
         sort = request.args.get("sort", "books")
@@ -617,14 +1607,16 @@ def create_app() -> Flask:
             sort = "books"
         ascending = (order == "asc")
 
-        out = out[out["books"] >= min_count]
-        out["category"] = out["category"].fillna("unknown")
-        out = out.sort_values(sort, ascending=ascending, kind="stable")
+        with timed("sort"):
+            out = out[out["books"] >= min_count]
+            out["category"] = out["category"].fillna("unknown")
+            out = out.sort_values(sort, ascending=ascending, kind="stable")
 
         total_categories = int(out["category"].nunique())
         total_books = int(cnt["books"].sum())
 
-        items = out.to_dict(orient="records")
+        with timed("serialize"):
+            items = out.to_dict(orient="records")
         return jsonify({
             "total_categories": total_categories,
             "total_books": total_books,
@@ -658,33 +1650,34 @@ def create_app() -> Flask:
         if df is None or df.empty:
             return jsonify({"error": "dataset indisponível"}), 503
 
-        total_books = int(len(df))
+        with timed("aggregate"):
+            total_books = int(len(df))
 
-        if "category" in df.columns:
-            cats = df["category"].fillna("").astype(str).str.strip()
-            total_categories = int(cats.replace("", pd.NA).dropna().nunique())
-        else:
-            total_categories = 0
-
-        price_stats = {"count": 0, "min": None, "max": None, "mean": None, "median": None}
-        if "price" in df.columns:
-            p = df["price"].dropna()
-            if not p.empty:
-                price_stats = {
-                    "count": int(len(p)),
-                    "min": float(p.min()),
-                    "max": float(p.max()),
-                    "mean": float(p.mean()),
-                    "median": float(p.median()),
-                }
-
-        rating_dist = {"counts": {}, "percents": {}}
-        if "rating" in df.columns:
-            r = pd.to_numeric(df["rating"], errors="coerce").fillna(0).astype(int).clip(0, 5)
-            for k in range(0, 6):
-                cnt = int((r == k).sum())
-                rating_dist["counts"][str(k)] = cnt
-                rating_dist["percents"][str(k)] = round((cnt / total_books) * 100, 2) if total_books else 0.0
+            if "category" in df.columns:
+                cats = df["category"].fillna("").astype(str).str.strip()
+                total_categories = int(cats.replace("", pd.NA).dropna().nunique())
+            else:
+                total_categories = 0
+
+            price_stats = {"count": 0, "min": None, "max": None, "mean": None, "median": None}
+            if "price" in df.columns:
+                p = df["price"].dropna()
+                if not p.empty:
+                    price_stats = {
+                        "count": int(len(p)),
+                        "min": float(p.min()),
+                        "max": float(p.max()),
+                        "mean": float(p.mean()),
+                        "median": float(p.median()),
+                    }
+
+            rating_dist = {"counts": {}, "percents": {}}
+            if "rating" in df.columns:
+                r = pd.to_numeric(df["rating"], errors="coerce").fillna(0).astype(int).clip(0, 5)
+                for k in range(0, 6):
+                    cnt = int((r == k).sum())
+                    rating_dist["counts"][str(k)] = cnt
+                    rating_dist["percents"][str(k)] = round((cnt / total_books) * 100, 2) if total_books else 0.0
 
         return jsonify({
             "total_books": total_books,
@@ -716,6 +1709,11 @@ def create_app() -> Flask:
             type: integer
             required: false
             default: 100
+          - name: after
+            in: query
+            type: string
+            required: false
+            description: Cursor opaco (next_cursor da página anterior). No modo cursor os itens seguem a ordem de 'id'.
           - name: format
             in: query
             type: string
@@ -735,18 +1733,24 @@ def create_app() -> Flask:
         if df is None or df.empty:
             return jsonify({"error": "dataset indisponível"}), 503
 
-        feats = build_ml_features(df)
-
         fmt = request.args.get("format", "json").lower()
         if fmt == "csv":
-            csv = feats.to_csv(index=False)
-            return app.response_class(csv, mimetype="text/csv")
+            return bulk_response(
+                "ml-features.csv",
+                lambda: build_ml_features(df).to_csv(index=False).encode("utf-8"),
+                "text/csv",
+            )
+        elif "after" in request.args:
+            return cursor_response(sorted_ml_features(), int(request.args.get("size", 100)))
         else:
+            with timed("features"):
+                feats = build_ml_features(df)
             page = int(request.args.get("page", 1))
             size = int(request.args.get("size", 100))
             start = max((page - 1) * size, 0)
             total = int(len(feats))
-            items = feats.iloc[start:start + size].to_dict(orient="records")
+            with timed("serialize"):
+                items = feats.iloc[start:start + size].to_dict(orient="records")
             return jsonify({"items": items, "page": page, "size": size, "total": total})
 
     @app.get("/api/v1/ml/training-data")
@@ -769,38 +1773,189 @@ def create_app() -> Flask:
             default: "csv"
             enum: ["csv", "json"]
             description: Formato de retorno (csv ou json).
+          - name: category
+            in: query
+            type: string
+            required: false
+            description: >
+              Exporta só estas categorias (nomes normalizados, separados por vírgula),
+              ordenadas por categoria/título/id. Com a silver particionada e o dataset
+              ainda fora da memória, lê só as partições e colunas necessárias. O
+              category_idx segue a codificação do catálogo inteiro.
+          - name: sample
+            in: query
+            type: number
+            required: false
+            description: Fração das linhas a exportar, em (0, 1].
+          - name: split
+            in: query
+            type: string
+            required: false
+            enum: ["train", "test"]
+            description: Lado da divisão treino/teste (aplicada depois de 'sample').
+          - name: test_size
+            in: query
+            type: number
+            required: false
+            default: 0.2
+            description: Fração de teste, em (0, 1).
+          - name: stratify
+            in: query
+            type: string
+            required: false
+            enum: ["target_high_rating", "category_idx"]
+            description: Mantém a proporção exata de cada valor desta coluna na amostra e no split.
+          - name: seed
+            in: query
+            type: integer
+            required: false
+            default: 0
+            description: >
+              Semente da seleção. A escolha é um hash do id com o seed: o mesmo
+              livro cai sempre do mesmo lado, em qualquer versão do dataset.
         responses:
           200:
             description: Dataset de treinamento em formato CSV ou JSON.
+          400:
+            description: Parâmetros de amostragem inválidos.
           401:
             description: Token JWT ausente ou inválido.
+          404:
+            description: Nenhuma das categorias pedidas existe.
           503:
-            description: Dataset indisponível.
+            description: >
+              Dataset indisponível, ou exportação ainda em geração após
+              BULK_TIMEOUT (com Retry-After).
         """
-        df = load_books_df()
-        if df is None or df.empty:
-            return jsonify({"error": "dataset indisponível"}), 503
+        try:
+            sampling = parse_sampling(request.args)
+        except SamplingError as e:
+            return jsonify({"error": str(e)}), 400
+        requested = {c.strip() for c in request.args.get("category", "").split(",") if c.strip()}
+        categories: list[str] = []
+        if requested:
+            # export de poucas categorias: não exige (nem força) a carga do dataset inteiro
+            if dataset_version() is None:
+                return jsonify({"error": "dataset indisponível"}), 503
+            # chave canônica: só categorias existentes, ordenadas e sem repetição
+            # (as desconhecidas não mudariam o resultado, só criariam entradas no cache)
+            categories = sorted(requested & set(silver_categories()))
+            if not categories:
+                return jsonify({"error": "nenhuma categoria encontrada", "categories": sorted(requested)}), 404
+            key = "ml-training-data[" + ",".join(categories) + "]"
+
+            def source() -> pd.DataFrame:
+                sub = books_in_categories(categories, ML_SOURCE_COLS)
+                return build_ml_features(sub, categories=silver_categories())
+        else:
+            df = load_books_df()
+            if df is None or df.empty:
+                return jsonify({"error": "dataset indisponível"}), 503
+            key = "ml-training-data"
 
-        feats = build_ml_features(df)
-        feats["target_high_rating"] = (feats["rating"] >= 4).astype(int)
+            def source() -> pd.DataFrame:
+                return build_ml_features(df)
+
+        def full_frame() -> pd.DataFrame:
+            feats = source()
+            feats["target_high_rating"] = (feats["rating"] >= 4).astype(int)
+            return feats
+
+        # amostra/seed e subconjunto de categorias vêm do cliente: cache limitado
+        variant = bool(categories) or sampling is not None
+        if sampling is None:
+            training_frame = full_frame
+        else:
+            # cada combinação de amostra/split/seed reaproveita as features da versão
+            full_key, key = ("training_frame", key), key + sampling.key()
+
+            def training_frame() -> pd.DataFrame:
+                feats = cached_for_version(full_key, full_frame, variant=bool(categories))
+                # só as linhas escolhidas seguem para a serialização
+                with timed("sample"):
+                    return feats[select_rows(feats, sampling)]
 
         fmt = request.args.get("format", "csv").lower()
         if fmt == "json":
-            return jsonify({"items": feats.to_dict(orient="records"), "total": int(len(feats))})
+            def build_json() -> bytes:
+                feats = training_frame()
+                return jsonify({"items": feats.to_dict(orient="records"), "total": int(len(feats))}).get_data()
+            return bulk_response(f"{key}.json", build_json, "application/json", variant)
         else:
-            csv = feats.to_csv(index=False)
-            return app.response_class(csv, mimetype="text/csv")
+            return bulk_response(
+                f"{key}.csv",
+                lambda: training_frame().to_csv(index=False).encode("utf-8"),
+                "text/csv",
+                variant,
+            )
         
-    ml_dir = (Path(__file__).resolve().parents[3] / "data" / "ml")
+    ml_dir = Path(os.getenv("ML_DATA_DIR", Path(__file__).resolve().parents[3] / "data" / "ml"))
     ml_dir.mkdir(parents=True, exist_ok=True)
 
+    # predições: WAL durável + segmentos Parquet por modelo gravados em background.
+    # O sink (arquivo de WAL + thread) só é criado no primeiro POST: montar o
+    # app em ferramentas, testes e benchmarks não deixa nada em data/ml/.
+    predictions_dir = ml_dir / "predictions"
+    sink_options = dict(
+        flush_interval=float(os.getenv("PREDICTIONS_FLUSH_INTERVAL", 1.0)),
+        flush_rows=int(os.getenv("PREDICTIONS_FLUSH_ROWS", 50_000)),
+        fsync=os.getenv("PREDICTIONS_FSYNC", "1") != "0",
+        compact_min_segments=int(os.getenv("PREDICTIONS_COMPACT_MIN_SEGMENTS", 32)),
+    )
+    recovery_checked = []
+
+    def prediction_sink():
+        return get_prediction_sink(predictions_dir, **sink_options)
+
+    def recover_orphan_wals() -> None:
+        """Uma vez por processo: WAL de um worker morto é reaplicado já na primeira leitura."""
+        if not recovery_checked:
+            recovery_checked.append(True)
+            if orphan_wals(predictions_dir):
+                prediction_sink().flush()
+
+    # (modelo) -> ((geração do índice, versão da silver), predições + catálogo)
+    # (o mesmo limite dos índices: o nome do modelo vem da URL)
+    predictions_joined: OrderedDict = OrderedDict()
+    joined_lock = threading.Lock()
+
+    def latest_predictions(model: str):
+        """Última predição por livro já unida ao catálogo; recalcula só se algo mudou."""
+        recover_orphan_wals()
+        model_dir = prediction_model_dir(predictions_dir, model)
+        if not has_predictions(model_dir, legacy_dir=ml_dir):
+            return None   # modelo inexistente não cria índice nem entrada em cache
+        index = get_prediction_index(model_dir, legacy_dir=ml_dir)
+        latest = index.refresh()
+        stamp = (index.generation, dataset_version())
+        with joined_lock:
+            hit = predictions_joined.get(model)
+            if hit is not None and hit[0] == stamp:
+                predictions_joined.move_to_end(model)
+                return hit[1]
+        if latest.empty:
+            return None
+        joined = with_catalog(latest).set_index("id", drop=False)
+        with joined_lock:
+            predictions_joined[model] = (stamp, joined)
+            predictions_joined.move_to_end(model)
+            while len(predictions_joined) > max(PREDICTION_INDEX_CACHE_SIZE, 1):
+                predictions_joined.popitem(last=False)
+        return joined
+
+    def prediction_records(frame: pd.DataFrame) -> list[dict]:
+        out = frame.reset_index(drop=True)
+        out["received_at"] = pd.to_datetime(out["ts"], unit="ns", utc=True).dt.strftime("%Y-%m-%dT%H:%M:%SZ")
+        return out.drop(columns=["seq"]).to_dict(orient="records")
+
     @app.post("/api/v1/ml/predictions")
     @jwt_required()
     def ml_predictions():
         """
         [ML] Recebe e persiste predições de um modelo.
-        Endpoint para um modelo de ML enviar suas predições.
-        Requer autenticação JWT.
+        Endpoint para um modelo de ML enviar suas predições. O lote é gravado
+        em um WAL antes da resposta 202 e consolidado em segmentos Parquet
+        por modelo em background. Requer autenticação JWT.
         ---
         tags:
           - ML-Ready
@@ -829,11 +1984,15 @@ def create_app() -> Flask:
                         example: 0.87
         responses:
           202:
-            description: Predições recebidas e salvas.
+            description: Predições recebidas e gravadas no WAL.
           400:
-            description: Payload inválido (faltando 'model' ou 'predictions').
+            description: Payload inválido (faltando 'model' ou 'predictions', ou nome de modelo inválido).
           401:
             description: Token JWT ausente ou inválido.
+          503:
+            description: >
+              Lote não processado dentro de BULK_TIMEOUT; nada foi gravado
+              (in_progress=false) e o envio pode ser repetido após o Retry-After.
         """
         payload = request.get_json(silent=True) or {}
         model = (payload.get("model") or "").strip()
@@ -841,34 +2000,153 @@ def create_app() -> Flask:
 
         if not model or not isinstance(preds, list) or not preds:
             return jsonify({"error": "payload inválido: informe 'model' e lista 'predictions'"}), 400
-        ok, bad = [], []
-        for p in preds:
-            bid = (p.get("id") or "").strip()
-            y  = p.get("y_pred")
-            if not bid:
-                bad.append({"reason": "missing id", "item": p})
-                continue
-            try:
-                y = float(y)
-            except Exception:
-                bad.append({"reason": "y_pred não numérico", "item": p})
-                continue
-            ok.append({"id": bid, "y_pred": y})
-
-        ts = time.strftime("%Y%m%d-%H%M%S")
-        out_path = ml_dir / f"predictions_{model}_{ts}.jsonl"
-        with open(out_path, "w", encoding="utf-8") as f:
-            for r in ok:
-                f.write(json.dumps({"model": model, **r}, ensure_ascii=False) + "\n")
+        if not MODEL_NAME_RE.match(model):
+            return jsonify({"error": "nome de modelo inválido (use letras, números, '_', '-' ou '.')"}), 400
+
+        # com timeout, o lote ou é gravado inteiro (202) ou não é gravado (503):
+        # um cliente que repete o envio após o 503 não duplica linhas
+        gate = CommitGate()
+
+        def accept():
+            ok, bad, n_bad = validate_predictions(preds)
+            if not gate.commit():
+                return None   # o chamador já respondeu 503
+            return ok, bad, n_bad, (prediction_sink().submit(model, ok) if len(ok) else None)
+
+        if len(preds) >= app.config["BULK_OFFLOAD_MIN_ROWS"]:
+            with timed("bulk"):
+                ok, bad, n_bad, seq = bulk_executor.run(accept, timeout=app.config["BULK_TIMEOUT"], gate=gate)
+        else:
+            ok, bad, n_bad, seq = accept()
 
         return jsonify({
             "model": model,
-            "saved_file": str(out_path),
-            "accepted": len(ok),
-            "rejected": len(bad),
-            "rejected_detail": bad[:5]
+            "segment_dir": str(prediction_model_dir(predictions_dir, model)),
+            "sequence": seq,
+            "accepted": int(len(ok)),
+            "rejected": n_bad,
+            "rejected_detail": bad
         }), 202
 
+    @app.get("/api/v1/ml/predictions/<string:model>/latest")
+    @jwt_required()
+    def ml_predictions_latest(model: str):
+        """
+        [ML] Última predição por livro de um modelo.
+        Lê o índice incremental dos segmentos de predição e junta com o
+        catálogo por 'id'. Sem 'ids', lista todas (paginado, por y_pred desc).
+        Predições ainda no buffer aparecem após o próximo flush.
+        Requer autenticação JWT.
+        ---
+        tags:
+          - ML-Ready
+        security:
+          - Bearer: []
+        parameters:
+          - name: model
+            in: path
+            type: string
+            required: true
+          - name: ids
+            in: query
+            type: string
+            required: false
+            description: IDs separados por vírgula.
+          - name: page
+            in: query
+            type: integer
+            required: false
+            default: 1
+          - name: size
+            in: query
+            type: integer
+            required: false
+            default: 100
+        responses:
+          200:
+            description: Predições mais recentes com dados do livro.
+          400:
+            description: Nome de modelo inválido.
+          401:
+            description: Token JWT ausente ou inválido.
+          404:
+            description: Nenhuma predição para o modelo.
+        """
+        if not MODEL_NAME_RE.match(model):
+            return jsonify({"error": "nome de modelo inválido"}), 400
+        joined = latest_predictions(model)
+        if joined is None:
+            return jsonify({"error": f"nenhuma predição para o modelo '{model}'"}), 404
+
+        ids = [i.strip() for i in (request.args.get("ids") or "").split(",") if i.strip()]
+        if ids:
+            pos = joined.index.get_indexer(ids)
+            items = prediction_records(joined.iloc[pos[pos >= 0]])
+            not_found = [i for i, p in zip(ids, pos) if p < 0]
+            return jsonify({"model": model, "items": items, "not_found": not_found})
+
+        page = int(request.args.get("page", 1))
+        size = int(request.args.get("size", 100))
+        start = max((page - 1) * size, 0)
+        items = prediction_records(joined.iloc[start:start + size])
+        return jsonify({"model": model, "items": items, "page": page, "size": size, "total": int(len(joined))})
+
+    @app.get("/api/v1/ml/predictions/<string:model>/top")
+    @jwt_required()
+    def ml_predictions_top(model: str):
+        """
+        [ML] Top-N livros por y_pred de um modelo.
+        Usa a última predição de cada livro, opcionalmente filtrando por
+        categoria (substring, case-insensitive). Requer autenticação JWT.
+        ---
+        tags:
+          - ML-Ready
+        security:
+          - Bearer: []
+        parameters:
+          - name: model
+            in: path
+            type: string
+            required: true
+          - name: n
+            in: query
+            type: integer
+            required: false
+            default: 10
+          - name: category
+            in: query
+            type: string
+            required: false
+            description: Filtra por categoria (substring, case-insensitive).
+        responses:
+          200:
+            description: Livros com maior y_pred.
+          400:
+            description: Nome de modelo inválido.
+          401:
+            description: Token JWT ausente ou inválido.
+          404:
+            description: Nenhuma predição para o modelo.
+        """
+        if not MODEL_NAME_RE.match(model):
+            return jsonify({"error": "nome de modelo inválido"}), 400
+        joined = latest_predictions(model)
+        if joined is None:
+            return jsonify({"error": f"nenhuma predição para o modelo '{model}'"}), 404
+
+        n = max(0, int(request.args.get("n", 10)))
+        category = request.args.get("category")
+        dff = joined
+        if category:
+            dff = dff[dff["category"].astype("string").str.contains(category, case=False, na=False)]
+        # o índice já está em ordem de y_pred desc
+        return jsonify({
+            "model": model,
+            "filters": {"n": n, "category": category},
+            "items": prediction_records(dff.head(n)),
+            "total": int(len(dff)),
+        })
+
     return app
 
 if __name__ == "__main__":
@@ -0,0 +1,137 @@
+# services/api/utils/admission.py
+# Controle de admissão por worker. Cada rota pertence a uma classe (cheap,
+# heavy, bulk) com limite próprio de requisições simultâneas; uma classe
+# saturada responde 503 na hora em vez de enfileirar, então exportações e
+# agregações em rajada não ocupam todas as threads do gthread e as rotas
+# baratas continuam respondendo. Um token bucket por cliente (custo por
+# classe) limita a taxa e responde 429. Os dois casos trazem Retry-After.
+# O cliente é a identidade do JWT, quando há um token válido, ou o IP da
+# conexão (remote_addr, já corrigido pelo ProxyFix); nunca um header que o
+# próprio cliente escolhe, como o X-Forwarded-For bruto.
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from services.api.utils import metrics
+
+CLASSES = ("cheap", "heavy", "bulk")
+
+# rotas (endpoint do Flask) fora da classe padrão "cheap"
+ENDPOINT_CLASSES = {
+    "search_books": "heavy",
+    "query_books": "heavy",
+    "similar_books": "heavy",
+    "books_price_range": "heavy",
+    "top_rated_books": "heavy",
+    "stats_categories": "heavy",
+    "stats_overview": "heavy",
+    # histórico e predições: a 1ª leitura de cada versão lê todos os
+    # segmentos e monta o índice (ou a junção com o catálogo)
+    "book_history_points": "heavy",
+    "category_price_trend": "heavy",
+    "ml_predictions_latest": "heavy",
+    "ml_predictions_top": "heavy",
+    # stream proporcional ao delta, que pode abranger vários builds
+    "books_changes": "bulk",
+    "ml_features": "bulk",
+    "ml_training_data": "bulk",
+    "ml_predictions": "bulk",
+}
+# probes e métricas nunca são recusadas
+EXEMPT_ENDPOINTS = {"health", "health_live", "prometheus_metrics"}
+
+def classify(endpoint: Optional[str]) -> Optional[str]:
+    """Classe da rota; None para rotas isentas."""
+    if endpoint in EXEMPT_ENDPOINTS:
+        return None
+    return ENDPOINT_CLASSES.get(endpoint, "cheap")
+
+class ClassLimiter:
+    """Semáforo sem espera: acquire() falha na hora quando a classe está cheia."""
+
+    def __init__(self, limit: int):
+        self.limit = limit           # 0 = sem limite
+        self.inflight = 0
+        self._lock = threading.Lock()
+
+    def acquire(self) -> bool:
+        with self._lock:
+            if self.limit and self.inflight >= self.limit:
+                return False
+            self.inflight += 1
+            return True
+
+    def release(self) -> None:
+        with self._lock:
+            self.inflight -= 1
+
+class TokenBuckets:
+    """
+    Um balde por cliente: `rate` fichas/s, capacidade `burst`. Só os
+    `max_clients` clientes mais recentes são lembrados (LRU); um cliente
+    esquecido volta com o balde cheio.
+    """
+
+    def __init__(self, rate: float, burst: float, max_clients: int = 10_000):
+        self.rate = rate             # 0 = sem limite de taxa
+        self.burst = burst
+        self.max_clients = max_clients
+        self._lock = threading.Lock()
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+
+    def take(self, client: str, cost: float) -> float:
+        """Consome `cost` fichas. Retorna 0 se admitido, senão os segundos até haver fichas."""
+        if self.rate <= 0:
+            return 0.0
+        cost = min(cost, self.burst)
+        now = time.monotonic()
+        with self._lock:
+            tokens, last = self._buckets.pop(client, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - last) * self.rate)
+            wait = 0.0
+            if tokens >= cost:
+                tokens -= cost
+            else:
+                wait = (cost - tokens) / self.rate
+            self._buckets[client] = (tokens, now)
+            if len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+            return wait
+
+class AdmissionController:
+    def __init__(self, limits: dict[str, int], costs: dict[str, float], rate: float, burst: float,
+                 retry_after: float = 1.0):
+        self.limiters = {c: ClassLimiter(limits.get(c, 0)) for c in CLASSES}
+        self.costs = costs
+        self.buckets = TokenBuckets(rate, burst)
+        self.retry_after = retry_after
+
+    def admit(self, klass: str, client: str) -> tuple[Optional[int], float]:
+        """
+        (None, 0) se admitido — o chamador deve chamar release(klass) ao fim;
+        senão (status, retry_after): 429 para taxa do cliente, 503 para classe cheia.
+        """
+        # a classe cheia é checada antes: uma requisição recusada com 503 não gasta fichas do cliente
+        limiter = self.limiters[klass]
+        if not limiter.acquire():
+            metrics.inc("books_api_admission_total", (("class", klass), ("result", "shed_busy")))
+            return 503, self.retry_after
+        wait = self.buckets.take(client, self.costs.get(klass, 1.0))
+        if wait > 0:
+            limiter.release()
+            metrics.inc("books_api_admission_total", (("class", klass), ("result", "shed_rate")))
+            return 429, wait
+        metrics.inc("books_api_admission_total", (("class", klass), ("result", "served")))
+        return None, 0.0
+
+    def release(self, klass: str) -> None:
+        self.limiters[klass].release()
+
+    def stats(self) -> dict:
+        return {c: {"limit": l.limit, "inflight": l.inflight} for c, l in self.limiters.items()}
+
+def retry_after_header(seconds: float) -> str:
+    """Retry-After em segundos inteiros (mínimo 1)."""
+    return str(max(1, math.ceil(seconds)))
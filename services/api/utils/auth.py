@@ -0,0 +1,222 @@
+# services/api/utils/auth.py
+# Caminho JWT das rotas protegidas.
+#
+# Clientes de ML reaproveitam o mesmo access token por milhares de chamadas;
+# decodificar e verificar o HMAC a cada uma é trabalho repetido. Tokens já
+# verificados ficam num cache limitado (digest do token -> header + claims)
+# até o próprio `exp`. A revogação (logout) é um conjunto de jti consultado em
+# O(1) nos dois caminhos, com cache ou sem.
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from pathlib import Path
+from typing import Optional
+
+from flask import current_app, g, request
+from flask_jwt_extended import verify_jwt_in_request
+from flask_jwt_extended.config import config as jwt_config
+
+from services.api.utils import metrics
+from services.api.utils.metrics import timed
+
+class VerifiedTokenCache:
+    """LRU limitado de tokens verificados; cada entrada vale até o `exp` do token."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[bytes, tuple[float, dict, dict]] = OrderedDict()
+
+    @staticmethod
+    def digest(token: str, secret: str) -> bytes:
+        # o segredo entra no digest: um token verificado por um app não vale noutro
+        return hashlib.blake2b(f"{secret}\0{token}".encode(), digest_size=16).digest()
+
+    def get(self, digest: bytes) -> Optional[tuple[dict, dict]]:
+        with self._lock:
+            hit = self._entries.get(digest)
+            if hit is None:
+                return None
+            if hit[0] <= time.time():
+                del self._entries[digest]
+                return None
+            self._entries.move_to_end(digest)
+            return hit[1], hit[2]
+
+    def put(self, digest: bytes, header: dict, claims: dict) -> None:
+        exp = claims.get("exp")
+        if self.maxsize <= 0 or exp is None:
+            return   # sem exp não há prazo para confiar no cache
+        if float(claims.get("nbf", 0)) > time.time():
+            return   # ainda não vale (aceito só pelo leeway): não guarda no cache
+        with self._lock:
+            self._entries[digest] = (float(exp), header, claims)
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def discard_jti(self, jti: str) -> None:
+        with self._lock:
+            for d in [d for d, (_, _, c) in self._entries.items() if c.get("jti") == jti]:
+                del self._entries[d]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+class RevocationList:
+    """
+    jti revogados -> exp. A consulta é um lookup em dict; as revogações vão
+    também para um arquivo append-only (um "jti exp" por linha), relido de
+    forma incremental no máximo a cada `check_interval` segundos, para que
+    todos os workers do gunicorn enxerguem o logout.
+    """
+
+    def __init__(self, path: Optional[Path], check_interval: float = 1.0):
+        self.path = path
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._revoked: dict[str, float] = {}
+        self._offset = 0
+        self._checked_at = float("-inf")
+
+    def revoke(self, jti: str, exp: Optional[float]) -> None:
+        exp = float(exp) if exp is not None else float("inf")
+        with self._lock:
+            self._revoked[jti] = exp
+            if self.path is not None:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(f"{jti} {exp}\n")
+
+    def is_revoked(self, jti: Optional[str]) -> bool:
+        if jti is None:
+            return False
+        self._sync()
+        return jti in self._revoked
+
+    def _sync(self) -> None:
+        if self.path is None:
+            return
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return
+        with self._lock:
+            self._checked_at = now
+            try:
+                size = self.path.stat().st_size
+            except OSError:
+                return
+            if size < self._offset:
+                self._offset = 0          # arquivo recriado
+            if size == self._offset:
+                return
+            with open(self.path, "rb") as f:
+                f.seek(self._offset)
+                chunk = f.read(size - self._offset)
+            end = chunk.rfind(b"\n") + 1  # ignora linha ainda incompleta
+            self._offset += end
+            for line in chunk[:end].decode("utf-8").splitlines():
+                jti, _, exp = line.partition(" ")
+                if jti:
+                    self._revoked[jti] = float(exp or "inf")
+            # jti de tokens já expirados não precisam mais ser lembrados
+            wall = time.time()
+            for j in [j for j, e in self._revoked.items() if e <= wall]:
+                del self._revoked[j]
+
+    def __len__(self) -> int:
+        return len(self._revoked)
+
+TOKEN_CACHE = VerifiedTokenCache(int(os.getenv("AUTH_CACHE_SIZE", 4096)))
+# o padrão dentro do repo é só para desenvolvimento (data/auth/ fica fora do
+# git); em produção JWT_REVOKED_PATH deve apontar para um disco persistente e
+# compartilhado entre instâncias, senão um restart esquece os logouts
+REVOKED = RevocationList(
+    Path(os.getenv("JWT_REVOKED_PATH", Path(__file__).resolve().parents[3] / "data" / "auth" / "revoked.txt")),
+    check_interval=float(os.getenv("JWT_REVOKED_CHECK_INTERVAL", 1.0)),
+)
+
+def _header_token() -> Optional[str]:
+    """Token do header Authorization no formato padrão ("Bearer <jwt>"), ou None."""
+    auth = request.headers.get(jwt_config.header_name, "")
+    kind, _, token = auth.strip().partition(" ")
+    if kind != jwt_config.header_type or not token or " " in token or "," in token:
+        return None
+    return token
+
+def verify_jwt(optional: bool = False, refresh: bool = False) -> None:
+    """
+    verify_jwt_in_request com cache de tokens verificados. Só o formato padrão
+    do header passa pelo cache; qualquer outro caso (sem token, cookies,
+    formatos alternativos) segue pelo caminho normal do flask_jwt_extended.
+    """
+    token = _header_token() if request.method not in jwt_config.exempt_methods else None
+    if token is None:
+        verify_jwt_in_request(optional=optional, refresh=refresh)
+        return
+
+    digest = VerifiedTokenCache.digest(token, str(current_app.config["JWT_SECRET_KEY"]))
+    hit = TOKEN_CACHE.get(digest)
+    if hit is not None:
+        header, claims = hit
+        if (claims.get("type") == ("refresh" if refresh else "access")
+                and float(claims.get("nbf", 0)) <= time.time() + jwt_config.leeway
+                and not REVOKED.is_revoked(claims.get("jti"))):
+            metrics.inc("books_api_auth_cache_total", (("result", "hit"),))
+            g._jwt_extended_jwt_user = {"loaded_user": None}
+            g._jwt_extended_jwt_header = header
+            g._jwt_extended_jwt = claims
+            g._jwt_extended_jwt_location = "headers"
+            return
+    metrics.inc("books_api_auth_cache_total", (("result", "miss"),))
+    # o blocklist loader registrado em install() recusa tokens revogados aqui
+    verify_jwt_in_request(optional=optional, refresh=refresh)
+    if g.get("_jwt_extended_jwt_location") == "headers":
+        TOKEN_CACHE.put(digest, g._jwt_extended_jwt_header, g._jwt_extended_jwt)
+
+def token_identity() -> Optional[str]:
+    """
+    Identidade (`sub`) do access token válido da requisição, ou None (sem
+    token, inválido, expirado ou revogado). Usa o mesmo cache de verify_jwt.
+    """
+    if _header_token() is None:
+        return None
+    try:
+        verify_jwt(optional=True)
+    except Exception:
+        return None
+    claims = g.get("_jwt_extended_jwt") or {}
+    sub = claims.get(jwt_config.identity_claim_key)
+    return None if sub is None else str(sub)
+
+def revoke_current_token() -> None:
+    """Revoga o token da requisição atual (logout)."""
+    claims = g._jwt_extended_jwt
+    jti = claims.get("jti")
+    if jti:
+        REVOKED.revoke(jti, claims.get("exp"))
+        TOKEN_CACHE.discard_jti(jti)
+
+def install(jwt) -> None:
+    """Liga a lista de revogação ao JWTManager (caminho sem cache)."""
+    @jwt.token_in_blocklist_loader
+    def _is_revoked(_header, payload) -> bool:
+        return REVOKED.is_revoked(payload.get("jti"))
+
+def jwt_required(optional: bool = False, refresh: bool = False):
+    """
+    Equivalente ao jwt_required do flask_jwt_extended, com a verificação do
+    token medida como etapa "jwt" (Server-Timing e /metrics) e tokens já
+    verificados servidos do cache.
+    """
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with timed("jwt"):
+                verify_jwt(optional=optional, refresh=refresh)
+            return current_app.ensure_sync(fn)(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,81 @@
+# services/api/utils/bitmap.py
+# Bitmaps de posições (1 bit por linha, empacotados em palavras uint64).
+# Filtros viram AND/OR palavra a palavra e contagens viram popcount, sem
+# tocar nas colunas do frame.
+from typing import Iterable
+
+import numpy as np
+
+_POP8 = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+def _popcount(words: np.ndarray) -> int:
+    if hasattr(np, "bitwise_count"):   # numpy >= 2.0
+        return int(np.bitwise_count(words).sum(dtype=np.int64))
+    return int(_POP8[words.view(np.uint8)].sum(dtype=np.int64))  # independe da ordem dos bytes
+
+class Bitmap:
+    """Conjunto de posições em [0, n) com operações de conjunto vetorizadas."""
+    __slots__ = ("n", "words")
+
+    def __init__(self, n: int, words: np.ndarray):
+        self.n = n
+        self.words = words
+
+    @classmethod
+    def empty(cls, n: int) -> "Bitmap":
+        return cls(n, np.zeros((n + 63) // 64, dtype=np.uint64))
+
+    @classmethod
+    def full(cls, n: int) -> "Bitmap":
+        return ~cls.empty(n)
+
+    @classmethod
+    def from_mask(cls, mask: np.ndarray) -> "Bitmap":
+        n = len(mask)
+        padded = np.zeros(((n + 63) // 64) * 64, dtype=bool)
+        padded[:n] = mask
+        packed = np.packbits(padded, bitorder="little")
+        return cls(n, packed.view("<u8").astype(np.uint64))
+
+    @classmethod
+    def from_positions(cls, positions: np.ndarray, n: int) -> "Bitmap":
+        mask = np.zeros(n, dtype=bool)
+        mask[positions] = True
+        return cls.from_mask(mask)
+
+    @classmethod
+    def union(cls, bitmaps: Iterable["Bitmap"], n: int) -> "Bitmap":
+        out = cls.empty(n)
+        for b in bitmaps:
+            out.words |= b.words
+        return out
+
+    def __and__(self, other: "Bitmap") -> "Bitmap":
+        return Bitmap(self.n, self.words & other.words)
+
+    def __or__(self, other: "Bitmap") -> "Bitmap":
+        return Bitmap(self.n, self.words | other.words)
+
+    def __invert__(self) -> "Bitmap":
+        words = ~self.words
+        tail = self.n % 64
+        if tail and len(words):
+            words[-1] &= np.uint64((1 << tail) - 1)
+        return Bitmap(self.n, words)
+
+    def count(self) -> int:
+        return _popcount(self.words)
+
+    def to_mask(self) -> np.ndarray:
+        bits = np.unpackbits(self.words.astype("<u8").view(np.uint8), bitorder="little")
+        return bits[:self.n].astype(bool)
+
+    def positions(self) -> np.ndarray:
+        """Posições ligadas, em ordem crescente."""
+        return np.flatnonzero(self.to_mask())
+
+    def contains(self, positions: np.ndarray) -> np.ndarray:
+        """Máscara booleana: quais das `positions` estão no conjunto (O(len(positions)))."""
+        pos = np.asarray(positions, dtype=np.int64)
+        bits = self.words[pos >> 6] >> (pos & 63).astype(np.uint64)
+        return (bits & np.uint64(1)).astype(bool)
@@ -0,0 +1,87 @@
+# services/api/utils/changes.py
+# Change log da silver, gravado por clean_books.py em data/silver/books_changes/
+# a cada build: a diferença por `id` entre o books.parquet anterior e o novo.
+# Clientes que já têm o catálogo pedem só o que mudou desde a versão que
+# conhecem (/api/v1/books/changes?since=), em vez de baixar tudo de novo.
+#
+# Layout (format 1):
+#   log.json          versões em ordem: version (sha256[:16] do books.parquet),
+#                     created_at, rows, inserted/updated/deleted e o arquivo do delta
+#   <version>.ndjson  mudanças da versão anterior para esta, uma por linha:
+#                     {"op": "insert"|"update", "id": ..., "book": {registro completo}}
+#                     {"op": "delete", "id": ...}
+# A primeira versão de um log (ou após uma quebra na cadeia) não tem delta.
+import json
+from pathlib import Path
+from typing import Iterator, NamedTuple, Optional
+
+CHANGES_FORMAT = 1
+CHANGES_DIRNAME = "books_changes"
+VERSION_CHARS = 16
+
+class ChangeLog(NamedTuple):
+    directory: Path
+    versions: list[dict]
+
+    @property
+    def current(self) -> str:
+        return self.versions[-1]["version"]
+
+    def since(self, version: str) -> Optional[list[dict]]:
+        """Entradas posteriores a `version` (lista vazia se já é a atual); None se desconhecida."""
+        for i, entry in enumerate(self.versions):
+            if entry["version"] == version:
+                return self.versions[i + 1:]
+        return None
+
+def version_of(sha256: str) -> str:
+    """Versão da silver no change log: prefixo do sha256 do books.parquet."""
+    return sha256[:VERSION_CHARS]
+
+def load_change_log(directory: Path) -> Optional[ChangeLog]:
+    """Lê o log.json; None se ausente, ilegível ou de outro formato."""
+    try:
+        log = json.loads((directory / "log.json").read_text(encoding="utf-8"))
+    except (OSError, json.JSONDecodeError):
+        return None
+    if log.get("format") != CHANGES_FORMAT or not log.get("versions"):
+        return None
+    return ChangeLog(directory, log["versions"])
+
+def merge_op(prev: Optional[dict], change: dict) -> Optional[dict]:
+    """
+    Combina duas mudanças seguidas do mesmo id na mudança líquida
+    (None = nada a enviar: inserido e removido dentro do intervalo).
+    """
+    if prev is None:
+        return change
+    op = change["op"]
+    if prev["op"] == "insert":
+        return None if op == "delete" else {**change, "op": "insert"}
+    if prev["op"] == "delete" and op == "insert":
+        return {**change, "op": "update"}
+    return change
+
+def iter_changes(log: ChangeLog, entries: list[dict]) -> Iterator[bytes]:
+    """
+    Linhas NDJSON das mudanças líquidas nas `entries`. Um único delta é
+    repassado como está, em blocos; vários são compactados por id (memória
+    proporcional ao delta, nunca ao catálogo).
+    """
+    files = [log.directory / e["file"] for e in entries if e.get("file")]
+    if len(files) == 1:
+        with open(files[0], "rb") as f:
+            while chunk := f.read(64 * 1024):
+                yield chunk
+        return
+
+    net: dict[str, dict] = {}
+    for path in files:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                change = json.loads(line)
+                merged = merge_op(net.pop(change["id"], None), change)
+                if merged is not None:
+                    net[change["id"]] = merged   # reinsere: ordem da última mudança
+    for change in net.values():
+        yield (json.dumps(change, ensure_ascii=False) + "\n").encode("utf-8")
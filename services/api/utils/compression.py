@@ -0,0 +1,104 @@
+# services/api/utils/compression.py
+# Compressão negociada (Accept-Encoding) só com a stdlib: gzip e deflate.
+import gzip
+import zlib
+from typing import Callable, Optional, Tuple
+
+from flask import Response
+
+from services.api.utils.helpers import cached_for_version, peek_cached
+
+# ordem de preferência quando o cliente aceita mais de uma com o mesmo q
+SUPPORTED_ENCODINGS = ("gzip", "deflate")
+
+COMPRESSIBLE_MIMETYPES = {
+    "application/json",
+    "application/x-ndjson",
+    "text/csv",
+    "text/plain",
+}
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """Escolhe a melhor codificação suportada a partir do header Accept-Encoding."""
+    if not accept_encoding:
+        return None
+    weights: dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        token, _, params = part.strip().partition(";")
+        token = token.strip().lower()
+        if not token:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[token] = q
+
+    best, best_q = None, 0.0
+    for enc in SUPPORTED_ENCODINGS:
+        q = weights.get(enc, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = enc, q
+    return best
+
+def compress_bytes(data: bytes, encoding: str, level: int) -> bytes:
+    if encoding == "gzip":
+        # mtime=0: sem timestamp no header, os mesmos bytes de entrada dão os mesmos bytes comprimidos
+        return gzip.compress(data, compresslevel=level, mtime=0)
+    if encoding == "deflate":
+        return zlib.compress(data, level)
+    raise ValueError(f"codificação não suportada: {encoding}")
+
+def compress_response(response: Response, encoding: Optional[str], level: int, min_size: int) -> Response:
+    """Comprime respostas dinâmicas (after_request) quando vale a pena."""
+    if response.direct_passthrough or response.is_streamed:
+        return response
+    if response.status_code != 200 or "Content-Encoding" in response.headers:
+        return response
+    if response.mimetype not in COMPRESSIBLE_MIMETYPES:
+        return response
+
+    response.vary.add("Accept-Encoding")
+    if encoding is None:
+        return response
+    data = response.get_data()
+    if len(data) < min_size:
+        return response
+
+    response.set_data(compress_bytes(data, encoding, level))
+    response.headers["Content-Encoding"] = encoding
+    return response
+
+def cached_payload(
+    key: str,
+    encoding: Optional[str],
+    level: int,
+    min_size: int,
+    build: Callable[[], bytes],
+    variant: bool = False,
+) -> Tuple[bytes, Optional[str]]:
+    """
+    Payload de exportação em massa, gerado e comprimido uma única vez por
+    versão do dataset. Downloads repetidos apenas reaproveitam os bytes.
+    `variant=True` quando a chave vem de parâmetros do cliente (cache limitado).
+    Retorna (corpo, codificação efetivamente usada).
+    """
+    raw = cached_for_version(("payload", key), build, variant=variant)
+    if encoding is None or len(raw) < min_size:
+        return raw, None
+    body = cached_for_version(
+        ("payload", key, encoding, level),
+        lambda: compress_bytes(raw, encoding, level),
+        variant=variant,
+    )
+    return body, encoding
+
+def payload_ready(key: str, encoding: Optional[str], level: int, min_size: int) -> bool:
+    """True se cached_payload() responderia só do cache (nada a gerar ou comprimir)."""
+    raw = peek_cached(("payload", key))
+    if raw is None:
+        return False
+    return encoding is None or len(raw) < min_size or peek_cached(("payload", key, encoding, level)) is not None
@@ -0,0 +1,134 @@
+# services/api/utils/health.py
+# Probes de saúde. Liveness é constante (o processo responde); readiness lê só
+# os metadados que o loader e os caches por versão já guardam em memória. A
+# leitura da silver e a montagem dos índices rodam numa thread de aquecimento,
+# nunca dentro da probe, então as probes não disputam I/O com o tráfego real.
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable
+
+from services.api.utils.helpers import (
+    REQUIRED_COLS, book_lookup, cache_status, dataset_path, dataset_version, index_sidecars,
+    load_books_df, load_info, query_index, search_index, sidecars_state, sorted_books, suggester,
+)
+
+# índices montados no aquecimento (os das rotas mais usadas); os demais são
+# preguiçosos e aparecem no status só como informação
+WARM_STEPS: dict[str, Callable[[], Any]] = {
+    "books_df": load_books_df,
+    "index_sidecars": index_sidecars,
+    "sorted_books:title": lambda: sorted_books("title"),
+    "sorted_books:price": lambda: sorted_books("price"),
+    "book_id_index": book_lookup,
+    "search_index": search_index,
+    "suggester": suggester,
+    "query_index": query_index,
+}
+LAZY_KEYS = ("similarity_index", "sorted_ml_features")
+
+WARM_RETRY_SECONDS = 30.0   # após uma falha, espera antes de tentar de novo
+
+def _cache_key(name: str):
+    cache, _, arg = name.partition(":")
+    return (cache, arg) if arg else cache
+
+class WarmUp:
+    """Aquecimento em segundo plano: no máximo uma execução por vez por processo."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thread = None
+        self.error = None
+        self.failed_at = float("-inf")
+
+    def start(self) -> bool:
+        """
+        Dispara o aquecimento se não houver um em andamento (nem uma falha
+        recente). Retorna True se disparou.
+        """
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return False
+            if self.error is not None and time.monotonic() - self.failed_at < WARM_RETRY_SECONDS:
+                return False
+            self._thread = threading.Thread(target=self._run, name="warm-up", daemon=True)
+            self._thread.start()
+            return True
+
+    def running(self) -> bool:
+        t = self._thread
+        return t is not None and t.is_alive()
+
+    def _run(self) -> None:
+        self.error = None
+        try:
+            for build in WARM_STEPS.values():
+                build()
+        except Exception as exc:  # readiness reporta; o tráfego real tenta de novo
+            self.error = f"{type(exc).__name__}: {exc}"
+            self.failed_at = time.monotonic()
+
+WARM_UP = WarmUp()
+
+def readiness() -> tuple[str, dict]:
+    """
+    Status de prontidão a partir de memória: ("ok" | "loading" | "degraded", detalhes).
+    Se a versão carregada não for a atual (ou nada foi carregado), dispara o
+    aquecimento e responde "loading" sem esperar.
+    """
+    version = dataset_version()
+    info = load_info()
+    indexes = {name: cache_status(_cache_key(name)) for name in WARM_STEPS}
+    indexes.update({name: cache_status(name) for name in LAZY_KEYS})
+    warm = all(indexes[name] == "ready" for name in WARM_STEPS)
+
+    if version is None:
+        status = "degraded"            # silver ausente
+    elif not warm:
+        WARM_UP.start()
+        status = "loading"
+    elif not info.get("rows") or not info.get("columns_required_ok"):
+        status = "degraded"
+    else:
+        status = "ok"
+
+    loaded_at = info.get("loaded_at")
+    details = {
+        "dataset_path": info.get("path", str(dataset_path())),
+        "version": version,
+        "loaded_version": info.get("version"),
+        "rows": info.get("rows", 0),
+        "columns_required_ok": info.get("columns_required_ok", False),
+        "loaded_at": None if loaded_at is None else
+            datetime.fromtimestamp(loaded_at, timezone.utc).isoformat(timespec="seconds"),
+        "load_seconds": info.get("load_seconds"),
+        "indexes": indexes,
+        "sidecars": sidecars_state(),
+        "warming": WARM_UP.running(),
+    }
+    if WARM_UP.error:
+        details["warm_up_error"] = WARM_UP.error
+    return status, details
+
+def validate_dataset() -> tuple[bool, dict]:
+    """
+    Validação completa sob demanda (?deep=1): carrega a silver se preciso e
+    confere esquema, linhas e ids.
+    """
+    df = load_books_df()
+    path = dataset_path()
+    cols = set() if df is None else set(df.columns)
+    details = {
+        "dataset_path": str(path),
+        "exists": path.exists(),
+        "rows": 0 if df is None else int(len(df)),
+        "columns_present": sorted(cols),
+        "columns_missing": sorted(REQUIRED_COLS - cols),
+        "columns_required_ok": REQUIRED_COLS.issubset(cols),
+    }
+    if df is not None and "id" in cols:
+        details["null_ids"] = int(df["id"].isna().sum())
+        details["duplicate_ids"] = int(df["id"].duplicated().sum())
+    ok = df is not None and not df.empty and details["columns_required_ok"] and not details.get("null_ids")
+    return ok, details
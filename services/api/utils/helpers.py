@@ -1,14 +1,46 @@
 # services/api/utils/helpers.py
+import os
+import threading
+import time
+from collections import OrderedDict
 from pathlib import Path
+import numpy as np
 import pandas as pd
-from typing import Optional
+from typing import Any, Callable, Hashable, Optional
+from urllib.parse import unquote
+
+from services.api.utils import metrics
+from services.api.utils.changes import CHANGES_DIRNAME, ChangeLog, load_change_log, version_of
+from services.api.utils.history import HISTORY_DIRNAME, BookHistory, get_book_history
+from services.api.utils.pagination import SORT_ORDERS, SortedView, make_sorted_view
+from services.api.utils.query import QueryIndex
+from services.api.utils.search import SearchIndex, Suggester
+from services.api.utils.sidecars import (
+    SIDECAR_DIRNAME, IndexSidecars, file_sha256, load_sidecars, lookup_ids, sidecar_status,
+)
+from services.api.utils.similar import SimilarityIndex
 
 # Raiz do repo (utils -> api -> services -> repo root)
 REPO_ROOT = Path(__file__).resolve().parents[3]
 
-# Arquivos de dados (preferimos Parquet se existir; caso contrário CSV)
-PARQUET_PATH = (REPO_ROOT / "data" / "silver" / "books.parquet").resolve()
-CSV_PATH     = (REPO_ROOT / "data" / "silver" / "books.csv").resolve()
+# Arquivos de dados (preferimos Parquet se existir; caso contrário CSV).
+# BOOKS_SILVER_DIR permite apontar para outra silver (ex.: datasets sintéticos de benchmark).
+SILVER_DIR   = Path(os.getenv("BOOKS_SILVER_DIR", REPO_ROOT / "data" / "silver")).resolve()
+PARQUET_PATH = SILVER_DIR / "books.parquet"
+CSV_PATH     = SILVER_DIR / "books.csv"
+# silver particionada por categoria (clean_books.py); opcional
+PARTITIONED_DIR = SILVER_DIR / "books_by_category"
+# índices pré-calculados do books.parquet (clean_books.py); opcional
+INDEX_DIR = SILVER_DIR / SIDECAR_DIRNAME
+# change log entre builds da silver (clean_books.py); opcional
+CHANGES_DIR = SILVER_DIR / CHANGES_DIRNAME
+# histórico de preço/estoque entre scrapes (clean_books.py); opcional
+HISTORY_DIR = SILVER_DIR / HISTORY_DIRNAME
+HISTORY_REFRESH_INTERVAL = float(os.getenv("HISTORY_REFRESH_INTERVAL", "5.0"))
+
+# instância restrita a algumas categorias (ex.: "poetry,travel"): só essas
+# partições são lidas
+SCOPED_CATEGORIES = [c.strip() for c in os.getenv("BOOKS_CATEGORIES", "").split(",") if c.strip()]
 
 # Esquema esperado na silver (pós-clean_books)
 REQUIRED_COLS = {
@@ -17,55 +49,446 @@ REQUIRED_COLS = {
 }
 OPTIONAL_COLS = {"book_title"}  # compatibilidade se você manteve
 
+# colunas das listagens e da busca (project_list)
+LIST_COLS = ["id", "title", "category", "price", "rating", "product_url", "image_url", "image_path"]
+# colunas de que build_ml_features precisa
+ML_SOURCE_COLS = ["id", "title", "category", "price", "rating", "image_path"]
+
+# metadados da última leitura da silver (respondidos pelo /health/ready sem I/O)
+_LOAD_INFO: dict[str, Any] = {}
+
 def load_books_df() -> Optional[pd.DataFrame]:
+    """
+    Silver já tratada, lida uma vez por versão do arquivo e mantida em memória.
+    O DataFrame é compartilhado entre requisições: não altere in-place.
+    """
+    with metrics.timed("load"):
+        return cached_for_version("books_df", _timed_read_books_df)
+
+def _timed_read_books_df() -> Optional[pd.DataFrame]:
+    t0 = time.perf_counter()
+    version = dataset_version()
+    df = _read_books_df()
+    elapsed = time.perf_counter() - t0
+    _LOAD_INFO.clear()
+    _LOAD_INFO.update({
+        "version": version,
+        "path": str(dataset_path()),
+        "rows": 0 if df is None else int(len(df)),
+        "columns_required_ok": df is not None and REQUIRED_COLS.issubset(df.columns),
+        "loaded_at": time.time(),
+        "load_seconds": round(elapsed, 4),
+    })
+    if metrics.ENABLED:
+        metrics.observe("books_api_dataset_load_duration_seconds", (), elapsed)
+        metrics.inc("books_api_dataset_loads_total")
+        metrics.set_gauge("books_api_dataset_rows", (), 0 if df is None else len(df))
+    return df
+
+def _read_books_df() -> Optional[pd.DataFrame]:
     """Lê a silver já tratada (Parquet se disponível, senão CSV). Nenhuma limpeza aqui."""
-    path = PARQUET_PATH if PARQUET_PATH.exists() else CSV_PATH
-    if not path.exists():
-        return None
+    if SCOPED_CATEGORIES:
+        return read_silver(categories=SCOPED_CATEGORIES)
+    if PARQUET_PATH.exists():
+        return pd.read_parquet(PARQUET_PATH)
+    return _read_csv_df()
 
-    if path.suffix == ".parquet":
-        df = pd.read_parquet(path)
-    else:
-        # dtypes estáveis para CSV
-        dtypes = {
-            "id": "string",
-            "title": "string",
-            "book_title": "string",
-            "category": "string",
-            "UPC": "string",
-            "product_url": "string",
-            "image_url": "string",
-            "image_path": "string",
-        }
-        df = pd.read_csv(path, dtype=dtypes, encoding="utf-8")
-
-        # numéricos conforme silver
-        if "price" in df.columns:
-            df["price"] = pd.to_numeric(df["price"], errors="coerce")
-        if "rating" in df.columns:
-            df["rating"] = pd.to_numeric(df["rating"], errors="coerce").fillna(0).astype(int)
-        if "instock" in df.columns:
-            # pandas nullable int
-            try:
-                df["instock"] = pd.to_numeric(df["instock"], errors="coerce").astype("Int64")
-            except Exception:
-                pass
+def _read_csv_df() -> Optional[pd.DataFrame]:
+    if not CSV_PATH.exists():
+        return None
+    # dtypes estáveis para CSV
+    dtypes = {
+        "id": "string",
+        "title": "string",
+        "book_title": "string",
+        "category": "string",
+        "UPC": "string",
+        "product_url": "string",
+        "image_url": "string",
+        "image_path": "string",
+    }
+    df = pd.read_csv(CSV_PATH, dtype=dtypes, encoding="utf-8")
 
+    # numéricos conforme silver
+    if "price" in df.columns:
+        df["price"] = pd.to_numeric(df["price"], errors="coerce")
+    if "rating" in df.columns:
+        df["rating"] = pd.to_numeric(df["rating"], errors="coerce").fillna(0).astype(int)
+    if "instock" in df.columns:
+        # pandas nullable int
+        try:
+            df["instock"] = pd.to_numeric(df["instock"], errors="coerce").astype("Int64")
+        except Exception:
+            pass
     return df
 
+def read_silver(columns: Optional[list[str]] = None, categories: Optional[list[str]] = None,
+                min_price: Optional[float] = None, max_price: Optional[float] = None,
+                min_rating: Optional[int] = None) -> Optional[pd.DataFrame]:
+    """
+    Leitura seletiva da silver, com projeção e filtros empurrados para o Parquet.
+    Na versão particionada, as categorias escolhem as partições, e preço e
+    rating descartam row groups pelas estatísticas min/max. Sem ela, usa o
+    books.parquet plano (só as estatísticas) ou, em último caso, o CSV
+    filtrado em memória. A ordem é partição -> title/id.
+    """
+    if PARTITIONED_DIR.is_dir() or PARQUET_PATH.exists():
+        import pyarrow.dataset as ds
+
+        if PARTITIONED_DIR.is_dir():
+            dataset = ds.dataset(PARTITIONED_DIR, format="parquet", partitioning="hive")
+        else:
+            dataset = ds.dataset(PARQUET_PATH, format="parquet")
+        cond = None
+        for expr in (
+            ds.field("category").isin(categories) if categories else None,
+            ds.field("price") >= min_price if min_price is not None else None,
+            ds.field("price") <= max_price if max_price is not None else None,
+            ds.field("rating") >= min_rating if min_rating is not None else None,
+        ):
+            if expr is not None:
+                cond = expr if cond is None else cond & expr
+        cols = None if columns is None else [c for c in columns if c in dataset.schema.names]
+        return dataset.to_table(columns=cols, filter=cond).to_pandas()
+
+    df = _read_csv_df()
+    if df is None:
+        return None
+    mask = pd.Series(True, index=df.index)
+    if categories:
+        mask &= df["category"].isin(categories)
+    if min_price is not None:
+        mask &= df["price"] >= min_price
+    if max_price is not None:
+        mask &= df["price"] <= max_price
+    if min_rating is not None:
+        mask &= df["rating"] >= min_rating
+    out = df[mask.fillna(False)]
+    return out if columns is None else out[[c for c in columns if c in out.columns]]
+
+def silver_categories() -> list[str]:
+    """
+    Categorias da silver inteira, na ordem do category_idx de build_ml_features.
+    Vêm dos nomes das partições (sem ler dados) ou, sem elas, do dataset.
+    """
+    def build() -> list[str]:
+        if PARTITIONED_DIR.is_dir():
+            names = [unquote(p.name.partition("=")[2]) for p in PARTITIONED_DIR.glob("category=*")]
+            return sorted({n.strip() for n in names} - {""})
+        df = load_books_df()
+        return [] if df is None else list(_cat_index_map(df, "category"))
+    return cached_for_version("silver_categories", build)
+
+def books_in_categories(categories: list[str], columns: Optional[list[str]] = None) -> Optional[pd.DataFrame]:
+    """
+    Livros das categorias, ordenados por category/title/id. Usa o dataset em
+    memória se já estiver carregado; senão lê só as partições e colunas pedidas.
+    """
+    df = peek_cached("books_df")
+    if df is None:
+        out = read_silver(columns=columns, categories=categories)
+        if out is None:
+            return None
+    else:
+        out = df[df["category"].isin(categories)]
+        out = out if columns is None else out[[c for c in columns if c in out.columns]]
+    keys = [k for k in ("category", "title", "id") if k in out.columns]
+    return out.sort_values(keys, kind="stable").reset_index(drop=True)
+
 def project_list(df: pd.DataFrame) -> pd.DataFrame:
     """Projeção de colunas para listagens e busca."""
-    cols_pref = [
-        "id", "title", "category", "price", "rating",
-        "product_url", "image_url", "image_path"
-    ]
-    cols = [c for c in cols_pref if c in df.columns]
+    cols = [c for c in LIST_COLS if c in df.columns]
     return df[cols].copy()
 
 def dataset_path() -> Path:
     """Retorna o caminho real usado pelo loader (útil para /health)."""
-    #return PARQUET_PATH if PARQUET_PATH.exists() else CSV_PATH
-    return CSV_PATH
+    return PARQUET_PATH if PARQUET_PATH.exists() else CSV_PATH
+
+# Intervalo mínimo entre dois stat() da silver. Cada requisição consulta a
+# versão várias vezes (uma por cache); dentro da janela vale a última leitura.
+# 0 desliga (stat a cada chamada).
+VERSION_CHECK_INTERVAL = float(os.getenv("DATASET_VERSION_TTL", "1.0"))
+_VERSION_PROBE: tuple[float, Optional[str]] = (float("-inf"), None)
+
+def dataset_version() -> Optional[str]:
+    """Identificador barato da versão da silver (mtime + tamanho do arquivo carregado)."""
+    global _VERSION_PROBE
+    now = time.monotonic()
+    checked_at, version = _VERSION_PROBE
+    if now - checked_at < VERSION_CHECK_INTERVAL:
+        return version
+    try:
+        st = dataset_path().stat()
+        version = f"{st.st_mtime_ns:x}-{st.st_size:x}"
+    except OSError:
+        version = None
+    _VERSION_PROBE = (now, version)
+    return version
+
+def load_info() -> dict[str, Any]:
+    """Cópia dos metadados da última leitura da silver ({} se nunca leu)."""
+    return dict(_LOAD_INFO)
+
+def cache_status(key: Hashable) -> str:
+    """'ready' (atual), 'stale' (de outra versão) ou 'missing', sem construir nada."""
+    hit = _cache_get(key)
+    if hit is None:
+        return "missing"
+    return "ready" if hit[0] == dataset_version() else "stale"
+
+# cache em memória: chave -> (versão do dataset, valor). As chaves fixas (um
+# índice, uma exportação) ficam num dict; as que dependem de parâmetros do
+# cliente (amostra, seed, subconjunto de categorias) ficam num LRU limitado,
+# senão um cliente variando o seed faria a memória crescer sem limite.
+_VERSIONED_CACHE: dict[Hashable, tuple[Optional[str], Any]] = {}
+VARIANT_CACHE_SIZE = int(os.getenv("VARIANT_CACHE_SIZE", "32"))
+_VARIANT_CACHE: "OrderedDict[Hashable, tuple[Optional[str], Any]]" = OrderedDict()
+_VARIANT_LOCK = threading.Lock()
+
+def _cache_get(key: Hashable) -> Optional[tuple[Optional[str], Any]]:
+    hit = _VERSIONED_CACHE.get(key)
+    if hit is not None:
+        return hit
+    with _VARIANT_LOCK:
+        hit = _VARIANT_CACHE.get(key)
+        if hit is not None:
+            _VARIANT_CACHE.move_to_end(key)
+        return hit
+
+def _cache_put(key: Hashable, entry: tuple[Optional[str], Any], variant: bool) -> None:
+    if not variant:
+        _VERSIONED_CACHE[key] = entry
+        return
+    with _VARIANT_LOCK:
+        _VARIANT_CACHE[key] = entry
+        _VARIANT_CACHE.move_to_end(key)
+        while len(_VARIANT_CACHE) > max(VARIANT_CACHE_SIZE, 0):
+            _VARIANT_CACHE.popitem(last=False)
+
+def cached_for_version(key: Hashable, builder: Callable[[], Any], variant: bool = False) -> Any:
+    """
+    Memoiza builder() enquanto a versão do dataset não mudar. `variant=True`
+    para chaves derivadas de parâmetros do cliente (vão para o LRU limitado).
+    """
+    version = dataset_version()
+    hit = _cache_get(key)
+    cache_name = str(key[0] if isinstance(key, tuple) else key)
+    if hit is not None and hit[0] == version:
+        metrics.inc("books_api_cache_requests_total", (("cache", cache_name), ("result", "hit")))
+        return hit[1]
+    metrics.inc("books_api_cache_requests_total", (("cache", cache_name), ("result", "miss")))
+    value = builder()
+    _cache_put(key, (version, value), variant)
+    return value
+
+def peek_cached(key: Hashable) -> Any:
+    """Valor em cache para a versão atual, sem construir (None se ausente ou velho)."""
+    hit = _cache_get(key)
+    return hit[1] if hit is not None and hit[0] == dataset_version() else None
+
+# status da última tentativa de abrir os sidecars (lido pelo /health sem I/O)
+_SIDECAR_STATE: dict[str, Any] = {}
+
+def index_sidecars() -> Optional[IndexSidecars]:
+    """
+    Sidecars de índice (memory-map) se descreverem a silver carregada; None
+    se ausentes, velhos ou se a instância lê só algumas categorias.
+    """
+    def build() -> Optional[IndexSidecars]:
+        df = load_books_df()
+        if df is None or not PARQUET_PATH.exists():
+            sc, state = None, "missing"
+        elif SCOPED_CATEGORIES:
+            sc, state = None, "scoped"
+        else:
+            sc, state = load_sidecars(INDEX_DIR, PARQUET_PATH, len(df))
+        _SIDECAR_STATE.update(version=dataset_version(), state=state)
+        return sc
+    return cached_for_version("index_sidecars", build)
+
+def sidecars_state() -> str:
+    """Estado dos sidecars na versão atual: loaded, missing, stale, invalid, scoped ou pending."""
+    if _SIDECAR_STATE.get("version") != dataset_version():
+        return "pending"
+    return _SIDECAR_STATE["state"]
+
+# (mtime do log.json, log lido): o log é regravado a cada build, depois do parquet
+_CHANGE_LOG: tuple[Optional[int], Optional[ChangeLog]] = (None, None)
+
+def change_log() -> Optional[ChangeLog]:
+    """
+    Change log da silver, se ele terminar exatamente na versão do
+    books.parquet atual; None se ausente, atrasado em relação ao parquet ou se
+    a instância lê só algumas categorias.
+    """
+    global _CHANGE_LOG
+    if SCOPED_CATEGORIES or not PARQUET_PATH.exists():
+        return None
+    try:
+        mtime = (CHANGES_DIR / "log.json").stat().st_mtime_ns
+    except OSError:
+        return None
+    if _CHANGE_LOG[0] != mtime:
+        _CHANGE_LOG = (mtime, load_change_log(CHANGES_DIR))
+    log = _CHANGE_LOG[1]
+    if log is None:
+        return None
+
+    def current_sha() -> str:
+        # os sidecars já trazem o sha256 conferido; senão, um hash por versão
+        sc = peek_cached("index_sidecars")
+        return sc.manifest["dataset"]["sha256"] if sc is not None else file_sha256(PARQUET_PATH)
+    return log if log.current == version_of(cached_for_version("dataset_sha256", current_sha)) else None
+
+def book_history() -> BookHistory:
+    """Histórico de preço/estoque (índice em memória, relido quando chega um scrape novo)."""
+    return get_book_history(HISTORY_DIR, refresh_interval=HISTORY_REFRESH_INTERVAL)
+
+def sorted_books(order: str) -> Optional[SortedView]:
+    """Projeção de listagem pré-ordenada (title,id ou price,title,id), por versão."""
+    def build() -> Optional[SortedView]:
+        df = load_books_df()
+        if df is None:
+            return None
+        sc = index_sidecars()
+        if sc is not None and order in ("title", "price"):
+            positions = sc.order_title if order == "title" else sc.order_price
+            return make_sorted_view(project_list(df), order, positions=positions)
+        if order == "price":
+            df = df[df["price"].notna()]
+        return make_sorted_view(project_list(df), order)
+    return cached_for_version(("sorted_books", order), build)
+
+def search_index() -> Optional[SearchIndex]:
+    """Índice invertido dos títulos; doc id = posição em sorted_books("title")."""
+    def build() -> Optional[SearchIndex]:
+        view = sorted_books("title")
+        if view is None or "title" not in view.frame.columns:
+            return None
+        return SearchIndex(view.frame["title"].reset_index(drop=True))
+    return cached_for_version("search_index", build)
+
+def suggester() -> Optional[Suggester]:
+    """Autocomplete de títulos sobre as mesmas posições do search_index()."""
+    def build() -> Optional[Suggester]:
+        view, index = sorted_books("title"), search_index()
+        if view is None or index is None:
+            return None
+        return Suggester(view.keys["title"].tolist(), view.keys["id"].tolist(), index)
+    return cached_for_version("suggester", build)
+
+def query_index() -> Optional[QueryIndex]:
+    """
+    Índices da consulta combinada. Usa a silver completa (inclui 'instock')
+    na mesma ordenação estável de sorted_books("title"), então as posições
+    coincidem com as do frame da listagem.
+    """
+    def build() -> Optional[QueryIndex]:
+        df = load_books_df()
+        if df is None:
+            return None
+        sc = index_sidecars()
+        if sc is None:
+            ordered = df.sort_values(SORT_ORDERS["title"], ascending=True, kind="stable")
+            return QueryIndex(ordered.reset_index(drop=True))
+        # sidecars: ordem, códigos de categoria e ordem de preço levados às posições de title
+        rank = np.empty(len(df), dtype=np.int64)
+        rank[sc.order_title] = np.arange(len(df))
+        return QueryIndex(
+            df.iloc[sc.order_title].reset_index(drop=True),
+            category_codes=(np.asarray(sc.category_codes)[sc.order_title], sc.category_labels),
+            price_order=rank[sc.order_price],
+        )
+    return cached_for_version("query_index", build)
+
+class BookLookup:
+    """
+    Índice de ids da silver junto com o DataFrame de onde ele saiu. Os dois
+    ficam no mesmo item do cache: as posições de `positions()` sempre indexam
+    `df`, mesmo que a silver troque de versão no meio da requisição.
+    Com sidecars, usa a tabela de hash pré-calculada em vez de montar o índice.
+    """
+
+    def __init__(self, df: pd.DataFrame, sidecars: Optional[IndexSidecars]):
+        self.df = df
+        # sidecars de outra versão (outra contagem de linhas) não servem para este df
+        if sidecars is not None and sidecars.manifest.get("dataset", {}).get("rows") != len(df):
+            sidecars = None
+        self.sidecars = sidecars
+        self._ids = df["id"].to_numpy(dtype=object)
+        self._pandas: Optional[tuple[pd.Index, np.ndarray]] = None if sidecars is not None else self._pandas_index()
+
+    def _pandas_index(self) -> tuple[pd.Index, np.ndarray]:
+        first = ~self.df["id"].duplicated(keep="first").to_numpy()
+        # object nos dois lados: índice 'str' contra alvo object converte o índice inteiro a cada consulta
+        return pd.Index(self._ids[first], dtype=object), np.flatnonzero(first)
+
+    def positions(self, ids) -> np.ndarray:
+        """
+        Posições (iloc em `df`) dos ids; -1 se ausente. Em ids duplicados vale
+        a primeira ocorrência, como no filtro por máscara.
+        """
+        ids = list(ids)
+        if self.sidecars is None:
+            return _pandas_lookup(self._pandas, ids)
+        out = lookup_ids(self.sidecars, ids, self._ids)
+        clash = np.flatnonzero(out == -2)   # colisão de hash: resolve pelo índice do pandas
+        if len(clash):
+            if self._pandas is None:
+                self._pandas = self._pandas_index()
+            out[clash] = _pandas_lookup(self._pandas, [ids[i] for i in clash])
+        return out
+
+def book_lookup() -> Optional[BookLookup]:
+    """Snapshot (df, índice de ids) da versão atual; None sem dataset."""
+    def build() -> Optional[BookLookup]:
+        df = load_books_df()
+        return None if df is None else BookLookup(df, index_sidecars())
+    return cached_for_version("book_id_index", build)
+
+def _pandas_lookup(idx: tuple[pd.Index, np.ndarray], ids) -> np.ndarray:
+    index, positions = idx
+    hit = index.get_indexer(pd.Index(list(ids), dtype=object))
+    return np.where(hit >= 0, positions[hit], -1)
+
+def with_catalog(frame: pd.DataFrame, cols=("title", "category", "price", "rating")) -> pd.DataFrame:
+    """Anexa colunas da silver a um frame com 'id' (lookup vetorizado; ausentes ficam nulos)."""
+    lookup = book_lookup()
+    out = frame.copy()
+    if lookup is None:
+        for c in cols:
+            out[c] = None
+        return out
+    df = lookup.df
+    pos = lookup.positions(out["id"].tolist())
+    found = pos >= 0
+    for c in cols:
+        if c not in df.columns:
+            out[c] = None
+            continue
+        col = pd.Series([None] * len(out), index=out.index, dtype=object)
+        col[found] = df[c].to_numpy(dtype=object)[pos[found]]
+        out[c] = col
+    return out
+
+def sorted_ml_features() -> Optional[SortedView]:
+    """Features ML ordenadas por id (paginação por cursor de /ml/features)."""
+    def build() -> Optional[SortedView]:
+        df = load_books_df()
+        return None if df is None else make_sorted_view(build_ml_features(df), "id")
+    return cached_for_version("sorted_ml_features", build)
+
+def similarity_index() -> Optional[tuple[BookLookup, SimilarityIndex]]:
+    """
+    (snapshot de ids, índice de vizinhos), montados do mesmo df: as posições
+    do lookup, as linhas da matriz e `lookup.df` são sempre da mesma versão.
+    """
+    def build() -> Optional[tuple[BookLookup, SimilarityIndex]]:
+        lookup = book_lookup()
+        if lookup is None:
+            return None
+        return lookup, SimilarityIndex(build_ml_features(lookup.df), lookup.df["title"])
+    return cached_for_version("similarity_index", build)
 
 def _cat_index_map(df: pd.DataFrame, col: str) -> dict:
     cats = (
@@ -77,7 +500,7 @@ def _cat_index_map(df: pd.DataFrame, col: str) -> dict:
     )
     return {c: i for i, c in enumerate(cats)}
 
-def build_ml_features(df: pd.DataFrame) -> pd.DataFrame:
+def build_ml_features(df: pd.DataFrame, categories: Optional[list[str]] = None) -> pd.DataFrame:
     """
     Constrói features ML-ready:
       - id (string)
@@ -87,13 +510,15 @@ def build_ml_features(df: pd.DataFrame) -> pd.DataFrame:
       - title_len (int: número de caracteres)
       - title_tok (int: número de tokens por espaço)
       - has_image (0/1)
+    `categories` fixa a codificação de category_idx (ordem de silver_categories());
+    use ao gerar features de um subconjunto para manter os códigos do catálogo.
     """
     d = df.copy()
 
     d["title"] = d["title"].fillna("").astype(str)
     d["category"] = d["category"].fillna("").astype(str)
 
-    cat2idx = _cat_index_map(d, "category")
+    cat2idx = {c: i for i, c in enumerate(categories)} if categories is not None else _cat_index_map(d, "category")
     d["category_idx"] = d["category"].map(cat2idx).fillna(-1).astype(int)
 
     d["title_len"] = d["title"].str.len().fillna(0).astype(int)
@@ -0,0 +1,158 @@
+# services/api/utils/history.py
+# Histórico de preço e estoque entre scrapes, gravado por clean_books.py em
+# data/silver/books_history/. A silver é sobrescrita a cada build; o
+# histórico só recebe novos segmentos.
+#
+# Layout:
+#   events/seg-<ts>.parquet   um por scrape: ts, id, price, instock, listed, só
+#                             para livros novos, alterados ou que saíram do
+#                             catálogo (listed=false). Entre dois eventos o
+#                             valor é o do evento anterior.
+#   trends/seg-<ts>.parquet   um por scrape: agregados de preço/estoque por categoria
+#   */cmp<N>-<ts0>-<ts1>.parquet segmentos compactados no nível N, ordenados por
+#                             (id|category, ts); `cmp-` (versões antigas) é o nível 1
+#   state.parquet             último estado por id (base do próximo diff)
+#   manifest.json             número de scrapes e o último ts registrado
+# ts = epoch em segundos (UTC). Só mudanças viram evento; em disco, zstd com
+# dicionário nas colunas (e DELTA_BINARY_PACKED no ts das tendências).
+#
+# A API lê os arquivos uma vez por mudança no diretório e monta um índice
+# ordenado por (chave, ts): uma consulta é uma busca binária pela chave e
+# outra pelo intervalo de tempo, sem abrir nenhum segmento.
+import threading
+import time
+from datetime import datetime, time as dtime, timezone
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+HISTORY_DIRNAME = "books_history"
+
+class HistoryError(ValueError):
+    """Parâmetro de consulta inválido (vira 400 na API)."""
+
+def parse_instant(value: Optional[str], end: bool = False) -> Optional[int]:
+    """
+    'YYYY-MM-DD' ou ISO 8601 -> epoch s (UTC se sem fuso). Uma data pura como
+    limite final vale até o fim do dia.
+    """
+    if value in (None, ""):
+        return None
+    try:
+        dt = datetime.fromisoformat(value)
+    except ValueError:
+        raise HistoryError(f"data inválida: '{value}' (use YYYY-MM-DD ou ISO 8601)")
+    if end and len(value) == 10:
+        dt = datetime.combine(dt.date(), dtime.max)
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return int(dt.timestamp())
+
+def iso(ts: int) -> str:
+    return datetime.fromtimestamp(int(ts), tz=timezone.utc).isoformat().replace("+00:00", "Z")
+
+class SeriesIndex:
+    """
+    Séries temporais de várias chaves num só bloco ordenado por (chave, ts):
+    `keys` ordenadas e `offsets[i]:offsets[i+1]` é o trecho da chave i.
+    """
+
+    def __init__(self, frame: pd.DataFrame, key: str):
+        frame = frame.sort_values([key, "ts"], kind="stable").reset_index(drop=True)
+        codes, self.keys = pd.factorize(frame[key].astype(str).to_numpy(), sort=True)
+        self.offsets = np.searchsorted(codes, np.arange(len(self.keys) + 1))
+        self.ts = frame["ts"].to_numpy(np.int64)
+        self.frame = frame.drop(columns=[key])
+
+    def __len__(self) -> int:
+        return len(self.ts)
+
+    def span(self, key: str) -> Optional[tuple[int, int]]:
+        i = int(np.searchsorted(self.keys, key))
+        if i >= len(self.keys) or self.keys[i] != key:
+            return None
+        return int(self.offsets[i]), int(self.offsets[i + 1])
+
+    def window(self, key: str, start: Optional[int], end: Optional[int], as_of: bool = False) -> Optional[pd.DataFrame]:
+        """
+        Linhas da chave com start <= ts <= end; None se a chave não existe.
+        Com as_of, inclui a última linha anterior a `start` (o valor vigente no
+        início do intervalo, já que só mudanças são gravadas).
+        """
+        span = self.span(key)
+        if span is None:
+            return None
+        lo, hi = span
+        ts = self.ts[lo:hi]
+        a = lo + (int(np.searchsorted(ts, start, side="left")) if start is not None else 0)
+        b = lo + (int(np.searchsorted(ts, end, side="right")) if end is not None else len(ts))
+        if as_of and a > lo:
+            a -= 1
+        return self.frame.iloc[a:max(a, b)]
+
+class BookHistory:
+    """
+    Índices de eventos por livro e de tendência por categoria. Relê o
+    diretório só quando a lista de arquivos muda (novo scrape ou
+    compactação), checando no máximo a cada `refresh_interval` segundos.
+    """
+
+    def __init__(self, base_dir: Path, refresh_interval: float = 5.0):
+        self.base_dir = Path(base_dir)
+        self.refresh_interval = refresh_interval
+        self._lock = threading.Lock()
+        self._checked_at = float("-inf")
+        self._signature: Optional[tuple] = None
+        self.events: Optional[SeriesIndex] = None
+        self.trends: Optional[SeriesIndex] = None
+
+    def _files(self, sub: str) -> list[Path]:
+        d = self.base_dir / sub
+        return sorted(d.glob("*.parquet")) if d.exists() else []
+
+    def _read(self, sub: str, key: str) -> Optional[SeriesIndex]:
+        files = self._files(sub)
+        if not files:
+            return None
+        frame = pd.concat([pd.read_parquet(p) for p in files], ignore_index=True)
+        # durante uma compactação o cmp novo e as entradas dele coexistem:
+        # (chave, ts) é único por scrape, então a cópia repetida sai aqui
+        frame = frame.drop_duplicates([key, "ts"], keep="first")
+        return SeriesIndex(frame, key)
+
+    def refresh(self) -> "BookHistory":
+        with self._lock:
+            now = time.monotonic()
+            if now - self._checked_at < self.refresh_interval:
+                return self
+            self._checked_at = now
+            signature = tuple(p.name for sub in ("events", "trends") for p in self._files(sub))
+            if signature != self._signature:
+                try:
+                    self.events, self.trends = self._read("events", "id"), self._read("trends", "category")
+                except FileNotFoundError:
+                    self._checked_at = float("-inf")   # compactação em andamento; tenta de novo
+                    return self
+                self._signature = signature
+            return self
+
+    def status(self) -> dict:
+        return {
+            "events": 0 if self.events is None else len(self.events),
+            "books": 0 if self.events is None else len(self.events.keys),
+            "categories": 0 if self.trends is None else len(self.trends.keys),
+        }
+
+_HISTORIES: dict[Path, BookHistory] = {}
+_HISTORIES_LOCK = threading.Lock()
+
+def get_book_history(base_dir: Path, **kwargs) -> BookHistory:
+    """Um índice por diretório e por processo, compartilhado entre requisições."""
+    key = Path(base_dir).resolve()
+    with _HISTORIES_LOCK:
+        history = _HISTORIES.get(key)
+        if history is None:
+            history = _HISTORIES[key] = BookHistory(key, **kwargs)
+        return history.refresh()
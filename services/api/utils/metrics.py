@@ -0,0 +1,149 @@
+# services/api/utils/metrics.py
+# Instrumentação leve do hot path: histogramas por rota/etapa, contadores de
+# carga do dataset e de cache, exportados em formato Prometheus (/metrics) e
+# resumidos no header Server-Timing de cada resposta.
+#
+# Cada worker do gunicorn mantém o próprio registro; /metrics expõe o do
+# worker que atendeu (label "pid" identifica qual).
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+
+from flask import g, has_request_context, request
+
+ENABLED = os.getenv("METRICS_ENABLED", "1") != "0"
+
+# limites em segundos (o último bucket implícito é +Inf)
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+class Histogram:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+_lock = threading.Lock()
+_histograms: dict[tuple, Histogram] = defaultdict(Histogram)
+_counters: dict[tuple, float] = defaultdict(float)
+_gauges: dict[tuple, float] = {}
+
+HELP = {
+    "books_api_request_duration_seconds": ("histogram", "Duração total da requisição por rota."),
+    "books_api_stage_duration_seconds": ("histogram", "Duração de cada etapa do handler (load, filter, sort, serialize, jsonify, jwt...)."),
+    "books_api_dataset_load_duration_seconds": ("histogram", "Leituras da silver do disco."),
+    "books_api_dataset_loads_total": ("counter", "Leituras da silver do disco."),
+    "books_api_dataset_rows": ("gauge", "Linhas da silver carregada."),
+    "books_api_cache_requests_total": ("counter", "Consultas aos caches por versão do dataset."),
+    "books_api_admission_total": ("counter", "Decisões do controle de admissão por classe (served, shed_rate = 429, shed_busy = 503)."),
+    "books_api_auth_cache_total": ("counter", "Verificações de JWT servidas pelo cache de tokens verificados (hit) ou decodificadas (miss)."),
+    "books_api_bulk_jobs_total": ("counter", "Tarefas pesadas enviadas ao executor dedicado (shared=1: reaproveitou uma em andamento)."),
+}
+
+def observe(name: str, labels: tuple, value: float) -> None:
+    with _lock:
+        _histograms[(name, labels)].observe(value)
+
+def inc(name: str, labels: tuple = (), value: float = 1.0) -> None:
+    if not ENABLED:
+        return
+    with _lock:
+        _counters[(name, labels)] += value
+
+def set_gauge(name: str, labels: tuple, value: float) -> None:
+    with _lock:
+        _gauges[(name, labels)] = value
+
+def current_route() -> str:
+    if not has_request_context():
+        return "-"
+    rule = request.url_rule
+    return rule.rule if rule is not None else "<unmatched>"
+
+class timed:
+    """
+    Mede uma etapa: `with timed("filter"): ...`. Dentro de uma requisição, soma
+    no Server-Timing e no histograma da rota; fora dela, só no histograma.
+    """
+    __slots__ = ("stage", "t0")
+
+    def __init__(self, stage: str):
+        self.stage = stage
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        if not ENABLED:
+            return False
+        dt = time.perf_counter() - self.t0
+        route = current_route()
+        observe("books_api_stage_duration_seconds", (("route", route), ("stage", self.stage)), dt)
+        if has_request_context():
+            stages = g.setdefault("_stages", {})
+            stages[self.stage] = stages.get(self.stage, 0.0) + dt
+        return False
+
+def start_request() -> None:
+    g._t0 = time.perf_counter()
+
+def finish_request(response):
+    """after_request: histograma da rota + header Server-Timing."""
+    t0 = g.pop("_t0", None)
+    if not ENABLED or t0 is None:
+        return response
+    total = time.perf_counter() - t0
+    observe(
+        "books_api_request_duration_seconds",
+        (("route", current_route()), ("method", request.method), ("status", str(response.status_code))),
+        total,
+    )
+    parts = [f"{k};dur={v * 1000:.3f}" for k, v in g.pop("_stages", {}).items()]
+    parts.append(f"total;dur={total * 1000:.3f}")
+    response.headers["Server-Timing"] = ", ".join(parts)
+    return response
+
+def _escape(v) -> str:
+    return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _fmt_labels(labels: tuple, extra: tuple = ()) -> str:
+    items = (("pid", os.getpid()),) + labels + extra
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in items) + "}"
+
+def render_prometheus() -> str:
+    """Texto no formato de exposição do Prometheus (0.0.4)."""
+    with _lock:
+        hist = {k: (list(h.counts), h.sum, h.count) for k, h in _histograms.items()}
+        counters = dict(_counters)
+        gauges = dict(_gauges)
+
+    by_name: dict[str, list[str]] = defaultdict(list)
+    for (name, labels), (counts, total, count) in sorted(hist.items()):
+        acc = 0
+        for le, c in zip(BUCKETS + (float("inf"),), counts):
+            acc += c
+            le_s = "+Inf" if le == float("inf") else repr(le)
+            by_name[name].append(f"{name}_bucket{_fmt_labels(labels, (('le', le_s),))} {acc}")
+        by_name[name].append(f"{name}_sum{_fmt_labels(labels)} {total:.6f}")
+        by_name[name].append(f"{name}_count{_fmt_labels(labels)} {count}")
+    for (name, labels), v in sorted(counters.items()):
+        by_name[name].append(f"{name}{_fmt_labels(labels)} {v:g}")
+    for (name, labels), v in sorted(gauges.items()):
+        by_name[name].append(f"{name}{_fmt_labels(labels)} {v:g}")
+
+    lines = []
+    for name in sorted(by_name):
+        kind, text = HELP.get(name, ("untyped", ""))
+        lines.append(f"# HELP {name} {text}")
+        lines.append(f"# TYPE {name} {kind}")
+        lines.extend(by_name[name])
+    return "\n".join(lines) + "\n"
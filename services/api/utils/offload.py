@@ -0,0 +1,118 @@
+# services/api/utils/offload.py
+# Executor dedicado ao trabalho pesado (exportações em massa, uploads grandes
+# de predições). Com -k gthread, todas as requisições disputam o mesmo GIL: o
+# executor limita quantos trabalhos pesados rodam ao mesmo tempo por worker,
+# para que as threads das rotas leves não fiquem competindo com N exportações
+# em paralelo. Pedidos iguais em andamento compartilham o mesmo resultado
+# (single-flight), então vários downloads frios geram o payload uma vez só.
+# A thread da requisição ainda espera o resultado: o executor limita a
+# concorrência do trabalho pesado, não libera threads. Por isso a espera tem
+# prazo (BulkTimeout -> 503 com Retry-After).
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Any, Callable, Hashable, Optional
+
+from services.api.utils import metrics
+
+class BulkTimeout(Exception):
+    """
+    A tarefa não terminou dentro do prazo. `in_progress`: ela segue rodando
+    (e o efeito dela vai acontecer) ou foi abandonada antes de qualquer efeito.
+    """
+
+    def __init__(self, in_progress: bool):
+        super().__init__("tarefa pesada excedeu o prazo")
+        self.in_progress = in_progress
+
+class CommitGate:
+    """
+    Ponto de não retorno de uma tarefa com efeito colateral (ex.: gravar
+    predições): ou a tarefa passa do ponto (commit), ou o chamador desiste
+    dela por timeout (abandon), nunca os dois. Assim um 503 garante que nada
+    foi gravado e o cliente pode repetir o envio sem duplicar linhas.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.state: Optional[str] = None   # None | "committed" | "abandoned"
+
+    def commit(self) -> bool:
+        with self._lock:
+            if self.state is None:
+                self.state = "committed"
+            return self.state == "committed"
+
+    def abandon(self) -> bool:
+        with self._lock:
+            if self.state is None:
+                self.state = "abandoned"
+            return self.state == "abandoned"
+
+class BulkExecutor:
+    def __init__(self, workers: int):
+        self.workers = workers
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bulk") if workers > 0 else None
+        self._lock = threading.RLock()
+        self._inflight: dict[Hashable, Future] = {}
+        self.shared = 0
+
+    def run(self, fn: Callable[[], Any], key: Optional[Hashable] = None,
+            timeout: Optional[float] = None, gate: Optional[CommitGate] = None) -> Any:
+        """
+        Executa `fn` no executor e espera o resultado. Com `key`, chamadas
+        simultâneas com a mesma chave aguardam a mesma execução. Com 0
+        workers, roda na própria thread (modo antigo).
+
+        Passado o `timeout`, levanta BulkTimeout. Sem `gate`, a tarefa segue
+        (o resultado de uma exportação vai para o cache). Com `gate`, ela é
+        abandonada se ainda não chegou ao commit; se já chegou, espera o fim.
+        """
+        if self._pool is None:
+            return fn()
+        with self._lock:
+            fut = self._inflight.get(key) if key is not None else None
+            metrics.inc("books_api_bulk_jobs_total", (("shared", "1" if fut is not None else "0"),))
+            if fut is not None:
+                self.shared += 1
+            else:
+                fut = self._pool.submit(fn)
+                if key is not None:
+                    self._inflight[key] = fut
+                    fut.add_done_callback(lambda f, k=key: self._done(k, f))
+        try:
+            return fut.result(timeout)
+        except FutureTimeout:
+            if gate is None:
+                metrics.inc("books_api_bulk_timeouts_total", (("in_progress", "1"),))
+                raise BulkTimeout(in_progress=True) from None
+            if gate.abandon():
+                fut.cancel()   # ainda na fila: nem começa
+                metrics.inc("books_api_bulk_timeouts_total", (("in_progress", "0"),))
+                raise BulkTimeout(in_progress=False) from None
+        return fut.result()    # já passou do commit: falta pouco
+
+    def _done(self, key: Hashable, fut: Future) -> None:
+        with self._lock:
+            if self._inflight.get(key) is fut:
+                del self._inflight[key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "inflight": len(self._inflight),
+                "queued": self._pool._work_queue.qsize() if self._pool is not None else 0,
+                "shared": self.shared,
+            }
+
+_EXECUTOR: Optional[BulkExecutor] = None
+_EXECUTOR_LOCK = threading.Lock()
+
+def get_bulk_executor() -> BulkExecutor:
+    """Um executor por processo (criado no worker, depois do fork do gunicorn)."""
+    global _EXECUTOR
+    with _EXECUTOR_LOCK:
+        if _EXECUTOR is None:
+            _EXECUTOR = BulkExecutor(int(os.getenv("BULK_WORKERS", 1)))
+        return _EXECUTOR
@@ -0,0 +1,116 @@
+# services/api/utils/pagination.py
+# Paginação por cursor (keyset) sobre ordens pré-ordenadas por versão do dataset.
+import base64
+import binascii
+import json
+from typing import Callable, NamedTuple, Optional
+
+import numpy as np
+import pandas as pd
+
+# ordens estáveis usadas pelas listagens (a última chave é sempre única)
+SORT_ORDERS = {
+    "title": ["title", "id"],
+    "price": ["price", "title", "id"],
+    "id": ["id"],
+}
+
+class CursorError(ValueError):
+    """Cursor malformado ou emitido para outra ordenação."""
+
+class SortedView(NamedTuple):
+    order: str
+    frame: pd.DataFrame            # já ordenado, índice 0..n-1
+    keys: dict[str, np.ndarray]    # colunas de ordenação materializadas para bisect
+
+def make_sorted_view(df: pd.DataFrame, order: str, positions: Optional[np.ndarray] = None) -> SortedView:
+    """`positions` (opcional): a ordem já calculada (iloc), dispensa o sort."""
+    cols = SORT_ORDERS[order]
+    if positions is not None:
+        frame = df.iloc[positions].reset_index(drop=True)
+    else:
+        frame = df.sort_values(cols, ascending=True, kind="stable").reset_index(drop=True)
+    keys = {c: frame[c].to_numpy(dtype=object) for c in cols}
+    return SortedView(order, frame, keys)
+
+def encode_cursor(order: str, values: list) -> str:
+    raw = json.dumps({"o": order, "k": values}, separators=(",", ":"), ensure_ascii=False)
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+def decode_cursor(token: str, order: str) -> list:
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        data = json.loads(raw.decode("utf-8"))
+    except (binascii.Error, UnicodeDecodeError, json.JSONDecodeError) as e:
+        raise CursorError("cursor inválido") from e
+    if not isinstance(data, dict) or data.get("o") != order:
+        raise CursorError("cursor não pertence a esta ordenação")
+    values = data.get("k")
+    if not isinstance(values, list) or len(values) != len(SORT_ORDERS[order]):
+        raise CursorError("cursor inválido")
+    return values
+
+def seek_after(view: SortedView, values: list, lo: int = 0, hi: Optional[int] = None) -> int:
+    """
+    Primeira posição cuja chave composta é estritamente maior que `values`.
+    Busca binária chave a chave: O(k log N), sem máscara sobre o frame.
+    """
+    hi = len(view.frame) if hi is None else hi
+    cols = SORT_ORDERS[view.order]
+    try:
+        for i, (col, v) in enumerate(zip(cols, values)):
+            arr = view.keys[col]
+            left = lo + int(np.searchsorted(arr[lo:hi], v, side="left"))
+            right = lo + int(np.searchsorted(arr[lo:hi], v, side="right"))
+            if i == len(cols) - 1:
+                return right
+            if left == right:
+                return left
+            lo, hi = left, right
+    except TypeError as e:
+        raise CursorError("cursor incompatível com os dados") from e
+    return hi
+
+def _json_value(v):
+    return v.item() if isinstance(v, np.generic) else v
+
+def cursor_page(
+    view: SortedView,
+    after: Optional[str],
+    size: int,
+    mask: Optional[Callable[[pd.DataFrame], pd.Series]] = None,
+    lo: int = 0,
+    hi: Optional[int] = None,
+) -> tuple[pd.DataFrame, Optional[str]]:
+    """
+    Página seguinte a `after` dentro de [lo, hi). Com `mask`, o filtro é
+    aplicado em blocos a partir do ponto de busca, parando ao encher a página.
+    Retorna (itens, próximo cursor ou None).
+    """
+    hi = len(view.frame) if hi is None else hi
+    start = lo
+    if after:
+        start = max(lo, seek_after(view, decode_cursor(after, view.order), lo, hi))
+    size = max(size, 0)
+
+    if mask is None:
+        positions = np.arange(start, min(start + size, hi))
+    else:
+        found: list[np.ndarray] = []
+        n_found, pos, chunk = 0, start, max(size * 4, 256)
+        while pos < hi and n_found < size:
+            end = min(pos + chunk, hi)
+            block = view.frame.iloc[pos:end]
+            hits = np.flatnonzero(mask(block).to_numpy(dtype=bool)) + pos
+            found.append(hits)
+            n_found += len(hits)
+            pos, chunk = end, chunk * 2
+        positions = np.concatenate(found)[:size] if found else np.empty(0, dtype=int)
+
+    items = view.frame.iloc[positions]
+    next_cursor = None
+    if len(positions) == size and size > 0 and positions[-1] + 1 < hi:
+        last = int(positions[-1])
+        values = [_json_value(view.keys[c][last]) for c in SORT_ORDERS[view.order]]
+        next_cursor = encode_cursor(view.order, values)
+    return items, next_cursor
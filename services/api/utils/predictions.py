@@ -0,0 +1,506 @@
+# services/api/utils/predictions.py
+# Persistência assíncrona das predições de /api/v1/ml/predictions.
+#
+# Fluxo: a requisição grava um registro no WAL (append + fsync) e volta 202.
+# O fsync é agrupado: quem chega enquanto outro fsync está em andamento
+# espera o próximo, que cobre todas as linhas escritas até ali (group
+# commit), então POSTs simultâneos não fazem fila de um fsync cada. Uma
+# thread de escrita agrupa tudo o que chegou no intervalo e grava um
+# segmento Parquet por modelo. Segmentos são imutáveis e nomeados por
+# tempo/pid/sequência, então workers diferentes não colidem. Cada worker
+# compacta só os próprios segmentos, por níveis (seg-* -> cmp1-* -> cmp2-*
+# ...): cada linha é reescrita uma vez por nível, não a cada compactação. A
+# leitura (PredictionIndex) é idempotente a essa troca de arquivos.
+#
+# Cada WAL fica com um flock exclusivo enquanto o processo dono vive (e até o
+# flush que o cobre terminar). Órfão é o WAL cujo lock está livre: o kernel
+# solta o flock quando o processo morre, então pids reaproveitados depois de
+# um restart do container não escondem um WAL de processo encerrado.
+import atexit
+import fcntl
+import itertools
+import json
+import os
+import re
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Optional
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+MODEL_NAME_RE = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_.-]{0,127}$")
+LEGACY_NAME_RE = re.compile(r"^\d{8}-\d{6}\.jsonl$")
+
+SEGMENT_SCHEMA = pa.schema([
+    ("id", pa.string()),
+    ("y_pred", pa.float64()),
+    ("ts", pa.int64()),       # epoch em ns do recebimento
+    ("seq", pa.int64()),      # ordem de chegada dentro do mesmo ts
+])
+
+def validate_predictions(preds: list) -> tuple[pd.DataFrame, list[dict], int]:
+    """
+    Valida o lote de uma vez (colunas, não item a item).
+    Retorna (aceitas[id, y_pred], amostra das rejeitadas[{reason, item}], total rejeitado).
+    """
+    records = [p if isinstance(p, dict) else {} for p in preds]
+    frame = pd.DataFrame.from_records(records, columns=["id", "y_pred"])
+
+    # id tem que ser string: lista/objeto/número não viram id via str()
+    not_str = np.fromiter((not isinstance(r.get("id"), str) and r.get("id") is not None for r in records),
+                          dtype=bool, count=len(records))
+    ids = frame["id"].where(~not_str).astype("string").str.strip()
+    y = pd.to_numeric(frame["y_pred"], errors="coerce").astype("float64")
+    missing_id = (~not_str) & (ids.isna() | (ids == "")).to_numpy(dtype=bool)
+    bad_id = missing_id | not_str
+    bad_y = (~bad_id) & y.isna().to_numpy()
+
+    rejected = []
+    for i in (bad_id | bad_y).nonzero()[0][:5]:
+        reason = "missing id" if missing_id[i] else "id não é string" if not_str[i] else "y_pred não numérico"
+        rejected.append({"reason": reason, "item": preds[i]})
+
+    ok = ~(bad_id | bad_y)
+    accepted = pd.DataFrame({"id": ids[ok].astype(str).to_numpy(), "y_pred": y[ok].to_numpy()})
+    return accepted, rejected, int((~ok).sum())
+
+class PredictionSink:
+    """
+    Buffer durável (WAL) + escritor em background para segmentos Parquet.
+
+    `submit` só retorna depois do registro estar no WAL; a thread de escrita
+    descarrega o buffer a cada `flush_interval` segundos ou quando ele passa
+    de `flush_rows` linhas. Na inicialização, WALs órfãos (sem flock) são
+    reaplicados. Se um flush falha, o lote volta ao buffer e os WALs que o
+    cobrem continuam travados até o próximo flush gravá-lo.
+    """
+
+    def __init__(self, base_dir: Path, flush_interval: float = 1.0,
+                 flush_rows: int = 50_000, fsync: bool = True,
+                 compact_min_segments: int = 32):
+        self.base_dir = Path(base_dir)
+        self.wal_dir = self.base_dir / "_wal"
+        self.wal_dir.mkdir(parents=True, exist_ok=True)
+        self.flush_interval = flush_interval
+        self.flush_rows = flush_rows
+        self.fsync = fsync
+        self.compact_min_segments = compact_min_segments
+
+        self._pid = os.getpid()
+        self._token = secrets.token_hex(4)   # nomes únicos mesmo com pid reaproveitado
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()  # um flush por vez: ele decide quais WALs apagar
+        self._sync_lock = threading.Lock()   # um fsync por vez (líder do group commit)
+        self._synced_seq = 0
+        self._wake = threading.Condition(self._lock)
+        self._buffer: dict[str, list[pd.DataFrame]] = {}
+        self._buffered_rows = 0
+        self._seq = 0
+        self._wal_gen = 0
+        self._sealed: list[tuple[Path, Any]] = []   # WALs rotacionados, ainda travados até o flush
+        self._stopped = False
+        self._segment_ids = itertools.count()
+        self.stats = {"requests": 0, "rows": 0, "flushes": 0, "segments": 0,
+                      "compactions": 0, "errors": 0, "fsyncs": 0}
+
+        # o que for reaplicado passa para o WAL novo (durável) antes de os
+        # órfãos serem apagados; até o primeiro flush vale o WAL novo
+        recovered, claimed = self._recover()
+        self._wal = self._open_wal()
+        if recovered:
+            self._wal.write("".join(recovered))
+            self._wal.flush()
+            if self.fsync:
+                os.fsync(self._wal.fileno())
+        for path, f in claimed:
+            path.unlink(missing_ok=True)
+            f.close()
+        self._thread = threading.Thread(target=self._run, name="prediction-sink", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    # --- API ---
+    def submit(self, model: str, accepted: pd.DataFrame) -> int:
+        """Grava no WAL (durável) e enfileira. Retorna o número de sequência."""
+        ts = time.time_ns()
+        line = json.dumps({
+            "model": model, "ts": ts,
+            "id": accepted["id"].tolist(), "y_pred": accepted["y_pred"].tolist(),
+        }, ensure_ascii=False) + "\n"
+
+        with self._lock:
+            self._seq += 1
+            seq = self._seq
+            self._wal.write(line)
+            self._wal.flush()
+            self._enqueue(model, accepted, ts, seq)
+            self.stats["requests"] += 1
+            if self._buffered_rows >= self.flush_rows:
+                self._wake.notify()
+        if self.fsync:
+            self._sync_to(seq)
+        return seq
+
+    def model_dir(self, model: str) -> Path:
+        return prediction_model_dir(self.base_dir, model)
+
+    def flush(self) -> None:
+        """Descarrega o buffer agora (usado no shutdown e pela thread)."""
+        with self._flush_lock:
+            with self._lock:
+                if not self._buffer:
+                    return
+                batch, self._buffer, self._buffered_rows = self._buffer, {}, 0
+                self._rotate_wal()
+                sealed = list(self._sealed)
+            written = set()
+            try:
+                for model, frames in batch.items():
+                    self._write_segment(model, pd.concat(frames, ignore_index=True))
+                    written.add(model)
+            except Exception:
+                # o que não foi gravado volta ao buffer e sai no próximo flush;
+                # os WALs selados seguem travados, cobrindo essas linhas
+                with self._lock:
+                    for model, frames in batch.items():
+                        if model not in written:
+                            self._buffer[model] = frames + self._buffer.get(model, [])
+                            self._buffered_rows += sum(len(f) for f in frames)
+                self.stats["errors"] += 1
+                raise
+            with self._lock:
+                for item in sealed:
+                    self._sealed.remove(item)
+            for path, f in sealed:
+                path.unlink(missing_ok=True)
+                f.close()
+            self.stats["flushes"] += 1
+            for model in batch:
+                try:
+                    self._compact(model)
+                except Exception:
+                    self.stats["errors"] += 1
+
+    def close(self) -> None:
+        with self._lock:
+            if self._stopped:
+                return
+            self._stopped = True
+            self._wake.notify()
+        self._thread.join(timeout=5)
+        try:
+            self.flush()
+        finally:
+            with self._lock:
+                # tudo gravado: o WAL corrente (vazio) não precisa sobrar como "órfão"
+                if not self._buffer and not self._sealed:
+                    self._wal_path(self._wal_gen).unlink(missing_ok=True)
+                self._wal.close()
+                for _, f in self._sealed:
+                    f.close()
+
+    # --- internos ---
+    def _sync_to(self, seq: int) -> None:
+        """
+        Garante o fsync do WAL até `seq`. Só um fsync roda por vez, fora do
+        lock do buffer; ele cobre tudo o que já estava escrito quando começou,
+        então quem esperava na fila normalmente já sai coberto.
+        """
+        with self._sync_lock:
+            if self._synced_seq >= seq:
+                return
+            with self._lock:
+                target = self._seq
+                # dup: a rotação do WAL pode fechar o arquivo durante o fsync
+                fd = os.dup(self._wal.fileno())
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+            with self._lock:
+                self._synced_seq = max(self._synced_seq, target)
+                self.stats["fsyncs"] += 1
+
+    def _enqueue(self, model: str, accepted: pd.DataFrame, ts: int, seq: int) -> None:
+        frame = accepted.assign(ts=ts, seq=seq)
+        self._buffer.setdefault(model, []).append(frame)
+        self._buffered_rows += len(frame)
+        self.stats["rows"] += len(frame)
+
+    def _wal_path(self, gen: int) -> Path:
+        return self.wal_dir / f"wal-{self._pid}-{self._token}-{gen}.log"
+
+    def _open_wal(self):
+        # criado com outro nome e travado antes de virar wal-*.log: quem
+        # procura órfãos nunca vê um WAL novo ainda sem flock
+        path = self._wal_path(self._wal_gen)
+        tmp = path.with_suffix(".new")
+        f = open(tmp, "a", encoding="utf-8")
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        os.replace(tmp, path)
+        return f
+
+    def _rotate_wal(self) -> None:
+        """Troca o WAL corrente (com o lock); o antigo fica selado e travado até o flush."""
+        if self.fsync:
+            # linhas do WAL antigo ainda sem fsync não podem depender do arquivo novo
+            os.fsync(self._wal.fileno())
+            self._synced_seq = self._seq
+        self._wal.flush()
+        self._sealed.append((self._wal_path(self._wal_gen), self._wal))
+        self._wal_gen += 1
+        self._wal = self._open_wal()
+
+    def _write_segment(self, model: str, frame: pd.DataFrame) -> Path:
+        table = pa.Table.from_pandas(frame[["id", "y_pred", "ts", "seq"]],
+                                     schema=SEGMENT_SCHEMA, preserve_index=False)
+        self.stats["segments"] += 1
+        return self._write_table(model, "seg", table)
+
+    def _write_table(self, model: str, prefix: str, table: pa.Table) -> Path:
+        out_dir = self.model_dir(model)
+        out_dir.mkdir(parents=True, exist_ok=True)
+        name = f"{prefix}-{time.time_ns()}-{self._pid}-{next(self._segment_ids)}.parquet"
+        tmp = out_dir / f".{name}.tmp"
+        pq.write_table(table, tmp)
+        os.replace(tmp, out_dir / name)
+        return out_dir / name
+
+    def _compact(self, model: str) -> None:
+        """
+        Compactação por níveis dos arquivos deste processo: quando um nível
+        junta `compact_min_segments` arquivos, eles viram um só no nível
+        seguinte (seg -> cmp1 -> cmp2 ...). Um arquivo compactado não volta
+        a ser reescrito até o nível dele encher.
+        """
+        out_dir = self.model_dir(model)
+        by_level: dict[int, list[Path]] = {}
+        for p in out_dir.glob("*.parquet"):
+            level = _segment_level(p)
+            if level is not None and _segment_pid(p) == self._pid:
+                by_level.setdefault(level, []).append(p)
+        level = 0
+        while level <= max(by_level, default=-1):
+            own = sorted(by_level.get(level, []))
+            if len(own) >= self.compact_min_segments:
+                table = pa.concat_tables(pq.read_table(p, schema=SEGMENT_SCHEMA) for p in own)
+                table = table.sort_by([("id", "ascending"), ("ts", "ascending"), ("seq", "ascending")])
+                out = self._write_table(model, f"cmp{level + 1}", table)
+                for p in own:
+                    p.unlink(missing_ok=True)
+                by_level.setdefault(level + 1, []).append(out)
+                self.stats["compactions"] += 1
+            level += 1
+
+    def _recover(self) -> tuple[list[str], list[tuple[Path, Any]]]:
+        """
+        Reivindica os WALs órfãos (flock livre) e retorna (linhas válidas,
+        arquivos reivindicados, ainda travados). Quem chama apaga os arquivos
+        depois de regravar as linhas no próprio WAL.
+        """
+        valid: list[str] = []
+        claimed: list[tuple[Path, Any]] = []
+        for tmp in self.wal_dir.glob("wal-*.new"):   # criado e nunca publicado (crash)
+            f = _lock_orphan(tmp)
+            if f is not None:
+                tmp.unlink(missing_ok=True)
+                f.close()
+        for path in sorted(self.wal_dir.glob("wal-*.log")):
+            f = _lock_orphan(path)
+            if f is None:
+                continue
+            claimed.append((path, f))
+            for raw in f:
+                line = raw.decode("utf-8", errors="replace")
+                try:
+                    rec = json.loads(line)
+                except json.JSONDecodeError:
+                    break  # última linha truncada por crash
+                frame = pd.DataFrame({"id": rec["id"], "y_pred": rec["y_pred"]})
+                self._seq += 1
+                self._enqueue(rec["model"], frame, rec["ts"], self._seq)
+                valid.append(line if line.endswith("\n") else line + "\n")
+        return valid, claimed
+
+    def _run(self) -> None:
+        last = time.monotonic()
+        while True:
+            with self._lock:
+                if self._stopped:
+                    return
+                timeout = max(0.0, self.flush_interval - (time.monotonic() - last))
+                if self._buffered_rows < self.flush_rows:
+                    self._wake.wait(timeout)
+                if self._stopped:
+                    return
+            try:
+                self.flush()
+            except Exception:
+                pass  # contabilizado em stats; o WAL garante a reaplicação
+            last = time.monotonic()
+
+def prediction_model_dir(base_dir: Path, model: str) -> Path:
+    """Diretório dos segmentos de um modelo (não depende de um sink aberto)."""
+    return Path(base_dir) / f"model={model}"
+
+def orphan_wals(base_dir: Path) -> bool:
+    """True se há WAL sem dono vivo (flock livre) esperando reaplicação em `base_dir`."""
+    wal_dir = Path(base_dir) / "_wal"
+    for path in wal_dir.glob("wal-*.log") if wal_dir.is_dir() else ():
+        f = _lock_orphan(path)
+        if f is not None:
+            f.close()
+            return True
+    return False
+
+def _lock_orphan(path: Path):
+    """Abre e trava o WAL se ninguém o segura (dono morto); None se vivo ou já apagado."""
+    try:
+        f = open(path, "rb")
+    except FileNotFoundError:
+        return None
+    try:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        f.close()
+        return None
+    # outro processo pode tê-lo reaplicado e apagado entre o glob e o lock
+    if not path.exists() or os.stat(path).st_ino != os.fstat(f.fileno()).st_ino:
+        f.close()
+        return None
+    return f
+
+def _segment_level(path: Path) -> Optional[int]:
+    """Nível de compactação pelo prefixo: seg = 0, cmpN = N (cmp, de versões antigas, = 1)."""
+    prefix = path.stem.split("-", 1)[0]
+    if prefix == "seg":
+        return 0
+    if prefix.startswith("cmp"):
+        return int(prefix[3:] or 1) if prefix[3:].isdigit() or not prefix[3:] else None
+    return None
+
+def _segment_pid(path: Path) -> Optional[int]:
+    try:
+        return int(path.stem.split("-")[2])
+    except (IndexError, ValueError):
+        return None
+
+class PredictionIndex:
+    """
+    Última predição por livro de um modelo, mantida incrementalmente: a cada
+    refresh só os arquivos ainda não vistos são lidos e mesclados. Como a
+    mescla fica com o maior (ts, seq) por id, reler linhas já vistas (após
+    uma compactação) não muda o resultado. Também lê os JSONL legados
+    (predictions_<model>_<YYYYmmdd-HHMMSS>.jsonl).
+    """
+
+    def __init__(self, model_dir: Path, legacy_dir: Optional[Path] = None,
+                 refresh_interval: float = 1.0):
+        self.model_dir = Path(model_dir)
+        self.model = self.model_dir.name.split("=", 1)[-1]
+        self.legacy_dir = legacy_dir
+        self.refresh_interval = refresh_interval
+        self.generation = 0
+        self._lock = threading.Lock()
+        self._seen: set[str] = set()
+        self._last_refresh = float("-inf")
+        self._latest = pd.DataFrame({
+            "id": pd.Series(dtype=object), "y_pred": pd.Series(dtype="float64"),
+            "ts": pd.Series(dtype="int64"), "seq": pd.Series(dtype="int64"),
+        })
+
+    def _files(self) -> list[Path]:
+        files = sorted(self.model_dir.glob("*.parquet")) if self.model_dir.exists() else []
+        if self.legacy_dir is not None:
+            files += [p for p in self.legacy_dir.glob(f"predictions_{self.model}_*.jsonl")
+                      if LEGACY_NAME_RE.match(p.name[len(f"predictions_{self.model}_"):])]
+        return files
+
+    def _read(self, path: Path) -> pd.DataFrame:
+        if path.suffix == ".parquet":
+            return pq.read_table(path, schema=SEGMENT_SCHEMA).to_pandas()
+        frame = pd.read_json(path, lines=True, dtype={"id": str})
+        stamp = path.stem.rsplit("_", 1)[-1]
+        ts = int(time.mktime(time.strptime(stamp, "%Y%m%d-%H%M%S"))) * 1_000_000_000
+        return pd.DataFrame({"id": frame.get("id"), "y_pred": frame.get("y_pred")}).assign(ts=ts, seq=0)
+
+    def refresh(self) -> pd.DataFrame:
+        """Última predição por id, ordenada por y_pred desc (id asc no empate)."""
+        with self._lock:
+            now = time.monotonic()
+            if now - self._last_refresh < self.refresh_interval:
+                return self._latest
+            self._last_refresh = now
+
+            files = self._files()
+            new = []
+            for path in files:
+                if path.name in self._seen:
+                    continue
+                try:
+                    new.append(self._read(path))
+                except FileNotFoundError:
+                    continue  # compactado no meio do caminho; virá no cmp-*
+                self._seen.add(path.name)
+            self._seen &= {p.name for p in files}
+
+            if new:
+                merged = pd.concat([self._latest, *new], ignore_index=True)
+                merged = (merged.sort_values(["id", "ts", "seq"], kind="stable")
+                                .drop_duplicates("id", keep="last"))
+                self._latest = (merged.sort_values(["y_pred", "id"], ascending=[False, True], kind="stable")
+                                      .reset_index(drop=True))
+                self.generation += 1
+            return self._latest
+
+_SINKS: dict[Path, PredictionSink] = {}
+_SINKS_LOCK = threading.Lock()
+
+def get_prediction_sink(base_dir: Path, **kwargs) -> PredictionSink:
+    """
+    Um sink por diretório e por processo (create_app pode ser chamado mais de
+    uma vez). Criar o sink abre um WAL e uma thread: a API só chama isto no
+    primeiro POST de predições (ou para reaplicar um WAL órfão).
+    """
+    key = Path(base_dir).resolve()
+    with _SINKS_LOCK:
+        sink = _SINKS.get(key)
+        if sink is None or sink._pid != os.getpid():
+            sink = _SINKS[key] = PredictionSink(key, **kwargs)
+        return sink
+
+def has_predictions(model_dir: Path, legacy_dir: Optional[Path] = None) -> bool:
+    """True se o modelo tem algo gravado em disco (segmentos ou JSONL legado)."""
+    model_dir = Path(model_dir)
+    if model_dir.is_dir() and any(model_dir.glob("*.parquet")):
+        return True
+    if legacy_dir is None:
+        return False
+    model = model_dir.name.split("=", 1)[-1]
+    return any(LEGACY_NAME_RE.match(p.name[len(f"predictions_{model}_"):])
+               for p in Path(legacy_dir).glob(f"predictions_{model}_*.jsonl"))
+
+# índices por modelo: o nome vem da URL, então só os mais recentes ficam em memória
+INDEX_CACHE_SIZE = int(os.getenv("PREDICTION_INDEX_CACHE_SIZE", "16"))
+_INDEXES: "OrderedDict[Path, PredictionIndex]" = OrderedDict()
+
+def get_prediction_index(model_dir: Path, **kwargs) -> PredictionIndex:
+    """
+    Um índice por modelo e por processo, compartilhado entre requisições; LRU
+    de INDEX_CACHE_SIZE modelos (um índice despejado é reconstruído do disco).
+    """
+    key = Path(model_dir).resolve()
+    with _SINKS_LOCK:
+        index = _INDEXES.get(key)
+        if index is None:
+            index = _INDEXES[key] = PredictionIndex(key, **kwargs)
+        _INDEXES.move_to_end(key)
+        while len(_INDEXES) > max(INDEX_CACHE_SIZE, 1):
+            _INDEXES.popitem(last=False)
+        return index
@@ -0,0 +1,182 @@
+# services/api/utils/profiling.py
+# Profiling sob demanda em workers vivos: cProfile por requisição e um
+# amostrador de pilhas (sys._current_frames) que gera "folded stacks",
+# o formato lido por flamegraph.pl / speedscope.
+import cProfile
+import io
+import marshal
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Optional
+
+# pilhas cujo topo está nestes módulos são threads ociosas (esperando I/O ou lock)
+IDLE_FILES = {"threading.py", "selectors.py", "socket.py", "queue.py", "socketserver.py", "ssl.py"}
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})".replace(";", ",")
+
+class StackSampler:
+    """
+    Amostra as pilhas das threads do processo a cada `interval` segundos,
+    por até `seconds` segundos. Pode ficar restrito a uma thread.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._stacks: Counter = Counter()
+        self.samples = 0
+        self.started_at: Optional[float] = None
+        self.interval = 0.0
+        self.seconds = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, seconds: float, interval: float, thread_id: Optional[int] = None,
+              include_idle: bool = False) -> None:
+        with self._lock:
+            if self.running:
+                raise RuntimeError("amostrador já está em execução")
+            self._stacks = Counter()
+            self.samples = 0
+            self.started_at = time.time()
+            self.interval, self.seconds = interval, seconds
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self._run, args=(time.monotonic() + seconds, interval, thread_id, include_idle),
+                name="stack-sampler", daemon=True,
+            )
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def _run(self, deadline: float, interval: float, thread_id: Optional[int], include_idle: bool) -> None:
+        me = threading.get_ident()
+        while not self._stop.is_set() and time.monotonic() < deadline:
+            frames = sys._current_frames()
+            batch = []
+            for tid, frame in frames.items():
+                if tid == me or (thread_id is not None and tid != thread_id):
+                    continue
+                if not include_idle and Path(frame.f_code.co_filename).name in IDLE_FILES:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                batch.append(";".join(reversed(stack)))
+            del frames
+            with self._lock:
+                self._stacks.update(batch)
+                self.samples += 1
+            self._stop.wait(interval)
+
+    def folded(self) -> str:
+        with self._lock:
+            return "".join(f"{k} {v}\n" for k, v in self._stacks.most_common())
+
+    def top(self, n: int = 30) -> list[dict]:
+        """Funções mais quentes: 'self' (topo da pilha) e 'total' (em qualquer nível)."""
+        with self._lock:
+            stacks = list(self._stacks.items())
+        own, total = Counter(), Counter()
+        n_samples = sum(c for _, c in stacks) or 1
+        for key, count in stacks:
+            frames = key.split(";")
+            own[frames[-1]] += count
+            for f in set(frames):
+                total[f] += count
+        return [
+            {"function": f, "self": c, "self_pct": round(100 * c / n_samples, 2),
+             "total": total[f], "total_pct": round(100 * total[f] / n_samples, 2)}
+            for f, c in own.most_common(n)
+        ]
+
+    def status(self) -> dict:
+        return {
+            "running": self.running,
+            "started_at": self.started_at,
+            "seconds": self.seconds,
+            "interval_ms": round(self.interval * 1000, 3),
+            "samples": self.samples,
+            "stacks": len(self._stacks),
+        }
+
+# amostrador contínuo do worker (um por processo)
+WORKER_SAMPLER = StackSampler()
+
+# uma requisição perfilada por vez no processo: o cProfile é global ao
+# interpretador (no Python 3.12+ um segundo enable() falha com "Another
+# profiling tool is already active") e o gunicorn roda várias threads
+_REQUEST_PROFILE_LOCK = threading.Lock()
+
+class ProfilerBusy(RuntimeError):
+    """Outra requisição já está sendo perfilada neste worker."""
+
+class RequestProfiler:
+    """Perfil de uma única requisição: cProfile ('text'/'pstats') ou amostragem ('sample')."""
+
+    def __init__(self, mode: str, interval: float = 0.001):
+        self.mode = mode
+        self.interval = interval
+        self._profile: Optional[cProfile.Profile] = None
+        self._sampler: Optional[StackSampler] = None
+        self._locked = False
+
+    def start(self) -> None:
+        """Começa a perfilar; ProfilerBusy se outra requisição já está sendo perfilada."""
+        if not _REQUEST_PROFILE_LOCK.acquire(blocking=False):
+            raise ProfilerBusy("outra requisição já está sendo perfilada neste worker")
+        self._locked = True
+        try:
+            if self.mode == "sample":
+                self._sampler = StackSampler()
+                self._sampler.start(seconds=300, interval=self.interval,
+                                    thread_id=threading.get_ident(), include_idle=True)
+            else:
+                self._profile = cProfile.Profile()
+                self._profile.enable()
+        except ValueError as e:   # outra ferramenta (fora da API) já usa o profiler
+            self._profile = None
+            self._release()
+            raise ProfilerBusy(str(e)) from None
+        except BaseException:
+            self._release()
+            raise
+
+    def stop(self) -> None:
+        """Para e libera o profiler do processo (pode ser chamado mais de uma vez)."""
+        if self._sampler is not None:
+            self._sampler.stop()
+        if self._profile is not None:
+            self._profile.disable()
+        self._release()
+
+    def _release(self) -> None:
+        if self._locked:
+            self._locked = False
+            _REQUEST_PROFILE_LOCK.release()
+
+    def text(self, sort: str = "cumulative", limit: int = 40) -> str:
+        out = io.StringIO()
+        pstats.Stats(self._profile, stream=out).strip_dirs().sort_stats(sort).print_stats(limit)
+        return out.getvalue()
+
+    def pstats_dump(self) -> bytes:
+        """Mesmo conteúdo de Profile.dump_stats (abre com pstats/snakeviz)."""
+        self._profile.create_stats()
+        return marshal.dumps(self._profile.stats)
+
+    def folded(self) -> str:
+        return self._sampler.folded()
@@ -0,0 +1,238 @@
+# services/api/utils/query.py
+# Consulta combinada (título, categoria, faixa de preço, faixa de rating,
+# estoque) com um planejador simples sobre índices pré-computados por versão.
+#
+# As linhas são identificadas pela posição na ordem (title, id) — a mesma de
+# sorted_books("title") e do SearchIndex. Categoria, rating e estoque têm
+# bitmaps (um por valor), combinados por AND/OR; preço tem as posições
+# ordenadas por valor. O planejador estima a cardinalidade de cada predicado
+# pelos índices (popcount / searchsorted, sem tocar no frame), começa pelo
+# mais seletivo e aplica os demais por interseção de listas ordenadas ou por
+# sondagem só nas posições candidatas.
+from typing import Callable, NamedTuple, Optional
+
+import numpy as np
+import pandas as pd
+
+from services.api.utils.bitmap import Bitmap
+
+# interseção de listas só compensa se a outra lista não for muito maior que os
+# candidatos atuais; acima disso, sondar os valores nas posições é mais barato
+INTERSECT_RATIO = 4
+
+SORT_FIELDS = ("title", "id", "category", "price", "rating", "instock")
+FACET_FIELDS = ("category", "rating", "instock", "price_bucket")
+
+# limites das faixas de preço das facetas: <10, 10-20, ..., 50+
+PRICE_BUCKET_EDGES = (10, 20, 30, 40, 50)
+
+def price_bucket_labels(edges=PRICE_BUCKET_EDGES) -> list[str]:
+    return ([f"<{edges[0]}"]
+            + [f"{a}-{b}" for a, b in zip(edges, edges[1:])]
+            + [f"{edges[-1]}+"])
+
+class QueryError(ValueError):
+    """Parâmetro de consulta inválido."""
+
+class Step(NamedTuple):
+    name: str
+    kind: str                                       # "bitmap", "sorted" ou "scan"
+    estimate: int
+    positions: Optional[Callable[[], np.ndarray]]   # posições em ordem crescente
+    probe: Callable[[np.ndarray], np.ndarray]       # máscara sobre posições candidatas
+
+class QueryIndex:
+    """Índices por coluna sobre o frame na ordem (title, id)."""
+
+    def __init__(self, frame: pd.DataFrame, category_codes: Optional[tuple[np.ndarray, list]] = None,
+                 price_order: Optional[np.ndarray] = None):
+        """
+        `category_codes` (códigos por linha, rótulos ordenados) e `price_order`
+        (posições com preço, ordenadas por preço) podem vir pré-calculados,
+        nas posições de `frame`.
+        """
+        self.n_rows = len(frame)
+        self.id = frame["id"].astype(object).to_numpy()
+        self.title = frame["title"].astype(object).to_numpy() if "title" in frame else None
+
+        # categoria e rating: um bitmap por valor
+        self.category = frame["category"].astype(object).to_numpy() if "category" in frame else None
+        self.category_bits: dict[str, Bitmap] = {}
+        if self.category is not None:
+            codes, cats = category_codes if category_codes is not None else pd.factorize(self.category, sort=True)
+            for i, cat in enumerate(cats):
+                self.category_bits[str(cat)] = Bitmap.from_mask(codes == i)
+
+        self.rating = frame["rating"].to_numpy(dtype=np.float64, na_value=np.nan) if "rating" in frame else None
+        self.rating_bits: dict[int, Bitmap] = {}
+        if self.rating is not None:
+            for r in np.unique(self.rating[~np.isnan(self.rating)]):
+                self.rating_bits[int(r)] = Bitmap.from_mask(self.rating == r)
+
+        # estoque: com (> 0) e sem
+        self.instock = frame["instock"].to_numpy(dtype=np.float64, na_value=0) if "instock" in frame else None
+        if self.instock is not None:
+            has = Bitmap.from_mask(self.instock > 0)
+            self.instock_bits = {True: has, False: ~has}
+
+        # preço: posições ordenadas por preço (NaN fora) + valores para searchsorted
+        self.price = frame["price"].to_numpy(dtype=np.float64, na_value=np.nan) if "price" in frame else None
+        if self.price is not None:
+            if price_order is not None:
+                self.price_order = np.asarray(price_order, dtype=np.int64)
+            else:
+                valid = np.flatnonzero(~np.isnan(self.price))
+                self.price_order = valid[np.argsort(self.price[valid], kind="stable")]
+            self.price_sorted = self.price[self.price_order]
+
+        # facetas: um código inteiro por linha (-1 = sem valor) e o rótulo de cada código
+        self.facet_codes: dict[str, tuple[np.ndarray, list]] = {}
+        if self.category is not None:
+            self.facet_codes["category"] = (codes.astype(np.int32), [str(c) for c in cats])
+        if self.rating is not None:
+            values = sorted(self.rating_bits)
+            r_codes = np.searchsorted(np.array(values, dtype=np.float64), self.rating).astype(np.int32)
+            r_codes[np.isnan(self.rating)] = -1
+            self.facet_codes["rating"] = (r_codes, values)
+        if self.instock is not None:
+            self.facet_codes["instock"] = ((self.instock > 0).astype(np.int32), ["false", "true"])
+        if self.price is not None:
+            p_codes = np.searchsorted(np.array(PRICE_BUCKET_EDGES, dtype=np.float64), self.price, side="right")
+            p_codes = p_codes.astype(np.int32)
+            p_codes[np.isnan(self.price)] = -1
+            self.facet_codes["price_bucket"] = (p_codes, price_bucket_labels())
+
+    def categories_matching(self, text: str) -> list[str]:
+        """Categorias que contêm `text` (case-insensitive), como no /books/search."""
+        t = text.lower()
+        return [c for c in self.category_bits if t in c.lower()]
+
+    def category_bitmap(self, text: str) -> Bitmap:
+        return Bitmap.union((self.category_bits[c] for c in self.categories_matching(text)), self.n_rows)
+
+    def rating_bitmap(self, lo: Optional[float] = None, hi: Optional[float] = None) -> Bitmap:
+        return Bitmap.union(
+            (b for r, b in self.rating_bits.items() if (lo is None or r >= lo) and (hi is None or r <= hi)),
+            self.n_rows,
+        )
+
+    def facets(self, positions: np.ndarray, fields=FACET_FIELDS) -> dict[str, dict]:
+        """
+        Contagens por valor nas posições casadas: um bincount dos códigos de
+        cada campo, custo O(len(positions)) e não do catálogo.
+        """
+        out = {}
+        for field in fields:
+            if field not in self.facet_codes:
+                continue
+            codes, labels = self.facet_codes[field]
+            sel = codes[positions]
+            counts = np.bincount(sel[sel >= 0], minlength=len(labels))
+            out[field] = {labels[i]: int(n) for i, n in enumerate(counts) if n}
+        return out
+
+    # --- predicados -------------------------------------------------------
+
+    def _bitmap_step(self, category: Optional[str], min_rating: Optional[float],
+                     max_rating: Optional[float], instock: Optional[bool]) -> Optional[Step]:
+        """Categoria, rating e estoque viram um único bitmap (AND dos predicados)."""
+        parts, names = [], []
+        if category and self.category is not None:
+            parts.append(self.category_bitmap(category))
+            names.append("category")
+        if (min_rating is not None or max_rating is not None) and self.rating is not None:
+            parts.append(self.rating_bitmap(min_rating, max_rating))
+            names.append("rating")
+        if instock is not None and self.instock is not None:
+            parts.append(self.instock_bits[instock])
+            names.append("instock")
+        if not parts:
+            return None
+        bits = parts[0]
+        for p in parts[1:]:
+            bits = bits & p
+        return Step("&".join(names), "bitmap", bits.count(), bits.positions, bits.contains)
+
+    def _price_step(self, lo: Optional[float], hi: Optional[float]) -> Step:
+        a = 0 if lo is None else int(np.searchsorted(self.price_sorted, lo, side="left"))
+        b = len(self.price_sorted) if hi is None else int(np.searchsorted(self.price_sorted, hi, side="right"))
+        b = max(a, b)
+
+        def probe(pos):
+            p = self.price[pos]
+            m = ~np.isnan(p)
+            if lo is not None:
+                m &= p >= lo
+            if hi is not None:
+                m &= p <= hi
+            return m
+        return Step("price", "sorted", b - a, lambda: np.sort(self.price_order[a:b]), probe)
+
+    def _title_step(self, text: str) -> Step:
+        # sem índice de substring: só como sondagem, sempre por último
+        def probe(pos):
+            return pd.Series(self.title[pos], dtype=object).str.contains(
+                text, case=False, na=False, regex=False).to_numpy(dtype=bool)
+        return Step("title", "scan", self.n_rows, None, probe)
+
+    def plan(self, title: Optional[str] = None, category: Optional[str] = None,
+             min_price: Optional[float] = None, max_price: Optional[float] = None,
+             min_rating: Optional[float] = None, max_rating: Optional[float] = None,
+             instock: Optional[bool] = None) -> list[Step]:
+        steps = []
+        bitmap = self._bitmap_step(category, min_rating, max_rating, instock)
+        if bitmap is not None:
+            steps.append(bitmap)
+        if (min_price is not None or max_price is not None) and self.price is not None:
+            steps.append(self._price_step(min_price, max_price))
+        if title and self.title is not None:
+            steps.append(self._title_step(title))
+        return sorted(steps, key=lambda s: (s.positions is None, s.estimate))
+
+    def execute(self, steps: list[Step]) -> tuple[np.ndarray, list[dict]]:
+        """Posições (ordem title, id) que satisfazem todos os passos + o plano executado."""
+        cand: Optional[np.ndarray] = None
+        trace = []
+        for step in steps:
+            if cand is None:
+                method = "index" if step.positions is not None else "scan"
+                cand = step.positions() if step.positions is not None else np.arange(self.n_rows)
+                if step.positions is None:
+                    cand = cand[step.probe(cand)]
+            elif step.kind == "sorted" and step.estimate <= len(cand) * INTERSECT_RATIO:
+                method = "intersect"
+                cand = np.intersect1d(cand, step.positions(), assume_unique=True)
+            else:
+                method = "probe"
+                cand = cand[step.probe(cand)]
+            trace.append({"step": step.name, "method": method, "estimate": step.estimate, "rows": int(len(cand))})
+            if not len(cand):
+                break
+        if cand is None:
+            cand = np.arange(self.n_rows)
+        return cand, trace
+
+    def sort(self, pos: np.ndarray, cols: list[str], ascending: list[bool]) -> np.ndarray:
+        """Reordena as posições pelas chaves pedidas; empates seguem (title, id)."""
+        if not cols or not len(pos):
+            return pos
+        data = {c: getattr(self, c)[pos] for c in cols if getattr(self, c, None) is not None}
+        if not data:
+            return pos
+        keys = pd.DataFrame(data)
+        order = keys.sort_values(list(data), ascending=[a for c, a in zip(cols, ascending) if c in data],
+                                 kind="stable", na_position="last").index.to_numpy()
+        return pos[order]
+
+def parse_sort(spec: str) -> tuple[list[str], list[bool]]:
+    """'price,-rating' -> (['price', 'rating'], [True, False])."""
+    cols, asc = [], []
+    for part in (p.strip() for p in spec.split(",")):
+        if not part:
+            continue
+        name = part.lstrip("+-")
+        if name not in SORT_FIELDS:
+            raise QueryError(f"sort: campo inválido '{name}' (use {', '.join(SORT_FIELDS)})")
+        cols.append(name)
+        asc.append(not part.startswith("-"))
+    return cols, asc
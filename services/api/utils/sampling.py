@@ -0,0 +1,116 @@
+# services/api/utils/sampling.py
+# Amostragem e divisão treino/teste do /ml/training-data no servidor.
+#
+# Cada linha recebe, por id, dois valores uniformes em [0, 1): um decide a
+# amostra, o outro o lado do split. Eles vêm de um hash vetorizado do id
+# (pd.util.hash_array) misturado com o seed (splitmix64). Então a escolha não
+# depende da ordem nem do tamanho do dataset: um livro fica do mesmo lado
+# enquanto o seed for o mesmo, entre versões da silver. Com `stratify`, cada
+# estrato é cortado no próprio quantil: a proporção fica exata por estrato e,
+# quando o estrato muda, só as linhas perto do corte podem trocar de lado.
+from typing import Mapping, NamedTuple, Optional
+
+import numpy as np
+import pandas as pd
+
+STRATIFY_FIELDS = ("target_high_rating", "category_idx")
+SPLITS = ("train", "test")
+DEFAULT_TEST_SIZE = 0.2
+
+_GOLDEN = np.uint64(0x9E3779B97F4A7C15)
+_SAMPLE_STREAM, _SPLIT_STREAM = 1, 2
+
+class SamplingError(ValueError):
+    """Parâmetro de amostragem inválido."""
+
+class Sampling(NamedTuple):
+    sample: Optional[float]
+    split: Optional[str]
+    test_size: float
+    stratify: Optional[str]
+    seed: int
+
+    def key(self) -> str:
+        """Sufixo da chave do cache de exportação (uma entrada por combinação)."""
+        parts = [f"sample={self.sample}" if self.sample is not None else "",
+                 f"split={self.split}:{self.test_size}" if self.split else "",
+                 f"stratify={self.stratify}" if self.stratify else "",
+                 f"seed={self.seed}"]
+        return "[" + ",".join(p for p in parts if p) + "]"
+
+def parse_sampling(args: Mapping[str, str]) -> Optional[Sampling]:
+    """Lê sample/split/test_size/stratify/seed; None se nenhum seleciona linhas."""
+    def fraction(name: str, default=None, closed: bool = True) -> Optional[float]:
+        raw = args.get(name)
+        if raw in (None, ""):
+            return default
+        try:
+            value = float(raw)
+        except ValueError:
+            raise SamplingError(f"{name} deve ser numérico")
+        if not (0 < value < 1 or (closed and value == 1)):
+            raise SamplingError(f"{name} deve estar em (0, 1{']' if closed else ')'}")
+        return value
+
+    sample = fraction("sample")
+    test_size = fraction("test_size", DEFAULT_TEST_SIZE, closed=False)
+    split = (args.get("split") or "").lower() or None
+    if split is not None and split not in SPLITS:
+        raise SamplingError("split deve ser train ou test")
+    stratify = args.get("stratify") or None
+    if stratify is not None and stratify not in STRATIFY_FIELDS:
+        raise SamplingError(f"stratify: use {' ou '.join(STRATIFY_FIELDS)}")
+    try:
+        seed = int(args.get("seed") or 0)
+    except ValueError:
+        raise SamplingError("seed deve ser inteiro")
+    if sample is None and split is None:
+        return None
+    return Sampling(sample, split, test_size, stratify, seed)
+
+def _splitmix64(x: np.ndarray) -> np.ndarray:
+    x = x + _GOLDEN
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+def id_uniforms(ids, seed: int, stream: int) -> np.ndarray:
+    """Valor uniforme em [0, 1) por id, função só de (id, seed, stream)."""
+    return _uniforms(_hash_ids(ids), seed, stream)
+
+def _hash_ids(ids) -> np.ndarray:
+    # ids são únicos: categorize=False evita o factorize (mesmos hashes, ~6x mais rápido)
+    return pd.util.hash_array(np.asarray(ids, dtype=object), categorize=False)
+
+def _uniforms(id_hash: np.ndarray, seed: int, stream: int) -> np.ndarray:
+    with np.errstate(over="ignore"):
+        salt = _splitmix64(np.array([seed & 0xFFFFFFFFFFFFFFFF], dtype=np.uint64) * np.uint64(4) + np.uint64(stream))
+        mixed = _splitmix64(id_hash ^ salt)
+    return (mixed >> np.uint64(11)).astype(np.float64) / float(1 << 53)
+
+def _below(u: np.ndarray, fraction: float, strata: Optional[np.ndarray]) -> np.ndarray:
+    """u < fraction; com estratos, as round(fraction * n) linhas de menor u em cada um."""
+    if strata is None:
+        return u < fraction
+    codes, _ = pd.factorize(strata)                # estrato nulo (-1) fica de fora
+    order = np.lexsort((u, codes))                 # por estrato, depois por u
+    grouped = codes[order]
+    first = np.searchsorted(grouped, grouped, side="left")
+    size = np.searchsorted(grouped, grouped, side="right") - first
+    keep = np.empty(len(u), dtype=bool)
+    keep[order] = (np.arange(len(u)) - first < np.rint(fraction * size)) & (grouped >= 0)
+    return keep
+
+def select_rows(frame: pd.DataFrame, spec: Sampling) -> np.ndarray:
+    """Máscara das linhas escolhidas por `spec` (amostra e, dentro dela, o lado do split)."""
+    id_hash = _hash_ids(frame["id"].to_numpy())
+    strata = frame[spec.stratify].to_numpy() if spec.stratify else None
+    mask = np.ones(len(frame), dtype=bool)
+    if spec.sample is not None and spec.sample < 1:
+        mask = _below(_uniforms(id_hash, spec.seed, _SAMPLE_STREAM), spec.sample, strata)
+    if spec.split is not None:
+        pos = np.flatnonzero(mask)
+        test = _below(_uniforms(id_hash[pos], spec.seed, _SPLIT_STREAM), spec.test_size,
+                      None if strata is None else strata[pos])
+        mask[pos] = test if spec.split == "test" else ~test
+    return mask
@@ -0,0 +1,252 @@
+# services/api/utils/search.py
+# Busca full-text ranqueada (BM25) sobre o 'title' já normalizado da silver.
+#
+# O índice é construído sobre a projeção ordenada por (title, id): o doc id
+# é a posição nessa ordem, então empates de score saem em ordem alfabética.
+# A consulta só toca as postings dos termos pedidos (custo proporcional às
+# ocorrências, não ao tamanho do catálogo) e o top-k sai de um heap.
+import heapq
+import math
+import re
+import unicodedata
+from bisect import bisect_left
+from typing import Callable, Optional
+
+import numpy as np
+import pandas as pd
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# parâmetros usuais do BM25
+K1 = 1.2
+B = 0.75
+MAX_PREFIX_EXPANSIONS = 50
+MIN_PREFIX_LEN = 2
+MAX_EDITS = 2
+
+def normalize_query(s: str) -> str:
+    """Mesma normalização de _normalize_text (clean_books.py) aplicada às consultas."""
+    s = str(s or "").strip().lower()
+    s = unicodedata.normalize("NFKD", s).encode("ascii", "ignore").decode("ascii")
+    s = re.sub(r"[^a-z0-9 _-]+", " ", s)
+    return re.sub(r"\s+", " ", s).strip()
+
+def tokenize(s: str) -> list[str]:
+    return TOKEN_RE.findall(normalize_query(s))
+
+class SearchIndex:
+    """Índice invertido (termo -> docs, tf) com vocabulário ordenado para prefixos."""
+
+    def __init__(self, titles: pd.Series):
+        n = len(titles)
+        tokens = titles.fillna("").astype(str).str.findall(TOKEN_RE.pattern)
+        self.n_docs = n
+        self.doc_len = tokens.str.len().to_numpy(dtype=np.float64)
+        self.avgdl = float(self.doc_len.mean()) if n else 0.0
+
+        flat = tokens.explode().dropna()
+        docs = flat.index.to_numpy(dtype=np.int64)
+        term_ids, terms = pd.factorize(flat.to_numpy(dtype=object))
+
+        # tf por (termo, doc): chaves únicas já saem ordenadas por termo e depois doc
+        key = term_ids.astype(np.int64) * max(n, 1) + docs
+        uniq, tf = np.unique(key, return_counts=True)
+        self._post_term = uniq // max(n, 1)
+        self._post_doc = (uniq % max(n, 1)).astype(np.int64)
+        self._post_tf = tf.astype(np.float64)
+        self._bounds = np.searchsorted(self._post_term, np.arange(len(terms) + 1))
+
+        self.term_id = {t: i for i, t in enumerate(terms)}
+        self.vocab = sorted(self.term_id)
+
+    def postings(self, term: str) -> tuple[np.ndarray, np.ndarray]:
+        i = self.term_id.get(term)
+        if i is None:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        lo, hi = self._bounds[i], self._bounds[i + 1]
+        return self._post_doc[lo:hi], self._post_tf[lo:hi]
+
+    def expand_prefix(self, prefix: str, limit: int = MAX_PREFIX_EXPANSIONS) -> list[str]:
+        """Termos do vocabulário que começam com `prefix` (os de maior df primeiro)."""
+        lo = bisect_left(self.vocab, prefix)
+        hi = bisect_left(self.vocab, prefix + "\x7f")
+        cands = self.vocab[lo:hi]
+        if len(cands) > limit:
+            cands = heapq.nlargest(limit, cands, key=lambda t: self.doc_freq(t))
+        return cands
+
+    def doc_freq(self, term: str) -> int:
+        i = self.term_id[term]
+        return int(self._bounds[i + 1] - self._bounds[i])
+
+    def _bm25(self, term: str) -> tuple[np.ndarray, np.ndarray]:
+        docs, tf = self.postings(term)
+        if not len(docs):
+            return docs, tf
+        df = len(docs)
+        idf = math.log(1 + (self.n_docs - df + 0.5) / (df + 0.5))
+        norm = K1 * (1 - B + B * self.doc_len[docs] / (self.avgdl or 1.0))
+        return docs, idf * tf * (K1 + 1) / (tf + norm)
+
+    def score(self, query: str, prefix: bool = True) -> tuple[np.ndarray, np.ndarray]:
+        """
+        (docs, scores) de todos os docs que casam com algum termo. Com `prefix`,
+        o último termo, se não for uma palavra completa do vocabulário, casa por
+        prefixo (autocomplete), valendo o melhor score entre as expansões.
+        """
+        terms = tokenize(query)
+        if not terms:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+
+        slots: list[tuple[np.ndarray, np.ndarray]] = []
+        last = len(terms) - 1
+        for i, term in enumerate(terms):
+            if prefix and i == last and term not in self.term_id and len(term) >= MIN_PREFIX_LEN:
+                expansions = self.expand_prefix(term) or [term]
+                parts = [self._bm25(t) for t in expansions]
+                slots.append(_reduce(parts, np.maximum))
+            else:
+                slots.append(self._bm25(term))
+        return _reduce(slots, np.add)
+
+    def top_k(self, query: str, k: int, prefix: bool = True,
+              allowed: Optional[Callable[[np.ndarray], np.ndarray]] = None,
+              ) -> tuple[list[tuple[int, float]], np.ndarray]:
+        """
+        Top-k (doc, score) por score desc (doc asc no empate) e todos os docs
+        que casaram, em ordem crescente. `allowed(docs)` devolve a máscara dos
+        docs que passam nos demais filtros (só é avaliada sobre os casados).
+        """
+        docs, scores = self.score(query, prefix)
+        if allowed is not None:
+            keep = allowed(docs)
+            docs, scores = docs[keep], scores[keep]
+        matched, total = docs, int(len(docs))
+        if k <= 0:
+            return [], matched
+        if total > k:
+            # corta no k-ésimo score (empates inclusos) antes do heap
+            keep = scores >= np.partition(scores, total - k)[total - k]
+            docs, scores = docs[keep], scores[keep]
+        top = heapq.nlargest(k, zip(scores.tolist(), (-docs).tolist()))
+        return [(-d, s) for s, d in top], matched
+
+def _reduce(parts: list[tuple[np.ndarray, np.ndarray]], ufunc) -> tuple[np.ndarray, np.ndarray]:
+    """Agrupa (docs, valores) por doc aplicando `ufunc` (add/maximum) — O(P log P)."""
+    parts = [p for p in parts if len(p[0])]
+    if not parts:
+        return np.empty(0, dtype=np.int64), np.empty(0)
+    if len(parts) == 1:
+        return parts[0]
+    docs = np.concatenate([p[0] for p in parts])
+    vals = np.concatenate([p[1] for p in parts])
+    order = np.argsort(docs, kind="stable")
+    docs, vals = docs[order], vals[order]
+    starts = np.flatnonzero(np.r_[True, docs[1:] != docs[:-1]])
+    return docs[starts], ufunc.reduceat(vals, starts)
+
+def bounded_levenshtein(a: str, b: str, max_dist: int) -> int:
+    """Distância de edição limitada: devolve max_dist + 1 assim que passar do limite."""
+    if abs(len(a) - len(b)) > max_dist:
+        return max_dist + 1
+    prev = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        cur = [i] + [0] * len(b)
+        for j, cb in enumerate(b, 1):
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != cb))
+        if min(cur) > max_dist:
+            return max_dist + 1
+        prev = cur
+    return prev[-1]
+
+def deletes(term: str, depth: int) -> set[str]:
+    """Variações de `term` com até `depth` letras removidas (inclui o próprio termo)."""
+    out, frontier = {term}, {term}
+    for _ in range(depth):
+        frontier = {w[:i] + w[i + 1:] for w in frontier for i in range(len(w))}
+        out |= frontier
+    return out
+
+def max_edits(term: str) -> int:
+    """Tolerância por tamanho do termo: nenhuma até 3 letras, 1 até 6, depois MAX_EDITS."""
+    return 0 if len(term) <= 3 else 1 if len(term) <= 6 else MAX_EDITS
+
+class Suggester:
+    """
+    Autocomplete de títulos. Em ordem de preferência:
+      1. títulos que começam com o prefixo (bisect na lista ordenada);
+      2. títulos com palavras que casam com o texto (SearchIndex, último termo por prefixo);
+      3. o mesmo após corrigir termos fora do vocabulário por distância de edição limitada.
+    """
+
+    def __init__(self, titles: list, ids: list, index: SearchIndex):
+        # mesmas posições do SearchIndex; títulos nulos ficam no fim da ordenação
+        # e ficam fora do bisect
+        self.titles = titles
+        self.ids = ids
+        self._n_sorted = sum(isinstance(t, str) for t in titles)
+        self.index = index
+        # índice de deleções (estilo SymSpell): dois termos a até d edições
+        # compartilham alguma variação com até d letras removidas
+        self._deletes: dict[str, list[str]] = {}
+        for term in index.vocab:
+            for v in deletes(term, MAX_EDITS):
+                self._deletes.setdefault(v, []).append(term)
+
+    def _prefix_range(self, prefix: str) -> tuple[int, int]:
+        lo = bisect_left(self.titles, prefix, 0, self._n_sorted)
+        return lo, bisect_left(self.titles, prefix + "\x7f", lo, self._n_sorted)
+
+    def correct(self, term: str) -> Optional[str]:
+        """Termo do vocabulário mais próximo (menor distância, maior df)."""
+        limit = max_edits(term)
+        if not limit:
+            return None
+        cands = {c for v in deletes(term, limit) for c in self._deletes.get(v, ())}
+        best: Optional[tuple[int, int, str]] = None
+        for cand in cands:
+            d = bounded_levenshtein(term, cand, limit)
+            if d <= limit and (best is None or (d, -self.index.doc_freq(cand), cand) < best):
+                best = (d, -self.index.doc_freq(cand), cand)
+        return best[2] if best else None
+
+    def suggest(self, text: str, k: int = 10, fuzzy: bool = True) -> tuple[list[tuple[str, str]], Optional[str]]:
+        """Até k pares (id, title) distintos por título e a consulta corrigida (se houve correção)."""
+        prefix = normalize_query(text)
+        out: list[tuple[str, str]] = []
+        seen: set[str] = set()
+
+        def add(pos: int) -> bool:
+            title = self.titles[pos]
+            if title not in seen:
+                seen.add(title)
+                out.append((self.ids[pos], title))
+            return len(out) >= k
+
+        if not prefix or k <= 0:
+            return out, None
+        lo, hi = self._prefix_range(prefix)
+        for pos in range(lo, hi):
+            if add(pos):
+                return out, None
+
+        def by_terms(query: str) -> bool:
+            hits, _ = self.index.top_k(query, k + len(out))
+            return any(add(doc) for doc, _ in hits)
+
+        if by_terms(prefix) or out or not fuzzy:
+            return out, None
+
+        terms = tokenize(prefix)
+        fixed = []
+        for i, term in enumerate(terms):
+            is_prefix = i == len(terms) - 1 and self.index.expand_prefix(term)
+            if term in self.index.term_id or is_prefix:
+                fixed.append(term)
+            else:
+                fixed.append(self.correct(term) or term)
+        if fixed == terms:
+            return out, None
+        corrected = " ".join(fixed)
+        by_terms(corrected)
+        return out, corrected if out else None
@@ -0,0 +1,102 @@
+# services/api/utils/sidecars.py
+# Índices pré-calculados da silver ("sidecars"), gravados por clean_books.py em
+# data/silver/books_index/ ao lado do books.parquet e abertos aqui com
+# memory-map. Cada worker deixa de ordenar/fatorar o catálogo a cada carga: as
+# páginas ficam no cache do SO, compartilhadas entre os processos.
+#
+# Layout (format 1), posições = linhas do books.parquet:
+#   order_title.npy      int64  posições na ordem SORT_ORDERS["title"] (title, id)
+#   order_price.npy      int64  posições com preço, na ordem (price, title, id)
+#   id_hash.npy          uint64 pd.util.hash_array dos ids (1ª ocorrência, sem nulos), crescente
+#   id_pos.npy           int64  posição de cada entrada de id_hash
+#   category_codes.npy   int32  código por linha (pd.factorize(sort=True); -1 = nulo)
+#   category_labels.json        rótulo de cada código
+#   manifest.json               formato, linhas, tamanho e sha256 do books.parquet
+import hashlib
+import json
+from pathlib import Path
+from typing import NamedTuple, Optional
+
+import numpy as np
+import pandas as pd
+
+SIDECAR_FORMAT = 1
+SIDECAR_DIRNAME = "books_index"
+ARRAYS = ("order_title", "order_price", "id_hash", "id_pos", "category_codes")
+
+class IndexSidecars(NamedTuple):
+    order_title: np.ndarray
+    order_price: np.ndarray
+    id_hash: np.ndarray
+    id_pos: np.ndarray
+    category_codes: np.ndarray
+    category_labels: list[str]
+    manifest: dict
+
+def file_sha256(path: Path) -> str:
+    with open(path, "rb") as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
+
+def sidecar_status(index_dir: Path, parquet_path: Path, rows: int) -> tuple[str, Optional[dict]]:
+    """
+    ("ok", manifest) se os sidecars descrevem exatamente este books.parquet;
+    senão ("missing" | "stale" | "invalid", manifest ou None).
+    """
+    try:
+        manifest = json.loads((index_dir / "manifest.json").read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return "missing", None
+    except (OSError, json.JSONDecodeError):
+        return "invalid", None
+    dataset = manifest.get("dataset", {})
+    if manifest.get("format") != SIDECAR_FORMAT or dataset.get("rows") != rows:
+        return "stale", manifest
+    try:
+        if parquet_path.stat().st_size != dataset.get("size") or file_sha256(parquet_path) != dataset.get("sha256"):
+            return "stale", manifest
+    except OSError:
+        return "missing", manifest
+    return "ok", manifest
+
+def load_sidecars(index_dir: Path, parquet_path: Path, rows: int) -> tuple[Optional[IndexSidecars], str]:
+    """
+    Abre os sidecars (memory-map, só leitura) se forem da versão atual da
+    silver. Retorna (sidecars ou None, status).
+    """
+    status, manifest = sidecar_status(index_dir, parquet_path, rows)
+    if status != "ok":
+        return None, status
+    try:
+        arrays = {name: np.load(index_dir / f"{name}.npy", mmap_mode="r") for name in ARRAYS}
+        labels = json.loads((index_dir / "category_labels.json").read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None, "invalid"
+    if len(arrays["order_title"]) != rows or len(arrays["category_codes"]) != rows:
+        return None, "invalid"
+    return IndexSidecars(**arrays, category_labels=labels, manifest=manifest), "loaded"
+
+def hash_ids(ids) -> np.ndarray:
+    """Mesmo hash usado por clean_books.py ao gravar id_hash.npy."""
+    return pd.util.hash_array(np.asarray(ids, dtype=object))
+
+def lookup_ids(sc: IndexSidecars, ids, id_column: np.ndarray) -> np.ndarray:
+    """
+    Posições dos ids (1ª ocorrência) pela tabela de hash ordenada; -1 se
+    ausente. Cada acerto é conferido contra a coluna de ids; colisões de hash
+    (que nunca apontam para o id certo) resultam em -2, para o chamador
+    resolver pelo caminho lento.
+    """
+    ids = np.asarray(ids, dtype=object)
+    if len(ids) == 0:
+        return np.empty(0, dtype=np.int64)
+    h = hash_ids(ids)
+    slot = np.searchsorted(sc.id_hash, h)
+    inside = slot < len(sc.id_hash)
+    hit = np.zeros(len(ids), dtype=bool)
+    hit[inside] = sc.id_hash[slot[inside]] == h[inside]
+    out = np.full(len(ids), -1, dtype=np.int64)
+    pos = np.asarray(sc.id_pos[slot[hit]], dtype=np.int64)
+    same = id_column[pos] == ids[hit]
+    out[np.flatnonzero(hit)[same]] = pos[same]
+    out[np.flatnonzero(hit)[~same]] = -2
+    return out
@@ -0,0 +1,94 @@
+# services/api/utils/similar.py
+# "Mais como este": vizinhos por similaridade de cosseno sobre as features de
+# build_ml_features + vetores de tokens do título.
+#
+# Montado uma vez por versão do dataset, com uma linha por livro na ordem da
+# silver. Só os blocos densos (numérico e título) viram matriz, em float32 e
+# escritos direto num único array; a categoria fica como código inteiro e
+# entra no cosseno como `cat == cat[pos]` (o produto de dois one-hot), sem as
+# n_categorias colunas. Os vizinhos de um livro saem de um produto
+# matriz-vetor seguido de argpartition.
+import numpy as np
+import pandas as pd
+
+from services.api.utils.search import TOKEN_RE
+
+NUMERIC_COLS = ("price", "rating", "title_len", "title_tok")
+TITLE_DIMS = 128          # buckets do hashing dos tokens do título
+
+# peso de cada bloco no cosseno (cada bloco é normalizado antes de pesar)
+WEIGHTS = {"numeric": 0.5, "category": 1.0, "title": 1.5}
+
+def _l2_rows(m: np.ndarray) -> np.ndarray:
+    """Normaliza as linhas in-place (linhas nulas ficam nulas)."""
+    norms = np.linalg.norm(m, axis=1)
+    norms[norms == 0] = 1
+    m /= norms[:, None].astype(m.dtype)
+    return m
+
+def _numeric_block(features: pd.DataFrame, out: np.ndarray) -> None:
+    cols = [c for c in NUMERIC_COLS if c in features.columns]
+    x = features[cols].to_numpy(dtype=np.float64, na_value=np.nan)
+    mean = np.nanmean(x, axis=0) if len(x) else np.zeros(len(cols))
+    std = np.nanstd(x, axis=0) if len(x) else np.ones(len(cols))
+    z = (x - mean) / np.where(std == 0, 1, std)
+    out[:, :len(cols)] = np.nan_to_num(z, nan=0.0)
+    _l2_rows(out)
+
+def _title_block(titles: pd.Series, out: np.ndarray) -> None:
+    """TF-IDF dos tokens do título com hashing para TITLE_DIMS colunas, escrito em `out`."""
+    n = len(titles)
+    flat = titles.fillna("").astype(str).reset_index(drop=True).str.findall(TOKEN_RE.pattern).explode().dropna()
+    if flat.empty:
+        return
+    docs = flat.index.to_numpy(dtype=np.int64)
+    tokens = flat.to_numpy(dtype=object)
+    codes, uniq = pd.factorize(tokens)
+    df = np.bincount(np.unique(codes.astype(np.int64) * n + docs) // n, minlength=len(uniq))
+    idf = (np.log((1 + n) / (1 + df)) + 1).astype(np.float32)
+    buckets = (pd.util.hash_array(np.asarray(uniq, dtype=object)) % TITLE_DIMS).astype(np.int64)
+    np.add.at(out, (docs, buckets[codes]), idf[codes])
+    _l2_rows(out)
+
+class SimilarityIndex:
+    def __init__(self, features: pd.DataFrame, titles: pd.Series):
+        n, n_num = len(features), sum(c in features.columns for c in NUMERIC_COLS)
+        # blocos densos lado a lado, já em float32 (sem hstack nem cópias float64)
+        self.dense = np.zeros((n, n_num + TITLE_DIMS), dtype=np.float32)
+        _numeric_block(features, self.dense[:, :n_num])
+        _title_block(titles, self.dense[:, n_num:])
+        self.dense[:, :n_num] *= WEIGHTS["numeric"]
+        self.dense[:, n_num:] *= WEIGHTS["title"]
+        # categoria: código por linha (-1 = nula); o one-hot pesado contribui
+        # WEIGHTS["category"]² quando os códigos batem e o mesmo valor para a norma
+        self.category = features["category_idx"].to_numpy(dtype=np.int32)
+        self._cat_weight = np.float32(WEIGHTS["category"] ** 2)
+        sq = np.einsum("ij,ij->i", self.dense, self.dense) + self._cat_weight * (self.category >= 0)
+        self._inv_norm = (1 / np.sqrt(np.where(sq == 0, 1, sq))).astype(np.float32)
+        # cópias do mesmo id (raras) são excluídas dos vizinhos umas das outras
+        ids = features["id"].reset_index(drop=True)
+        dup = ids[ids.duplicated(keep=False)]
+        self._same_id = {int(p): g.index.to_numpy() for _, g in dup.groupby(dup) for p in g.index}
+
+    def scores(self, pos: int) -> np.ndarray:
+        """Cosseno de `pos` com cada livro (mesmo valor da matriz one-hot completa)."""
+        s = self.dense @ self.dense[pos]
+        if self.category[pos] >= 0:
+            s += self._cat_weight * (self.category == self.category[pos])
+        s *= self._inv_norm
+        s *= self._inv_norm[pos]
+        return s
+
+    def neighbours(self, pos: int, k: int) -> tuple[np.ndarray, np.ndarray]:
+        """
+        (posições, similaridades) dos k vizinhos de `pos`, por similaridade desc
+        e posição asc no empate. Exclui o próprio livro e cópias do mesmo id.
+        """
+        scores = self.scores(pos)
+        scores[self._same_id.get(pos, pos)] = -np.inf
+        k = max(0, min(k, int(np.isfinite(scores).sum())))
+        if k == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.lexsort((top, -scores[top]))]
+        return top, scores[top]
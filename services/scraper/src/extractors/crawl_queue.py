@@ -0,0 +1,103 @@
+# services/scraper/src/extractors/crawl_queue.py
+# Fila de trabalho durável do crawl distribuído (scrape_books.py --workers N).
+#
+# Um arquivo SQLite com uma linha por página de listagem (a 1ª página de cada
+# categoria entra na semeadura; as seguintes, conforme os workers as
+# descobrem). Workers em vários processos, ou em várias máquinas com o
+# arquivo num NFS, disputam as tarefas com BEGIN IMMEDIATE: só um escreve por
+# vez e cada tarefa é entregue a um único worker. Uma tarefa reivindicada
+# cujo worker morreu volta para a fila quando o lease expira; o worker vivo
+# renova o lease a cada página de produto baixada, então uma listagem lenta
+# (retries, taxa baixa) não é entregue a um segundo worker. O journal fica
+# no modo padrão (DELETE), porque o WAL do SQLite não funciona sobre NFS.
+import sqlite3
+import time
+from pathlib import Path
+from typing import NamedTuple, Optional
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    url         TEXT PRIMARY KEY,
+    category    TEXT NOT NULL,
+    ord         TEXT NOT NULL,            -- ordem do crawl sequencial (categoria, página)
+    state       TEXT NOT NULL DEFAULT 'pending',   -- pending | claimed | done | failed
+    owner       TEXT,
+    claimed_at  REAL,
+    attempts    INTEGER NOT NULL DEFAULT 0,
+    error       TEXT
+);
+CREATE INDEX IF NOT EXISTS tasks_state ON tasks (state, ord);
+"""
+
+class Task(NamedTuple):
+    url: str
+    category: str
+    ord: str
+    attempts: int
+
+class CrawlQueue:
+    def __init__(self, path: Path, lease_seconds: float = 300.0, max_attempts: int = 3):
+        self.path = Path(path)
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # autocommit: as transações são explícitas (BEGIN IMMEDIATE)
+        self._db = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+        self._db.executescript(SCHEMA)
+
+    def close(self) -> None:
+        self._db.close()
+
+    def add(self, url: str, category: str, ord: str) -> bool:
+        """Enfileira uma página (ignorada se a URL já está na fila). True se entrou."""
+        cur = self._db.execute(
+            "INSERT OR IGNORE INTO tasks (url, category, ord) VALUES (?, ?, ?)", (url, category, ord))
+        return cur.rowcount == 1
+
+    def claim(self, owner: str) -> Optional[Task]:
+        """Reivindica a próxima tarefa pendente (ou com lease vencido), na ordem do crawl."""
+        now = time.time()
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            row = self._db.execute(
+                "SELECT url, category, ord, attempts FROM tasks "
+                "WHERE state = 'pending' OR (state = 'claimed' AND claimed_at < ?) "
+                "ORDER BY ord LIMIT 1", (now - self.lease_seconds,)).fetchone()
+            if row is not None:
+                self._db.execute(
+                    "UPDATE tasks SET state = 'claimed', owner = ?, claimed_at = ?, attempts = attempts + 1 "
+                    "WHERE url = ?", (owner, now, row[0]))
+            self._db.execute("COMMIT")
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+        return None if row is None else Task(row[0], row[1], row[2], row[3] + 1)
+
+    def renew(self, task: Task, owner: str) -> bool:
+        """Renova o lease de uma tarefa em andamento. False se ela já não é deste worker."""
+        cur = self._db.execute(
+            "UPDATE tasks SET claimed_at = ? WHERE url = ? AND owner = ? AND state = 'claimed'",
+            (time.time(), task.url, owner))
+        return cur.rowcount == 1
+
+    def done(self, task: Task) -> None:
+        self._db.execute("UPDATE tasks SET state = 'done', error = NULL WHERE url = ?", (task.url,))
+
+    def fail(self, task: Task, error: str) -> None:
+        """Devolve a tarefa à fila, ou a marca como failed após max_attempts tentativas."""
+        state = "failed" if task.attempts >= self.max_attempts else "pending"
+        self._db.execute("UPDATE tasks SET state = ?, error = ?, owner = NULL WHERE url = ?",
+                         (state, error[:500], task.url))
+
+    def failures(self) -> list[tuple[str, str, str]]:
+        """(url, categoria, erro) das páginas que esgotaram as tentativas, na ordem do crawl."""
+        return self._db.execute(
+            "SELECT url, category, error FROM tasks WHERE state = 'failed' ORDER BY ord").fetchall()
+
+    def counts(self) -> dict[str, int]:
+        return dict(self._db.execute("SELECT state, COUNT(*) FROM tasks GROUP BY state").fetchall())
+
+    def active(self) -> bool:
+        """Ainda há trabalho: tarefas pendentes ou em andamento (que podem enfileirar mais páginas)."""
+        c = self.counts()
+        return c.get("pending", 0) + c.get("claimed", 0) > 0
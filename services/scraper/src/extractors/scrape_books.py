@@ -1,12 +1,24 @@
+import argparse
+import multiprocessing as mp
+import os
 import re
-import time, random
+import socket
+import time
 import requests
 from pathlib import Path
+from typing import Callable
 from urllib.parse import urljoin, urlparse
 import pandas as pd
 from bs4 import BeautifulSoup
 
-BASE           = "https://books.toscrape.com/"
+try:
+    from .crawl_queue import CrawlQueue
+    from .throttle import AIMDRate, CircuitOpenError, ThrottledClient
+except ImportError:  # executado como script
+    from crawl_queue import CrawlQueue
+    from throttle import AIMDRate, CircuitOpenError, ThrottledClient
+
+BASE           = os.getenv("SCRAPER_BASE_URL", "https://books.toscrape.com/")
 START_URL      = urljoin(BASE, "index.html")
 MAX_PAGES_GUARD = 200 
 
@@ -18,10 +30,36 @@ IMAGES_DIR.mkdir(parents=True, exist_ok=True)
 
 OUT_PATH = BRONZE_DIR / "books.csv"
 
+# modo distribuído (--workers N): fila SQLite + um CSV ("shard") por página,
+# unidos e deduplicados por id no fim
+QUEUE_PATH = BRONZE_DIR / "crawl_queue.sqlite"
+SHARDS_DIR = BRONZE_DIR / "shards"
+
+# ritmo das requisições (req/s, por processo): começa em SCRAPER_RATE e se
+# ajusta sozinho (AIMD) entre SCRAPER_MIN_RATE e SCRAPER_MAX_RATE
+RATE_INITIAL = float(os.getenv("SCRAPER_RATE", "4"))
+RATE_MIN     = float(os.getenv("SCRAPER_MIN_RATE", "0.2"))
+RATE_MAX     = float(os.getenv("SCRAPER_MAX_RATE", "50"))
+
 W2D = {"One":1, "Two":2, "Three":3, "Four":4, "Five":5}
 
-session = requests.Session()
-session.headers.update({"User-Agent": "books-scraper/0.1"})
+def new_session(share: int = 1) -> ThrottledClient:
+    """
+    Sessão HTTP com ritmo adaptativo. `share` divide a taxa inicial e a mínima
+    entre processos locais; o teto é por processo, e cada um sobe até o alvo reclamar.
+    """
+    s = requests.Session()
+    s.headers.update({"User-Agent": "books-scraper/0.1"})
+    rate = AIMDRate(initial=RATE_INITIAL / share, min_rate=RATE_MIN / share, max_rate=RATE_MAX)
+    return ThrottledClient(s, rate=rate)
+
+session = new_session()
+
+def throttle_summary() -> str:
+    st = session.stats
+    return (f"requisições: {st.requests} | retries: {st.retries} | congestionamento: {st.congestion} | "
+            f"circuito aberto: {st.circuit_trips}x | taxa final: {session.rate.rate:.1f} req/s | "
+            f"esperando: {st.slept:.1f}s")
 
 
 def download_image(image_url: str, book_id: str) -> str | None:
@@ -29,7 +67,7 @@ def download_image(image_url: str, book_id: str) -> str | None:
         return None
     
     try:
-        r = session.get(image_url, timeout=30, stream=True)
+        r = session.get(image_url, stream=True)
 
         if not r.encoding or r.encoding.lower() != "utf-8":
             r.encoding = "utf-8"
@@ -59,7 +97,7 @@ def download_image(image_url: str, book_id: str) -> str | None:
         return None
 
 def fetch_more_info(prod_url: str) -> tuple[dict, str | None]:
-    r = session.get(prod_url, timeout=30)
+    r = session.get(prod_url)
 
     if not r.encoding or r.encoding.lower() != "utf-8":
         r.encoding = "utf-8"
@@ -86,77 +124,87 @@ def fetch_more_info(prod_url: str) -> tuple[dict, str | None]:
 
     return product_info, full_img_url
 
-def iterate_category(category_name: str, first_page_url: str, rows: list[dict]):
-    url = first_page_url
-    guard = 0
+def scrape_listing_page(category_name: str, url: str,
+                        on_product: Callable[[], object] | None = None) -> tuple[list[dict], str | None]:
+    """
+    Uma página de listagem: os livros dela (com a página de produto) e a URL
+    da próxima. `on_product` é chamado após cada página de produto baixada
+    (o crawl distribuído renova o lease da tarefa ali).
+    """
+    r = session.get(url)
 
-    while url and guard < MAX_PAGES_GUARD:
-        guard += 1
-        r = session.get(url, timeout=30)
+    if not r.encoding or r.encoding.lower() != "utf-8":
+        r.encoding = "utf-8"
 
-        if not r.encoding or r.encoding.lower() != "utf-8":
-            r.encoding = "utf-8"
+    r.raise_for_status()
+    sp = BeautifulSoup(r.text, "html.parser")
 
-        r.raise_for_status()
-        sp = BeautifulSoup(r.text, "html.parser")
+    rows: list[dict] = []
+    items = sp.select("ol.row li")
 
-        items = sp.select("ol.row li")
+    for li in items:
+        a = li.select_one("h3 a")
 
-        for li in items:
-            a = li.select_one("h3 a")
+        if not a:
+            continue
 
-            if not a:
-                continue
+        title = a.get("title", "").strip()
+        rating_words = li.select_one("p.star-rating")
+        rating = 0
 
-            title = a.get("title", "").strip()
-            rating_words = li.select_one("p.star-rating")
-            rating = 0
+        if rating_words:
+            classes = rating_words.get("class", [])
+            rating = next((W2D[c] for c in classes if c in W2D), 0)
 
-            if rating_words:
-                classes = rating_words.get("class", [])
-                rating = next((W2D[c] for c in classes if c in W2D), 0)
+        raw_price = (li.select_one("p.price_color").get_text(strip=True)
+                     if li.select_one("p.price_color") else "")
 
-            raw_price = (li.select_one("p.price_color").get_text(strip=True)
-                         if li.select_one("p.price_color") else "")
+        href = a.get("href", "").strip()
+        prod_url = urljoin(url, href).replace("index.html", "")
+        prod_url = prod_url if prod_url.endswith(".html") else prod_url + "index.html"
 
-            href = a.get("href", "").strip()
-            prod_url = urljoin(url, href).replace("index.html", "")
-            prod_url = prod_url if prod_url.endswith(".html") else prod_url + "index.html"
+        p = Path(urlparse(prod_url).path)
+        book_id = p.parent.name if p.name == "index.html" else p.stem
 
-            p = Path(urlparse(prod_url).path)
-            book_id = p.parent.name if p.name == "index.html" else p.stem
+        product_info, full_img_url = fetch_more_info(prod_url)
+        if on_product is not None:
+            on_product()
 
-            product_info, full_img_url = fetch_more_info(prod_url)
+        thumb = li.select_one("img")
+        thumb_url = urljoin(url, thumb["src"]) if thumb and thumb.get("src") else None
+        image_url = full_img_url or thumb_url
 
-            thumb = li.select_one("img")
-            thumb_url = urljoin(url, thumb["src"]) if thumb and thumb.get("src") else None
-            image_url = full_img_url or thumb_url
+        image_path_rel = None
 
-            image_path_rel = None
+        rows.append({
+            "id": book_id,                                  # string
+            "book_title": title,                            # string
+            "category": category_name,                      # string
+            "raw_price": raw_price,                         # string
+            "rating": rating,                               # integer
+            "instock": product_info.get("Availability"),    # integer
+            "UPC": product_info.get("UPC"),                 # string
+            "link": prod_url,                               # string
+            "image_url": image_url,                         # string
+            "image_path": image_path_rel,                   # string
+        })
 
-            rows.append({
-                "id": book_id,                                  # string
-                "book_title": title,                            # string
-                "category": category_name,                      # string
-                "raw_price": raw_price,                         # string
-                "rating": rating,                               # integer
-                "instock": product_info.get("Availability"),    # integer
-                "UPC": product_info.get("UPC"),                 # string
-                "link": prod_url,                               # string
-                "image_url": image_url,                         # string
-                "image_path": image_path_rel,                   # string
-            })
+    next_a = sp.select_one("li.next > a")
+    next_url = urljoin(r.url, next_a["href"]) if next_a and next_a.get("href") else None
+    return rows, next_url
 
-        next_a = sp.select_one("li.next > a")
+def iterate_category(category_name: str, first_page_url: str, rows: list[dict]):
+    url = first_page_url
+    guard = 0
 
-        if next_a and next_a.get("href"):
-            url = urljoin(r.url, next_a["href"])
-            time.sleep(random.uniform(0.2, 0.5))
-        else:
-            break
+    while url and guard < MAX_PAGES_GUARD:
+        guard += 1
+        page_rows, url = scrape_listing_page(category_name, url)
+        rows.extend(page_rows)
 
-def main():
-    r = session.get(START_URL, timeout=30)
+def list_categories() -> list[tuple[str, str]]:
+    """(nome, URL da 1ª página) de cada categoria, na ordem do menu do site."""
+    r = session.get(START_URL)
 
     if not r.encoding or r.encoding.lower() != "utf-8":
         r.encoding = "utf-8"
@@ -165,20 +213,176 @@ def main():
     sp = BeautifulSoup(r.text, "html.parser")
 
     cats = sp.select("ul.nav.nav-list > li > ul > li > a")
+    return [(a.get_text(strip=True), urljoin(BASE, a.get("href"))) for a in cats]
+
+def write_bronze(df: pd.DataFrame) -> pd.DataFrame:
+    """Dedupe por id (1ª ocorrência, na ordem do crawl) e grava o bronze."""
+    df = df.drop_duplicates(subset=["id"], keep="first").reset_index(drop=True)
+    OUT_PATH.parent.mkdir(parents=True, exist_ok=True)
+    df.to_csv(OUT_PATH, index=False, encoding="utf-8-sig")
+    return df
+
+def main():
+    cats = list_categories()
     rows: list[dict] = []
 
-    for a in cats:
-        category_name = a.get_text(strip=True)
-        category_url = urljoin(BASE, a.get("href"))
+    for category_name, category_url in cats:
         iterate_category(category_name, category_url, rows)
 
-    df = pd.DataFrame(rows).drop_duplicates(subset=["id"], keep="first").reset_index(drop=True)
-    OUT_PATH.parent.mkdir(parents=True, exist_ok=True)
-    df.to_csv(OUT_PATH, index=False, encoding="utf-8-sig")
+    df = write_bronze(pd.DataFrame(rows))
 
     print(f"[OK] Categorias: {len(cats)} | Livros únicos: {len(df)}")
+    print(f"[OK] HTTP: {throttle_summary()}")
     print(f"[OK] CSV: {OUT_PATH.resolve()}")
     print(f"[OK] Imagens em: {IMAGES_DIR.resolve()}")
 
+# --- crawl distribuído ---
+
+def _page_ord(category_idx: int, page: int) -> str:
+    # ordem do crawl sequencial: categoria (menu do site), depois página
+    return f"{category_idx:04d}-{page:05d}"
+
+def seed_queue(queue: CrawlQueue) -> int:
+    """Enfileira a 1ª página de cada categoria. Retorna quantas entraram (0 ao retomar)."""
+    return sum(queue.add(url, name, _page_ord(i, 0)) for i, (name, url) in enumerate(list_categories()))
+
+def crawl_worker(queue_path: Path, shards_dir: Path, owner: str | None = None, share: int = 1) -> int:
+    """
+    Consome a fila até ela esvaziar: cada página de listagem vira um shard
+    próprio e a próxima página volta para a fila. A tarefa só é marcada como
+    feita depois do shard gravado (arquivo temporário + fsync + rename, então
+    um crash nunca deixa linha truncada); se o worker morrer no meio, ela é
+    refeita por outro e a duplicata some no merge. Se o circuito abrir
+    de vez (alvo fora do ar), o worker devolve a tarefa e para. Retorna as páginas feitas.
+    """
+    global session
+    session = new_session(share)   # nada de conexões (nem ritmo) herdados do processo pai
+    owner = owner or f"{socket.gethostname()}-{os.getpid()}"
+    queue = CrawlQueue(queue_path)
+    shards_dir.mkdir(parents=True, exist_ok=True)
+    pages = 0
+
+    while True:
+        task = queue.claim(owner)
+        if task is None:
+            if not queue.active():
+                break
+            time.sleep(0.5)   # outros workers ainda podem descobrir páginas
+            continue
+        try:
+            rows, next_url = scrape_listing_page(task.category, task.url,
+                                                 on_product=lambda: queue.renew(task, owner))
+            category_idx, page = (int(x) for x in task.ord.split("-"))
+            if next_url and page + 1 < MAX_PAGES_GUARD:
+                queue.add(next_url, task.category, _page_ord(category_idx, page + 1))
+            if rows:
+                out = pd.DataFrame(rows)
+                out.insert(0, "_ord", [f"{task.ord}-{i:03d}" for i in range(len(rows))])
+                _write_shard(out, shards_dir / f"shard-{owner}-{task.ord}.csv")
+            queue.done(task)
+            pages += 1
+        except CircuitOpenError as e:
+            queue.fail(task, repr(e))
+            print(f"[ERRO] {owner}: {e}")
+            break
+        except Exception as e:
+            queue.fail(task, repr(e))
+            print(f"[AVISO] {owner}: {task.url} (tentativa {task.attempts}): {e!r}")
+
+    queue.close()
+    print(f"[INFO] {owner}: {pages} páginas | {throttle_summary()}")
+    return pages
+
+def _write_shard(out: pd.DataFrame, path: Path) -> None:
+    """Grava o shard de uma página de forma atômica: só aparece inteiro."""
+    tmp = path.with_name(f".{path.name}.tmp")
+    with open(tmp, "w", encoding="utf-8", newline="") as f:
+        out.to_csv(f, index=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+def merge_shards(shards_dir: Path) -> pd.DataFrame:
+    """Une os shards na ordem do crawl sequencial e grava o bronze (mesmo dedupe do main())."""
+    shards = sorted(shards_dir.glob("shard-*.csv"))
+    if not shards:
+        raise SystemExit(f"[ERRO] Nenhum shard em {shards_dir}")
+    # tudo como texto: o bronze sai com os mesmos valores que o modo sequencial grava
+    df = pd.concat([pd.read_csv(p, dtype=str, keep_default_na=False) for p in shards], ignore_index=True)
+    df = df.sort_values("_ord", kind="stable").drop(columns="_ord")
+    return write_bronze(df)
+
+def report_failures(queue_path: Path) -> int:
+    """
+    Lista as páginas de listagem que falharam de vez. A próxima página de uma
+    categoria só é descoberta ao ler a anterior, então o resto daquela
+    categoria também ficou de fora do bronze. Retorna quantas falharam.
+    """
+    if not queue_path.exists():
+        return 0
+    queue = CrawlQueue(queue_path)
+    failed = queue.failures()
+    queue.close()
+    for url, category, error in failed:
+        print(f"[AVISO] Página falhou: {url} | categoria '{category}' incompleta "
+              f"(páginas seguintes não visitadas) | {error}")
+    if failed:
+        print(f"[AVISO] {len(failed)} página(s) falharam; o bronze está incompleto nessas categorias")
+    return len(failed)
+
+def run_sharded(workers: int, queue_path: Path, shards_dir: Path, fresh: bool = False) -> None:
+    if fresh:
+        queue_path.unlink(missing_ok=True)
+        for p in shards_dir.glob("shard-*.csv"):
+            p.unlink()
+    queue = CrawlQueue(queue_path)
+    seeded = seed_queue(queue)
+    print(f"[INFO] Fila: {queue_path} | categorias novas: {seeded} | estado: {queue.counts()}")
+    queue.close()
+
+    # spawn: cada worker abre a própria sessão HTTP e a própria conexão SQLite
+    ctx = mp.get_context("spawn")
+    # juntos, os workers começam no ritmo de um crawl sequencial; depois cada
+    # um se ajusta pelo que observa
+    procs = [ctx.Process(target=crawl_worker, args=(queue_path, shards_dir, None, workers))
+             for _ in range(workers)]
+    t0 = time.perf_counter()
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+    elapsed = time.perf_counter() - t0
+
+    queue = CrawlQueue(queue_path)
+    counts = queue.counts()
+    queue.close()
+    df = merge_shards(shards_dir)
+    print(f"[OK] Workers: {workers} | páginas: {counts.get('done', 0)} em {elapsed:.1f}s | falhas: {counts.get('failed', 0)}")
+    print(f"[OK] Livros únicos: {len(df)}")
+    print(f"[OK] CSV: {OUT_PATH.resolve()}")
+    report_failures(queue_path)
+
+def cli():
+    ap = argparse.ArgumentParser(description="Scraper do books.toscrape.com (bronze).")
+    ap.add_argument("--workers", type=int, default=0,
+                    help="crawl distribuído com N processos (0 = sequencial, o padrão)")
+    ap.add_argument("--worker", action="store_true",
+                    help="só consome uma fila já semeada (ex.: outra máquina com a fila num NFS)")
+    ap.add_argument("--merge", action="store_true", help="só une os shards no bronze")
+    ap.add_argument("--fresh", action="store_true", help="descarta a fila e os shards de um crawl anterior")
+    ap.add_argument("--queue", type=Path, default=QUEUE_PATH)
+    ap.add_argument("--shards", type=Path, default=SHARDS_DIR)
+    args = ap.parse_args()
+
+    if args.merge:
+        print(f"[OK] Livros únicos: {len(merge_shards(args.shards))} | CSV: {OUT_PATH.resolve()}")
+        report_failures(args.queue)
+    elif args.worker:
+        print(f"[OK] Páginas processadas: {crawl_worker(args.queue, args.shards)}")
+    elif args.workers > 0:
+        run_sharded(args.workers, args.queue, args.shards, fresh=args.fresh)
+    else:
+        main()
+
 if __name__ == "__main__":
-    main()
+    cli()
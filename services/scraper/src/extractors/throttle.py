@@ -0,0 +1,187 @@
+# services/scraper/src/extractors/throttle.py
+# Ritmo adaptativo das requisições do scraper, em três peças:
+#
+# - AIMDRate: taxa-alvo (req/s) com aumento aditivo enquanto o servidor
+#   responde bem e corte multiplicativo em sinal de congestionamento: 429,
+#   5xx, erro de rede ou latência (EWMA) acima do alvo. O alvo de latência
+#   acompanha a menor latência já vista, então o controlador nota o servidor
+#   ficando lento antes de ele começar a recusar.
+# - retry com backoff exponencial e jitter completo (uniforme em
+#   [0, base·2^tentativa], limitado), respeitando Retry-After.
+# - CircuitBreaker: após N falhas seguidas, para de bater no servidor por um
+#   tempo (cooldown crescente); depois deixa passar uma sonda (half-open). Se
+#   o circuito abre `max_trips` vezes sem nenhum sucesso, desiste (CircuitOpenError).
+#
+# Tudo por processo: no crawl distribuído, cada worker tem o próprio controlador.
+import random
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+import requests
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+class CircuitOpenError(RuntimeError):
+    """O alvo continua falhando depois de várias aberturas do circuito."""
+
+class AIMDRate:
+    def __init__(self, initial: float = 4.0, min_rate: float = 0.2, max_rate: float = 50.0,
+                 increase: float = 1.0, decrease: float = 0.5,
+                 latency_factor: float = 3.0, latency_floor: float = 0.5, ewma_alpha: float = 0.2):
+        self.rate = initial
+        self.min_rate, self.max_rate = min_rate, max_rate
+        self.increase, self.decrease = increase, decrease
+        self.latency_factor, self.latency_floor = latency_factor, latency_floor
+        self.ewma_alpha = ewma_alpha
+        self.latency_ewma: Optional[float] = None
+        self.latency_min: Optional[float] = None
+        self._next_slot = 0.0
+        self._cut_until = 0.0
+
+    def latency_target(self) -> float:
+        """Latência acima da qual o servidor é considerado congestionado."""
+        base = self.latency_min if self.latency_min is not None else self.latency_floor
+        return max(self.latency_floor, base * self.latency_factor)
+
+    def wait(self, sleep: Callable[[float], None] = time.sleep) -> float:
+        """Espera o próximo slot da taxa atual. Retorna o tempo dormido."""
+        now = time.monotonic()
+        delay = max(0.0, self._next_slot - now)
+        if delay:
+            sleep(delay)
+        self._next_slot = max(now, self._next_slot) + 1.0 / self.rate
+        return delay
+
+    def on_success(self, latency: float) -> None:
+        self.latency_min = latency if self.latency_min is None else min(self.latency_min, latency)
+        a = self.ewma_alpha
+        self.latency_ewma = latency if self.latency_ewma is None else a * latency + (1 - a) * self.latency_ewma
+        if self.latency_ewma > self.latency_target():
+            self.on_congestion()
+        else:
+            self.rate = min(self.max_rate, self.rate + self.increase)
+
+    def on_congestion(self, retry_after: Optional[float] = None) -> None:
+        # no máximo um corte por "janela" (1/taxa): uma rajada de 503 não derruba a taxa a zero
+        now = time.monotonic()
+        if now >= self._cut_until:
+            self.rate = max(self.min_rate, self.rate * self.decrease)
+            self._cut_until = now + 1.0 / self.rate
+        if retry_after:
+            self._next_slot = max(self._next_slot, now + retry_after)
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int = 5, cooldown: float = 10.0,
+                 max_cooldown: float = 300.0, max_trips: int = 5):
+        self.failure_threshold = failure_threshold
+        self.base_cooldown, self.max_cooldown = cooldown, max_cooldown
+        self.max_trips = max_trips
+        self.failures = 0
+        self.trips = 0             # aberturas seguidas, sem sucesso no meio
+        self.open_until = 0.0
+
+    @property
+    def state(self) -> str:
+        if self.trips == 0 or self.failures < self.failure_threshold:
+            return "closed"
+        return "open" if time.monotonic() < self.open_until else "half-open"
+
+    def before_request(self, sleep: Callable[[float], None] = time.sleep) -> None:
+        """Bloqueia enquanto o circuito está aberto; depois libera uma sonda."""
+        remaining = self.open_until - time.monotonic()
+        if remaining > 0:
+            sleep(remaining)
+
+    def on_success(self) -> None:
+        self.failures = 0
+        self.trips = 0
+
+    def on_failure(self) -> None:
+        self.failures += 1
+        if self.failures >= self.failure_threshold:
+            self.trips += 1
+            if self.trips > self.max_trips:
+                raise CircuitOpenError(f"circuito abriu {self.trips}x seguidas; alvo indisponível")
+            cooldown = min(self.max_cooldown, self.base_cooldown * 2 ** (self.trips - 1))
+            self.open_until = time.monotonic() + cooldown
+
+@dataclass
+class ThrottleStats:
+    requests: int = 0
+    retries: int = 0
+    congestion: int = 0
+    circuit_trips: int = 0
+    slept: float = 0.0
+    statuses: dict = field(default_factory=dict)
+
+class ThrottledClient:
+    """session.get com taxa AIMD, retry com backoff e circuit breaker."""
+
+    def __init__(self, session: requests.Session, rate: Optional[AIMDRate] = None,
+                 breaker: Optional[CircuitBreaker] = None, max_retries: int = 4,
+                 backoff_base: float = 0.5, backoff_cap: float = 30.0,
+                 timeout: tuple[float, float] = (5.0, 30.0),
+                 sleep: Callable[[float], None] = time.sleep):
+        self.session = session
+        self.rate = rate or AIMDRate()
+        self.breaker = breaker or CircuitBreaker()
+        self.max_retries = max_retries
+        self.backoff_base, self.backoff_cap = backoff_base, backoff_cap
+        self.timeout = timeout
+        self.stats = ThrottleStats()
+        self._sleep = sleep
+
+    def _nap(self, seconds: float) -> None:
+        self.stats.slept += seconds
+        self._sleep(seconds)
+
+    def backoff(self, attempt: int) -> float:
+        """Jitter completo: uniforme em [0, min(cap, base·2^attempt)]."""
+        return random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        """
+        GET com retry para erro de rede, timeout, 429 e 5xx. Outros status
+        (ex.: 404) voltam na hora para o chamador (raise_for_status).
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        attempt = 0
+        while True:
+            self.breaker.before_request(self._nap)
+            self.rate.wait(self._nap)
+            self.stats.requests += 1
+            t0 = time.monotonic()
+            retry_after = None
+            try:
+                r = self.session.get(url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error: Optional[BaseException] = e
+            else:
+                error = None
+                self.stats.statuses[r.status_code] = self.stats.statuses.get(r.status_code, 0) + 1
+                if r.status_code not in RETRY_STATUSES:
+                    self.rate.on_success(time.monotonic() - t0)
+                    self.breaker.on_success()
+                    return r
+                retry_after = _retry_after(r)
+
+            self.stats.congestion += 1
+            self.rate.on_congestion(retry_after)
+            trips = self.breaker.trips
+            self.breaker.on_failure()
+            self.stats.circuit_trips += self.breaker.trips > trips
+            if attempt >= self.max_retries:
+                if error is not None:
+                    raise error
+                return r   # o chamador decide (raise_for_status)
+            self.stats.retries += 1
+            self._nap(max(self.backoff(attempt), retry_after or 0.0))
+            attempt += 1
+
+def _retry_after(r: requests.Response) -> Optional[float]:
+    value = r.headers.get("Retry-After")
+    try:
+        return min(float(value), 300.0) if value else None
+    except ValueError:
+        return None   # formato HTTP-date: fica o backoff
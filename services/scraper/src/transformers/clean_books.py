@@ -1,16 +1,49 @@
 # services/scraper/src/transformers/clean_books.py
 # Fecha todo o tratamento/normalização na silver.
-# Saída: data/silver/books.csv (UTF-8) e, se possível, books.parquet
+# Saída: data/silver/books.csv (UTF-8) e, se possível, books.parquet, a
+# versão particionada por categoria em books_by_category/, os índices
+# pré-calculados da API em books_index/, o change log em books_changes/ e o
+# histórico de preço/estoque em books_history/
 
+from datetime import datetime, timezone
 from pathlib import Path
+import hashlib
+import json
+import os
 import re
+import shutil
 import unicodedata
+import numpy as np
 import pandas as pd
 
 BRONZE_DIR = Path(__file__).resolve().parents[4] / "data" / "bronze"
 SILVER_DIR = Path(__file__).resolve().parents[4] / "data" / "silver"
 SILVER_DIR.mkdir(parents=True, exist_ok=True)
 
+# silver particionada: category=<valor>/part-0.parquet, ordenada por title/id,
+# com estatísticas min/max por row group (o loader da API faz pushdown nelas)
+PARTITIONED_DIR = SILVER_DIR / "books_by_category"
+ROW_GROUP_ROWS = 16_384
+
+# índices que a API abre com memory-map em vez de recalcular em cada worker
+# (layout descrito em services/api/utils/sidecars.py)
+INDEX_DIR = SILVER_DIR / "books_index"
+INDEX_FORMAT = 1
+
+# change log por id entre builds (layout em services/api/utils/changes.py);
+# guarda as últimas CHANGES_KEEP versões
+CHANGES_DIR = SILVER_DIR / "books_changes"
+CHANGES_FORMAT = 1
+CHANGES_KEEP = 30
+
+# histórico de preço/estoque, append-only (layout em services/api/utils/history.py):
+# um segmento por scrape só com o que mudou, compactado por níveis a cada
+# HISTORY_COMPACT_SEGMENTS arquivos de um nível
+HISTORY_DIR = SILVER_DIR / "books_history"
+HISTORY_COMPACT_SEGMENTS = 16
+HISTORY_EVENT_COLS = ["ts", "id", "price", "instock", "listed"]
+HISTORY_TREND_COLS = ["ts", "category", "books", "in_stock", "price_mean", "price_min", "price_max", "price_median"]
+
 def _normalize_text(s: str) -> str:
     """minúsculas + ASCII + sem pontuação estranha + compacta espaços."""
     if pd.isna(s):
@@ -45,6 +78,268 @@ def _coerce_price(x) -> float | None:
     except Exception:
         return None
 
+def _write_partitioned(df: pd.DataFrame, out_dir: Path) -> None:
+    """Grava a silver particionada por categoria (troca o diretório inteiro de uma vez)."""
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    table = pa.Table.from_pandas(
+        df.sort_values(["category", "title", "id"], kind="stable"), preserve_index=False
+    )
+    tmp = out_dir.with_name(out_dir.name + ".tmp")
+    shutil.rmtree(tmp, ignore_errors=True)
+    ds.write_dataset(
+        table, tmp, format="parquet",
+        partitioning=ds.partitioning(pa.schema([("category", pa.string())]), flavor="hive"),
+        basename_template="part-{i}.parquet",
+        max_rows_per_group=ROW_GROUP_ROWS,
+        preserve_order=True,
+        file_options=ds.ParquetFileFormat().make_write_options(write_statistics=True),
+    )
+    shutil.rmtree(out_dir, ignore_errors=True)
+    tmp.rename(out_dir)
+
+def _write_index_sidecars(df: pd.DataFrame, parquet_path: Path, out_dir: Path) -> None:
+    """
+    Ordens (title/id e price/title/id), tabela de hash dos ids e códigos de
+    categoria, em posições do books.parquet, + manifest com o sha256 dele.
+    """
+    d = df.reset_index(drop=True)
+    arrays = {
+        "order_title": d.sort_values(["title", "id"], kind="stable").index.to_numpy(np.int64),
+        "order_price": d[d["price"].notna()].sort_values(["price", "title", "id"], kind="stable")
+                       .index.to_numpy(np.int64),
+    }
+    ids = d["id"].astype(object).to_numpy()
+    first = np.flatnonzero((~d["id"].duplicated(keep="first") & d["id"].notna()).to_numpy())
+    hashes = pd.util.hash_array(ids[first])
+    by_hash = np.argsort(hashes, kind="stable")
+    arrays["id_hash"] = hashes[by_hash]
+    arrays["id_pos"] = first[by_hash].astype(np.int64)
+    codes, labels = pd.factorize(d["category"].astype(object).to_numpy(), sort=True)
+    arrays["category_codes"] = codes.astype(np.int32)
+
+    tmp = out_dir.with_name(out_dir.name + ".tmp")
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+    for name, arr in arrays.items():
+        np.save(tmp / f"{name}.npy", arr)
+    (tmp / "category_labels.json").write_text(json.dumps([str(c) for c in labels], ensure_ascii=False), encoding="utf-8")
+    with open(parquet_path, "rb") as f:
+        sha = hashlib.file_digest(f, "sha256").hexdigest()
+    manifest = {
+        "format": INDEX_FORMAT,
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "dataset": {"file": parquet_path.name, "rows": int(len(d)),
+                    "size": parquet_path.stat().st_size, "sha256": sha},
+        "files": {f"{n}.npy": {"dtype": str(a.dtype), "shape": list(a.shape)} for n, a in arrays.items()},
+    }
+    (tmp / "manifest.json").write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+    shutil.rmtree(out_dir, ignore_errors=True)
+    tmp.rename(out_dir)
+
+def _sha256(path: Path) -> str:
+    with open(path, "rb") as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
+
+def _diff_by_id(prev: pd.DataFrame, cur: pd.DataFrame) -> list[dict]:
+    """Inserções, atualizações (registro completo) e remoções de prev para cur, por id."""
+    cur = cur[cur["id"].notna()].reset_index(drop=True)
+    prev = prev[prev["id"].notna()].drop_duplicates(subset=["id"], keep="first").reset_index(drop=True)
+
+    # posição de cada id atual na silver anterior (-1 = novo); compara coluna a coluna
+    pos = pd.Index(prev["id"]).get_indexer(cur["id"])
+    inserted = pos < 0
+    updated = np.zeros(len(cur), dtype=bool)
+    kept = np.flatnonzero(~inserted)
+    for col in cur.columns:
+        if col not in prev.columns:
+            updated[kept] = True
+            continue
+        a = cur[col].iloc[kept].reset_index(drop=True)
+        b = prev[col].iloc[pos[kept]].reset_index(drop=True)
+        try:
+            same = (a == b).fillna(False).to_numpy(dtype=bool) | (a.isna() & b.isna()).to_numpy()
+        except TypeError:   # tipos incomparáveis entre as versões
+            same = np.zeros(len(kept), dtype=bool)
+        updated[kept[~same]] = True
+
+    changed = cur[inserted | updated]
+    records = changed.astype(object).where(changed.notna(), None).to_dict(orient="records")
+    ops = np.where(inserted, "insert", "update")[inserted | updated].tolist()
+    out = [{"op": op, "id": rec["id"], "book": rec} for op, rec in zip(ops, records)]
+    deleted = np.ones(len(prev), dtype=bool)
+    deleted[pos[kept]] = False
+    out += [{"op": "delete", "id": i} for i in prev["id"][deleted]]
+    return out
+
+def _write_change_log(prev: pd.DataFrame | None, prev_sha: str | None, df: pd.DataFrame,
+                      parquet_path: Path, out_dir: Path) -> str:
+    """
+    Acrescenta a versão do books.parquet recém-gravado ao change log, com o
+    delta por id em relação ao parquet anterior. Se o anterior não for a
+    última versão do log (ou não existir), a cadeia recomeça sem delta.
+    """
+    out_dir.mkdir(parents=True, exist_ok=True)
+    log_path = out_dir / "log.json"
+    try:
+        log = json.loads(log_path.read_text(encoding="utf-8"))
+        versions = log["versions"] if log.get("format") == CHANGES_FORMAT else []
+    except (OSError, ValueError, KeyError):
+        versions = []
+
+    version = _sha256(parquet_path)[:16]
+    if versions and versions[-1]["version"] == version:
+        return "sem mudanças"
+    entry = {
+        "version": version,
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "rows": int(len(df)),
+        "file": None,
+    }
+    if prev is not None and prev_sha and versions and versions[-1]["version"] == prev_sha[:16]:
+        changes = _diff_by_id(prev, df)
+        entry["file"] = f"{version}.ndjson"
+        with open(out_dir / entry["file"], "w", encoding="utf-8") as f:
+            for change in changes:
+                f.write(json.dumps(change, ensure_ascii=False, default=str) + "\n")
+        for op, field in (("insert", "inserted"), ("update", "updated"), ("delete", "deleted")):
+            entry[field] = sum(c["op"] == op for c in changes)
+        summary = f"+{entry['inserted']} ~{entry['updated']} -{entry['deleted']}"
+    else:
+        versions = []   # sem base comparável: clientes antigos recebem 410 e sincronizam do zero
+        summary = "nova cadeia (sem delta)"
+
+    versions = (versions + [entry])[-CHANGES_KEEP:]
+    keep = {v["file"] for v in versions if v.get("file")}
+    tmp = log_path.with_suffix(".json.tmp")
+    tmp.write_text(json.dumps({"format": CHANGES_FORMAT, "versions": versions}, indent=2), encoding="utf-8")
+    os.replace(tmp, log_path)
+    for old in out_dir.glob("*.ndjson"):
+        if old.name not in keep:
+            old.unlink()
+    return summary
+
+def _history_write(frame: pd.DataFrame, path: Path, delta_cols: list[str]) -> None:
+    """
+    Parquet do histórico em zstd: dicionário em todas as colunas (ids,
+    categorias, preços e scrapes se repetem muito), exceto `delta_cols`,
+    gravadas com DELTA_BINARY_PACKED (inteiros crescentes dentro de cada chave).
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    table = pa.Table.from_pandas(frame, preserve_index=False)
+    tmp = path.with_name(f".{path.name}.tmp")
+    pq.write_table(
+        table, tmp, compression="zstd",
+        use_dictionary=[c for c in table.column_names if c not in delta_cols],
+        column_encoding={c: "DELTA_BINARY_PACKED" for c in delta_cols} or None,
+    )
+    os.replace(tmp, path)
+
+def _history_level(path: Path) -> int | None:
+    """Nível de compactação pelo prefixo: seg = 0, cmpN = N (cmp, de versões antigas, = 1)."""
+    prefix = path.stem.split("-", 1)[0]
+    if prefix == "seg":
+        return 0
+    if prefix == "cmp":
+        return 1
+    if prefix.startswith("cmp") and prefix[3:].isdigit():
+        return int(prefix[3:])
+    return None
+
+def _compact_history(part_dir: Path, sort_cols: list[str], delta_cols: list[str]) -> bool:
+    """
+    Compactação por níveis (seg -> cmp1 -> cmp2 ...): quando um nível junta
+    HISTORY_COMPACT_SEGMENTS arquivos, eles viram um só no nível seguinte,
+    ordenado. Cada evento é reescrito uma vez por nível, não a cada
+    compactação. O arquivo novo aparece (rename) antes de as entradas serem
+    apagadas; a API descarta as linhas repetidas nesse intervalo.
+    """
+    by_level: dict[int, list[Path]] = {}
+    for p in part_dir.glob("*.parquet"):
+        level = _history_level(p)
+        if level is not None:
+            by_level.setdefault(level, []).append(p)
+    compacted, level = False, 0
+    while level <= max(by_level, default=-1):
+        inputs = sorted(by_level.get(level, []))
+        if len(inputs) >= HISTORY_COMPACT_SEGMENTS:
+            merged = pd.concat([pd.read_parquet(p) for p in inputs], ignore_index=True)
+            merged = merged.sort_values(sort_cols, kind="stable")
+            out = part_dir / f"cmp{level + 1}-{int(merged['ts'].min())}-{int(merged['ts'].max())}.parquet"
+            _history_write(merged, out, delta_cols)
+            for p in inputs:
+                p.unlink()
+            by_level.setdefault(level + 1, []).append(out)
+            compacted = True
+        level += 1
+    return compacted
+
+def _append_history(df: pd.DataFrame, scraped_at: int, out_dir: Path) -> str:
+    """
+    Registra o scrape `scraped_at` (epoch s) no histórico: eventos por id só
+    para livros novos, alterados (price/instock) ou que saíram do catálogo, e
+    agregados de preço por categoria. Rodar de novo sobre o mesmo scrape (ou
+    um mais antigo) não acrescenta nada.
+    """
+    events_dir, trends_dir = out_dir / "events", out_dir / "trends"
+    events_dir.mkdir(parents=True, exist_ok=True)
+    trends_dir.mkdir(parents=True, exist_ok=True)
+    manifest_path, state_path = out_dir / "manifest.json", out_dir / "state.parquet"
+    try:
+        manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        manifest = {"scrapes": 0, "last_scrape": None}
+    if manifest["last_scrape"] is not None and manifest["last_scrape"] >= scraped_at:
+        return "scrape já registrado"
+
+    books = df[df["id"].notna()].drop_duplicates(subset=["id"], keep="first")
+    cur = pd.DataFrame({
+        "id": books["id"].astype(str).to_numpy(),
+        "price": books["price"].astype("float64").to_numpy(),
+        "instock": pd.array(pd.to_numeric(books["instock"], errors="coerce"), dtype="Int32"),
+        "listed": np.ones(len(books), dtype=bool),
+    })
+    # último estado conhecido por id; alinhado como no change log (get_indexer)
+    state = pd.read_parquet(state_path) if state_path.exists() else cur.iloc[:0]
+    pos = pd.Index(state["id"]).get_indexer(cur["id"])
+    kept = np.flatnonzero(pos >= 0)
+    changed = pos < 0
+    for col in ("price", "instock", "listed"):
+        a = cur[col].iloc[kept].reset_index(drop=True)
+        b = state[col].iloc[pos[kept]].reset_index(drop=True)
+        same = (a == b).fillna(False).to_numpy(dtype=bool) | (a.isna() & b.isna()).to_numpy()
+        changed[kept[~same]] = True
+    gone = np.ones(len(state), dtype=bool)
+    gone[pos[kept]] = False
+    removed = state[gone].assign(price=np.nan, instock=pd.NA, listed=False)
+    removed = removed.astype({"instock": "Int32"})
+    newly_gone = state["listed"].to_numpy(dtype=bool)[gone]   # ainda não registrados como saída
+    events = pd.concat([cur[changed], removed[newly_gone]], ignore_index=True)
+    events.insert(0, "ts", np.int64(scraped_at))
+
+    instock = pd.to_numeric(df["instock"], errors="coerce").fillna(0)
+    trends = (df.assign(in_stock=instock.gt(0))
+              .groupby("category", sort=True)
+              .agg(books=("id", "size"), in_stock=("in_stock", "sum"),
+                   price_mean=("price", "mean"), price_min=("price", "min"),
+                   price_max=("price", "max"), price_median=("price", "median"))
+              .reset_index()
+              .assign(ts=np.int64(scraped_at)))
+    trends = trends.astype({"category": str, "books": "int32", "in_stock": "int32"})[HISTORY_TREND_COLS]
+
+    _history_write(events.sort_values("id", kind="stable")[HISTORY_EVENT_COLS],
+                   events_dir / f"seg-{scraped_at}.parquet", [])
+    _history_write(trends, trends_dir / f"seg-{scraped_at}.parquet", ["ts"])
+    _history_write(pd.concat([cur, removed], ignore_index=True), state_path, [])
+    compacted = _compact_history(events_dir, ["id", "ts"], [])
+    _compact_history(trends_dir, ["category", "ts"], ["ts"])
+    manifest = {"scrapes": manifest["scrapes"] + 1, "last_scrape": scraped_at}
+    manifest_path.write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+    return f"{len(events)} eventos" + (", compactado" if compacted else "")
+
 def _pick_bronze_csv() -> Path:
     cands = list(BRONZE_DIR.glob("books*.csv"))
     if not cands:
@@ -196,6 +491,14 @@ for col, dt in dtype_map.items():
 out_csv     = SILVER_DIR / "books.csv"
 out_parquet = SILVER_DIR / "books.parquet"
 
+# silver anterior, base do change log (lida antes de ser sobrescrita)
+prev_df, prev_sha = None, None
+if out_parquet.exists():
+    try:
+        prev_df, prev_sha = pd.read_parquet(out_parquet), _sha256(out_parquet)
+    except Exception:
+        pass
+
 df.to_csv(out_csv, index=False, encoding="utf-8")  # UTF-8 sem BOM
 
 parquet_ok, parquet_err = True, None
@@ -204,6 +507,37 @@ try:
 except Exception as e:
     parquet_ok, parquet_err = False, e
 
+parts_ok, parts_err = True, None
+try:
+    _write_partitioned(df, PARTITIONED_DIR)
+except Exception as e:
+    parts_ok, parts_err = False, e
+
+index_ok, index_err = parquet_ok, parquet_err
+if parquet_ok:
+    try:
+        _write_index_sidecars(df, out_parquet, INDEX_DIR)
+    except Exception as e:
+        index_ok, index_err = False, e
+
+changes_ok, changes_info = parquet_ok, parquet_err
+if parquet_ok:
+    try:
+        changes_info = _write_change_log(prev_df, prev_sha, df, out_parquet, CHANGES_DIR)
+    except Exception as e:
+        changes_ok, changes_info = False, e
+
+# histórico: o instante do scrape é o mtime do bronze (gravado ao fim do scraping)
+history_ok, history_info = True, None
+try:
+    history_info = _append_history(df, int(INPUT_CSV.stat().st_mtime), HISTORY_DIR)
+except Exception as e:
+    history_ok, history_info = False, e
+
 print(f"[INFO] Linhas de entrada: {orig_rows} | Linhas de saída: {len(df)}")
 print(f"[OK] CSV: {out_csv}")
 print(f"[{'OK' if parquet_ok else 'WARN'}] Parquet: {out_parquet}{'' if parquet_ok else f' (falhou: {parquet_err})'}")
+print(f"[{'OK' if parts_ok else 'WARN'}] Parquet particionado: {PARTITIONED_DIR}{'' if parts_ok else f' (falhou: {parts_err})'}")
+print(f"[{'OK' if index_ok else 'WARN'}] Índices (sidecars): {INDEX_DIR}{'' if index_ok else f' (falhou: {index_err})'}")
+print(f"[{'OK' if changes_ok else 'WARN'}] Change log: {CHANGES_DIR} ({changes_info if changes_ok else f'falhou: {changes_info}'})")
+print(f"[{'OK' if history_ok else 'WARN'}] Histórico: {HISTORY_DIR} ({history_info if history_ok else f'falhou: {history_info}'})")
@@ -0,0 +1,34 @@
+# Ambiente isolado para os testes que sobem a API: o estado em disco (lista
+# de revogação, predições) vai para um diretório temporário, nunca para
+# data/. Precisa valer antes do primeiro import de services.api.*.
+import os
+import tempfile
+from pathlib import Path
+
+import pytest
+
+_STATE_DIR = Path(tempfile.mkdtemp(prefix="books-api-tests-"))
+os.environ["JWT_REVOKED_PATH"] = str(_STATE_DIR / "auth" / "revoked.txt")
+os.environ["JWT_REVOKED_CHECK_INTERVAL"] = "0"
+os.environ["ML_DATA_DIR"] = str(_STATE_DIR / "ml")
+os.environ["ADMISSION_ENABLED"] = "0"
+os.environ["ADMIN_USER"] = "admin"
+os.environ["ADMIN_PASS"] = "admin123"
+os.environ.setdefault("JWT_SECRET", "tests-" + "0" * 58)
+
+@pytest.fixture(scope="session")
+def app():
+    from services.api.src.app import create_app
+    return create_app()
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+@pytest.fixture
+def login(client):
+    def _login(username="admin", password="admin123") -> str:
+        r = client.post("/api/v1/auth/login", json={"username": username, "password": password})
+        assert r.status_code == 200, r.get_json()
+        return r.get_json()["access_token"]
+    return _login
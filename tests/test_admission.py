@@ -0,0 +1,20 @@
+# Toda rota nomeada em ENDPOINT_CLASSES existe no app; as rotas que varrem
+# dados por versão não caem na classe "cheap".
+import pytest
+
+from services.api.utils.admission import CLASSES, ENDPOINT_CLASSES, classify
+
+def test_classified_endpoints_exist(app):
+    endpoints = {rule.endpoint for rule in app.url_map.iter_rules()}
+    assert set(ENDPOINT_CLASSES) <= endpoints
+    assert set(ENDPOINT_CLASSES.values()) <= set(CLASSES)
+
+@pytest.mark.parametrize("endpoint", [
+    "books_changes", "book_history_points", "category_price_trend",
+    "ml_predictions_latest", "ml_predictions_top", "ml_training_data",
+])
+def test_scanning_endpoints_are_not_cheap(endpoint):
+    assert classify(endpoint) in ("heavy", "bulk")
+
+def test_probes_are_exempt():
+    assert classify("health_live") is None and classify("prometheus_metrics") is None
@@ -0,0 +1,59 @@
+# Revogação x cache de tokens verificados: um token já no cache deixa de
+# valer assim que é revogado, seja por logout neste worker, seja por outro
+# worker (via arquivo compartilhado).
+import time
+
+from flask_jwt_extended import create_access_token, decode_token
+
+from services.api.utils.auth import REVOKED, TOKEN_CACHE, VerifiedTokenCache
+
+PROTECTED = "/api/v1/admin/profiler"
+
+def _bearer(token):
+    return {"Authorization": f"Bearer {token}"}
+
+def _cached(app, token) -> bool:
+    digest = VerifiedTokenCache.digest(token, str(app.config["JWT_SECRET_KEY"]))
+    return TOKEN_CACHE.get(digest) is not None
+
+def test_logout_rejects_cached_token(app, client, login):
+    token = login()
+    assert client.get(PROTECTED, headers=_bearer(token)).status_code == 200
+    assert _cached(app, token)
+    assert client.get(PROTECTED, headers=_bearer(token)).status_code == 200   # servido do cache
+
+    assert client.post("/api/v1/auth/logout", headers=_bearer(token)).status_code == 200
+    assert client.get(PROTECTED, headers=_bearer(token)).status_code == 401
+    assert not _cached(app, token)
+
+def test_revocation_by_another_worker_beats_the_cache(app, client, login):
+    token = login()
+    assert client.get(PROTECTED, headers=_bearer(token)).status_code == 200
+    assert _cached(app, token)
+
+    # outro worker só compartilha o arquivo: escreve a linha "jti exp"
+    with app.app_context():
+        claims = decode_token(token)
+    REVOKED.path.parent.mkdir(parents=True, exist_ok=True)
+    with open(REVOKED.path, "a", encoding="utf-8") as f:
+        f.write(f"{claims['jti']} {claims['exp']}\n")
+
+    assert _cached(app, token)   # a entrada continua no cache deste worker...
+    assert client.get(PROTECTED, headers=_bearer(token)).status_code == 401   # ...e não vale mais
+
+def test_revoking_one_token_keeps_the_others(client, login):
+    kept, revoked = login(), login()
+    assert client.post("/api/v1/auth/logout", headers=_bearer(revoked)).status_code == 200
+    assert client.get(PROTECTED, headers=_bearer(kept)).status_code == 200
+    assert client.get(PROTECTED, headers=_bearer(revoked)).status_code == 401
+
+def test_token_not_yet_valid_is_never_cached(app, client):
+    with app.app_context():
+        token = create_access_token(identity="admin", additional_claims={"nbf": int(time.time()) + 3600})
+    assert client.get(PROTECTED, headers=_bearer(token)).status_code == 422   # token ainda não válido
+    assert not _cached(app, token)
+
+    # mesmo que alguém o ponha no cache, put recusa claims com nbf no futuro
+    digest = VerifiedTokenCache.digest(token, str(app.config["JWT_SECRET_KEY"]))
+    TOKEN_CACHE.put(digest, {"alg": "HS256"}, {"type": "access", "exp": time.time() + 3600, "nbf": time.time() + 3600})
+    assert TOKEN_CACHE.get(digest) is None
@@ -0,0 +1,37 @@
+# Índice de ids por snapshot: as posições sempre indexam o df do próprio
+# snapshot, e sidecars de outra versão são ignorados.
+import numpy as np
+import pandas as pd
+
+from services.api.utils.helpers import BookLookup
+from services.api.utils.sidecars import IndexSidecars, hash_ids
+
+def _df(ids):
+    return pd.DataFrame({"id": ids, "title": [f"t-{i}" for i in ids]})
+
+def _sidecars(ids):
+    first = ~pd.Series(ids).duplicated().to_numpy()
+    h = hash_ids(np.asarray(ids, dtype=object)[first])
+    order = np.argsort(h)
+    n = len(ids)
+    return IndexSidecars(
+        order_title=np.arange(n), order_price=np.arange(n), id_hash=h[order],
+        id_pos=np.flatnonzero(first)[order], category_codes=np.zeros(n, dtype=np.int32),
+        category_labels=[], manifest={"dataset": {"rows": n}},
+    )
+
+def test_positions_index_the_snapshot_frame():
+    lookup = BookLookup(_df(["a", "b", "a", "c"]), None)
+    pos = lookup.positions(["c", "a", "zz"])
+    assert pos.tolist() == [3, 0, -1]
+    assert lookup.df.iloc[pos[:2]]["id"].tolist() == ["c", "a"]
+
+def test_sidecar_path_matches_pandas_path():
+    ids = ["a", "b", "a", "c"]
+    assert BookLookup(_df(ids), _sidecars(ids)).positions(["c", "a", "zz"]).tolist() == [3, 0, -1]
+
+def test_sidecars_of_another_version_are_ignored():
+    # sidecars gravados para um catálogo maior não podem apontar além deste df
+    lookup = BookLookup(_df(["a", "b"]), _sidecars(["x", "y", "z", "a", "b"]))
+    assert lookup.sidecars is None
+    assert lookup.positions(["b", "z"]).tolist() == [1, -1]
@@ -0,0 +1,97 @@
+# Fila do crawl distribuído: lease vencido devolve a tarefa a outro worker,
+# lease renovado não; páginas que falham de vez aparecem no relatório.
+import time
+
+import pandas as pd
+import pytest
+
+from services.scraper.src.extractors import scrape_books
+from services.scraper.src.extractors.crawl_queue import CrawlQueue
+
+LEASE = 0.2
+
+@pytest.fixture
+def queue_path(tmp_path):
+    q = CrawlQueue(tmp_path / "queue.sqlite")
+    q.add("https://x/travel/page-1.html", "Travel", "0000-00000")
+    q.close()
+    return tmp_path / "queue.sqlite"
+
+def _worker(queue_path, **kw):
+    return CrawlQueue(queue_path, lease_seconds=LEASE, **kw)
+
+def test_expired_lease_is_reclaimed(queue_path):
+    a, b = _worker(queue_path), _worker(queue_path)
+    task = a.claim("a")
+    assert b.claim("b") is None           # lease em dia
+    time.sleep(LEASE * 1.5)
+    stolen = b.claim("b")                 # "a" morreu: lease vencido
+    assert stolen is not None and stolen.url == task.url and stolen.attempts == 2
+    assert not a.renew(task, "a")         # "a" perdeu a tarefa
+    assert b.renew(stolen, "b")
+
+def test_renewed_lease_is_not_reclaimed(queue_path):
+    a, b = _worker(queue_path), _worker(queue_path)
+    task = a.claim("a")
+    for _ in range(4):                    # 4 x LEASE/2: passa do lease sem renovar
+        time.sleep(LEASE / 2)
+        assert a.renew(task, "a")
+        assert b.claim("b") is None
+    a.done(task)
+    assert not a.active()
+
+def test_task_fails_after_max_attempts(queue_path):
+    q = _worker(queue_path, max_attempts=2)
+    for _ in range(2):
+        task = q.claim("a")
+        q.fail(task, "HTTPError('503')")
+    assert q.claim("a") is None
+    assert q.counts() == {"failed": 1}
+    assert q.failures() == [("https://x/travel/page-1.html", "Travel", "HTTPError('503')")]
+
+def test_worker_renews_while_fetching_products(queue_path, tmp_path, monkeypatch):
+    thief = _worker(queue_path)
+    stolen = []
+
+    def slow_listing(category, url, on_product=None):
+        for _ in range(4):                # cada produto leva LEASE/2
+            time.sleep(LEASE / 2)
+            on_product()
+            stolen.append(thief.claim("thief"))
+        return [], None
+
+    monkeypatch.setattr(scrape_books, "scrape_listing_page", slow_listing)
+    assert scrape_books.crawl_worker(queue_path, tmp_path / "shards", owner="w1") == 1
+    assert stolen == [None] * 4
+
+def test_failed_pages_are_reported(queue_path, capsys):
+    q = _worker(queue_path, max_attempts=1)
+    q.fail(q.claim("a"), "ConnectionError()")
+    q.close()
+    assert scrape_books.report_failures(queue_path) == 1
+    out = capsys.readouterr().out
+    assert "https://x/travel/page-1.html" in out and "'Travel'" in out and "ConnectionError()" in out
+
+def test_report_without_queue_is_empty(tmp_path):
+    assert scrape_books.report_failures(tmp_path / "missing.sqlite") == 0
+
+def test_worker_logs_each_failure(queue_path, tmp_path, monkeypatch, capsys):
+    def broken_listing(category, url, on_product=None):
+        raise ConnectionError("reset by peer")
+
+    monkeypatch.setattr(scrape_books, "scrape_listing_page", broken_listing)
+    assert scrape_books.crawl_worker(queue_path, tmp_path / "shards", owner="w1") == 0
+    warnings = [l for l in capsys.readouterr().out.splitlines() if l.startswith("[AVISO] w1:")]
+    assert len(warnings) == 3   # max_attempts padrão
+    assert "https://x/travel/page-1.html" in warnings[0] and "reset by peer" in warnings[0]
+
+def test_each_page_gets_its_own_complete_shard(queue_path, tmp_path, monkeypatch):
+    def listing(category, url, on_product=None):
+        return [{"id": "b1", "book_title": "T"}, {"id": "b2", "book_title": "U"}], None
+
+    monkeypatch.setattr(scrape_books, "scrape_listing_page", listing)
+    shards = tmp_path / "shards"
+    scrape_books.crawl_worker(queue_path, shards, owner="w1")
+    assert [p.name for p in shards.iterdir()] == ["shard-w1-0000-00000.csv"]   # sem .tmp sobrando
+    frame = pd.read_csv(shards / "shard-w1-0000-00000.csv", dtype=str)
+    assert frame["_ord"].tolist() == ["0000-00000-000", "0000-00000-001"]
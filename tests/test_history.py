@@ -0,0 +1,23 @@
+# Leitura do histórico durante uma compactação: o cmp novo já está no lugar
+# e as entradas ainda não foram apagadas; nenhum evento pode aparecer duas vezes.
+import pandas as pd
+
+from services.api.utils.history import BookHistory
+
+def _events(ts_list, book="a"):
+    return pd.DataFrame({
+        "ts": ts_list, "id": [book] * len(ts_list), "price": [float(t) for t in ts_list],
+        "instock": pd.array([1] * len(ts_list), dtype="Int32"), "listed": [True] * len(ts_list),
+    })
+
+def test_compacted_file_and_its_inputs_are_not_double_counted(tmp_path):
+    events = tmp_path / "events"
+    events.mkdir()
+    for ts in (1, 2, 3):
+        _events([ts]).to_parquet(events / f"seg-{ts:010d}.parquet")
+    _events([1, 2, 3]).to_parquet(events / "cmp1-1-3.parquet")   # entradas ainda no disco
+
+    history = BookHistory(tmp_path, refresh_interval=0).refresh()
+    assert len(history.events) == 3
+    window = history.events.window("a", None, None)
+    assert window["price"].tolist() == [1.0, 2.0, 3.0]
@@ -0,0 +1,141 @@
+# WAL das predições: o que `submit` confirmou sobrevive a um crash do
+# processo antes do flush e é reaplicado pelo próximo sink.
+import os
+import subprocess
+import sys
+import textwrap
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from services.api.utils.predictions import (
+    PredictionIndex, PredictionSink, has_predictions, orphan_wals, validate_predictions,
+)
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+
+def _crash_after_submit(base_dir: Path, batches: list[list[tuple[str, float]]]) -> None:
+    """Outro processo grava no WAL e morre sem flush (os._exit, sem atexit)."""
+    code = textwrap.dedent(f"""
+        import os
+        import pandas as pd
+        from services.api.utils.predictions import PredictionSink
+        sink = PredictionSink({str(base_dir)!r}, flush_interval=3600)
+        for batch in {batches!r}:
+            ids, ys = zip(*batch)
+            sink.submit("m1", pd.DataFrame({{"id": list(ids), "y_pred": list(ys)}}))
+        os._exit(0)
+    """)
+    subprocess.run([sys.executable, "-c", code], cwd=REPO_ROOT, check=True, timeout=60)
+
+def _latest(base_dir: Path) -> dict[str, float]:
+    latest = PredictionIndex(base_dir / "model=m1", refresh_interval=0).refresh()
+    return dict(zip(latest["id"], latest["y_pred"]))
+
+def test_wal_of_crashed_process_is_replayed(tmp_path):
+    _crash_after_submit(tmp_path, [[("a", 1.0), ("b", 2.0)], [("a", 3.0)]])
+    assert orphan_wals(tmp_path)
+    assert not has_predictions(tmp_path / "model=m1")
+
+    sink = PredictionSink(tmp_path, flush_interval=3600)
+    try:
+        sink.flush()
+        # a predição mais recente de "a" vence a do primeiro lote
+        assert _latest(tmp_path) == {"a": 3.0, "b": 2.0}
+        # só resta o WAL do próprio sink; o do processo morto foi consumido
+        assert {w.stem.split("-")[1] for w in (tmp_path / "_wal").glob("wal-*.log")} == {str(os.getpid())}
+    finally:
+        sink.close()
+
+def test_truncated_last_wal_line_is_dropped(tmp_path):
+    _crash_after_submit(tmp_path, [[("a", 1.0)], [("b", 2.0)]])
+    (wal,) = (tmp_path / "_wal").glob("wal-*.log")
+    data = wal.read_bytes()
+    wal.write_bytes(data[:-10])   # crash no meio do append do segundo lote
+
+    sink = PredictionSink(tmp_path, flush_interval=3600)
+    try:
+        sink.flush()
+        assert _latest(tmp_path) == {"a": 1.0}
+    finally:
+        sink.close()
+
+def test_replayed_rows_survive_a_second_crash(tmp_path):
+    # o sink que reaplica regrava as linhas no próprio WAL antes do flush
+    _crash_after_submit(tmp_path, [[("a", 1.0)]])
+    sink = PredictionSink(tmp_path, flush_interval=3600)
+    sink._stopped = True        # simula o crash deste também: nada de flush
+    sink._thread.join(timeout=5)
+    sink._wal.close()
+
+    sink = PredictionSink(tmp_path, flush_interval=3600)
+    try:
+        sink.flush()
+        assert _latest(tmp_path) == {"a": 1.0}
+    finally:
+        sink.close()
+
+def test_live_submit_reaches_the_index(tmp_path):
+    sink = PredictionSink(tmp_path, flush_interval=3600)
+    try:
+        sink.submit("m1", pd.DataFrame({"id": ["x"], "y_pred": [0.5]}))
+        sink.flush()
+        assert has_predictions(tmp_path / "model=m1")
+        assert _latest(tmp_path) == {"x": 0.5}
+    finally:
+        sink.close()
+
+def test_orphan_with_a_reused_live_pid_is_replayed(tmp_path):
+    # depois de um restart, o pid do morto pode ser o de um processo vivo (aqui, o nosso)
+    _crash_after_submit(tmp_path, [[("a", 1.0)]])
+    (wal,) = (tmp_path / "_wal").glob("wal-*.log")
+    wal.rename(wal.with_name(f"wal-{os.getpid()}-0.log"))
+
+    sink = PredictionSink(tmp_path, flush_interval=3600)
+    try:
+        sink.flush()
+        assert _latest(tmp_path) == {"a": 1.0}
+    finally:
+        sink.close()
+
+def test_live_wal_is_not_claimed_by_another_sink(tmp_path):
+    owner = PredictionSink(tmp_path, flush_interval=3600)
+    try:
+        owner.submit("m1", pd.DataFrame({"id": ["a"], "y_pred": [1.0]}))
+        assert not orphan_wals(tmp_path)
+        other = PredictionSink(tmp_path / ".", flush_interval=3600)   # outro "worker"
+        other.close()
+        owner.flush()
+        assert _latest(tmp_path) == {"a": 1.0}
+    finally:
+        owner.close()
+    assert not list((tmp_path / "_wal").glob("wal-*"))
+
+def test_failed_flush_is_retried_on_the_next_flush(tmp_path, monkeypatch):
+    sink = PredictionSink(tmp_path, flush_interval=3600)
+    try:
+        sink.submit("m1", pd.DataFrame({"id": ["a"], "y_pred": [1.0]}))
+        real = sink._write_segment
+        monkeypatch.setattr(sink, "_write_segment", lambda *a: (_ for _ in ()).throw(OSError("disk full")))
+        with pytest.raises(OSError):
+            sink.flush()
+        assert len(list((tmp_path / "_wal").glob("wal-*.log"))) == 2   # selado + corrente
+        assert not orphan_wals(tmp_path)                                # ainda travados
+
+        monkeypatch.setattr(sink, "_write_segment", real)
+        sink.flush()
+        assert _latest(tmp_path) == {"a": 1.0}
+        assert len(list((tmp_path / "_wal").glob("wal-*.log"))) == 1
+    finally:
+        sink.close()
+
+def test_non_string_ids_are_rejected_per_row():
+    accepted, rejected, n_rejected = validate_predictions([
+        {"id": "a", "y_pred": 1}, {"id": ["x"], "y_pred": 1}, {"id": {"a": 1}, "y_pred": 2},
+        {"id": 7, "y_pred": 1}, {"id": " ", "y_pred": 1}, {"id": "b", "y_pred": "z"},
+    ])
+    assert accepted["id"].tolist() == ["a"]
+    assert n_rejected == 5
+    assert [r["reason"] for r in rejected] == [
+        "id não é string", "id não é string", "id não é string", "missing id", "y_pred não numérico"]
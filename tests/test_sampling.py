@@ -0,0 +1,64 @@
+# Split treino/teste determinístico: os dois lados são disjuntos e cobrem a
+# amostra, e a escolha depende só de (id, seed), não da ordem nem do tamanho.
+import numpy as np
+import pandas as pd
+import pytest
+
+from services.api.utils.sampling import Sampling, SamplingError, parse_sampling, select_rows
+
+def _frame(n=2000, seed=3):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "id": [f"book-{i}" for i in range(n)],
+        "category_idx": rng.integers(0, 7, size=n),
+        "target_high_rating": rng.integers(0, 2, size=n),
+    })
+
+def _ids(frame, spec):
+    return set(frame["id"][select_rows(frame, spec)])
+
+def _spec(split=None, sample=None, stratify=None, seed=0, test_size=0.2):
+    return Sampling(sample, split, test_size, stratify, seed)
+
+@pytest.mark.parametrize("stratify", [None, "category_idx", "target_high_rating"])
+@pytest.mark.parametrize("sample", [None, 0.5])
+def test_train_and_test_are_disjoint_and_cover_the_sample(stratify, sample):
+    df = _frame()
+    train = _ids(df, _spec("train", sample, stratify))
+    test = _ids(df, _spec("test", sample, stratify))
+    everything = _ids(df, _spec(None, sample, stratify)) if sample else set(df["id"])
+    assert train.isdisjoint(test)
+    assert train | test == everything
+    assert len(test) == pytest.approx(0.2 * len(everything), rel=0.1)
+
+def test_split_ignores_row_order():
+    df = _frame()
+    shuffled = df.sample(frac=1, random_state=1).reset_index(drop=True)
+    for split in ("train", "test"):
+        assert _ids(df, _spec(split, 0.7, seed=11)) == _ids(shuffled, _spec(split, 0.7, seed=11))
+
+def test_split_is_stable_as_the_dataset_grows():
+    # sem estratos, um livro não troca de lado quando outros entram
+    small, big = _frame(1000), _frame(3000)
+    assert _ids(small, _spec("test", seed=5)) == _ids(big, _spec("test", seed=5)) & set(small["id"])
+
+def test_seed_changes_the_split():
+    df = _frame()
+    assert _ids(df, _spec("test", seed=1)) != _ids(df, _spec("test", seed=2))
+
+def test_stratified_split_is_exact_per_stratum():
+    df = _frame()
+    test = select_rows(df, _spec("test", stratify="category_idx", test_size=0.25))
+    for _, group in df.assign(test=test).groupby("category_idx"):
+        assert group["test"].sum() == round(0.25 * len(group))
+
+@pytest.mark.parametrize("args", [
+    {"split": "valid"}, {"split": "test", "test_size": "1"}, {"sample": "0"},
+    {"sample": "x"}, {"split": "train", "seed": "a"}, {"split": "test", "stratify": "price"},
+])
+def test_invalid_parameters_are_rejected(args):
+    with pytest.raises(SamplingError):
+        parse_sampling(args)
+
+def test_no_selection_means_no_sampling():
+    assert parse_sampling({"seed": "3"}) is None
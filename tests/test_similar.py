@@ -0,0 +1,44 @@
+# Vizinhos com a categoria como código inteiro: o cosseno tem que ser o
+# mesmo da matriz com one-hot explícito.
+import numpy as np
+import pandas as pd
+
+from services.api.utils.similar import NUMERIC_COLS, TITLE_DIMS, WEIGHTS, SimilarityIndex
+
+def _features(n=60, seed=2):
+    rng = np.random.default_rng(seed)
+    words = np.array(["sea", "night", "house", "dark", "love", "war", "city"])
+    titles = pd.Series([" ".join(rng.choice(words, size=rng.integers(1, 4))) for _ in range(n)])
+    features = pd.DataFrame({
+        "id": [f"b{i}" for i in range(n)],
+        "price": rng.uniform(5, 60, n), "rating": rng.integers(1, 6, n).astype(float),
+        "title_len": titles.str.len().astype(float), "title_tok": titles.str.split().str.len().astype(float),
+        "category_idx": rng.integers(-1, 5, n),
+    })
+    return features, titles
+
+def _one_hot_cosine(index, features):
+    n_num = len(NUMERIC_COLS)
+    k = int(features["category_idx"].max()) + 1
+    one_hot = np.zeros((len(features), k))
+    rows = np.flatnonzero(features["category_idx"] >= 0)
+    one_hot[rows, features["category_idx"].to_numpy()[rows]] = WEIGHTS["category"]
+    full = np.hstack([index.dense[:, :n_num], one_hot, index.dense[:, n_num:]]).astype(np.float64)
+    full /= np.maximum(np.linalg.norm(full, axis=1, keepdims=True), 1e-12)
+    return full @ full.T
+
+def test_scores_match_explicit_one_hot():
+    features, titles = _features()
+    index = SimilarityIndex(features, titles)
+    assert index.dense.dtype == np.float32 and index.dense.shape[1] == len(NUMERIC_COLS) + TITLE_DIMS
+    expected = _one_hot_cosine(index, features)
+    for pos in range(len(features)):
+        np.testing.assert_allclose(index.scores(pos), expected[pos], atol=1e-5)
+
+def test_neighbours_exclude_self_and_same_id():
+    features, titles = _features()
+    features.loc[7, "id"] = "b3"
+    index = SimilarityIndex(features, titles)
+    top, scores = index.neighbours(3, 10)
+    assert 3 not in top and 7 not in top
+    assert list(scores) == sorted(scores, reverse=True)
@@ -0,0 +1,124 @@
+# Circuit breaker e cliente com retry: transições closed -> open ->
+# half-open -> closed/open com um relógio falso (nada de sleep real).
+import pytest
+import requests
+
+from services.scraper.src.extractors import throttle
+from services.scraper.src.extractors.throttle import (
+    AIMDRate, CircuitBreaker, CircuitOpenError, ThrottledClient,
+)
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+@pytest.fixture
+def clock(monkeypatch):
+    c = FakeClock()
+    monkeypatch.setattr(throttle, "time", c)
+    return c
+
+def _fail(breaker, n):
+    for _ in range(n):
+        breaker.on_failure()
+
+def test_opens_after_threshold_then_half_opens_after_cooldown(clock):
+    b = CircuitBreaker(failure_threshold=3, cooldown=10)
+    _fail(b, 2)
+    assert b.state == "closed"
+    _fail(b, 1)
+    assert b.state == "open"
+    clock.now += 9.9
+    assert b.state == "open"
+    clock.now += 0.1
+    assert b.state == "half-open"
+
+def test_before_request_waits_out_the_cooldown(clock):
+    b = CircuitBreaker(failure_threshold=1, cooldown=10)
+    _fail(b, 1)
+    clock.now += 4
+    b.before_request(clock.sleep)
+    assert clock.slept == [6]
+    assert b.state == "half-open"
+    b.before_request(clock.sleep)          # a sonda passa sem esperar
+    assert clock.slept == [6]
+
+def test_probe_success_closes_the_circuit(clock):
+    b = CircuitBreaker(failure_threshold=2, cooldown=10)
+    _fail(b, 2)
+    clock.now += 10
+    b.on_success()
+    assert b.state == "closed" and b.trips == 0 and b.failures == 0
+    _fail(b, 1)
+    assert b.state == "closed"             # o limiar recomeça do zero
+
+def test_probe_failure_reopens_with_longer_cooldown(clock):
+    b = CircuitBreaker(failure_threshold=2, cooldown=10, max_cooldown=25)
+    _fail(b, 2)
+    assert b.open_until == clock.now + 10
+    clock.now += 10
+    _fail(b, 1)                            # sonda falhou
+    assert b.state == "open" and b.trips == 2
+    assert b.open_until == clock.now + 20
+    clock.now += 20
+    _fail(b, 1)
+    assert b.open_until == clock.now + 25  # limitado por max_cooldown
+
+def test_gives_up_after_max_trips(clock):
+    b = CircuitBreaker(failure_threshold=1, cooldown=1, max_trips=2)
+    _fail(b, 2)
+    with pytest.raises(CircuitOpenError):
+        _fail(b, 1)
+
+class FakeSession:
+    def __init__(self, clock, statuses):
+        self.clock, self.statuses, self.calls = clock, list(statuses), 0
+
+    def get(self, url, **kwargs):
+        self.calls += 1
+        r = requests.Response()
+        r.status_code = self.statuses.pop(0)
+        if r.status_code == 429:
+            r.headers["Retry-After"] = "7"
+        return r
+
+def _client(clock, statuses, **kw):
+    kw.setdefault("breaker", CircuitBreaker(failure_threshold=3, cooldown=10))
+    return ThrottledClient(FakeSession(clock, statuses), rate=AIMDRate(initial=1000),
+                           backoff_base=0.01, sleep=clock.sleep, **kw)
+
+def test_client_retries_until_success_and_closes(clock):
+    c = _client(clock, [503, 503, 200])
+    assert c.get("u").status_code == 200
+    assert c.stats.retries == 2 and c.breaker.state == "closed"
+
+def test_client_honours_retry_after(clock):
+    c = _client(clock, [429, 200])
+    assert c.get("u").status_code == 200
+    assert max(clock.slept) >= 7
+
+def test_client_trips_the_breaker_and_probes_after_cooldown(clock):
+    c = _client(clock, [503, 503, 503, 200], max_retries=5)
+    assert c.get("u").status_code == 200
+    assert c.stats.circuit_trips == 1
+    assert any(s >= 9 for s in clock.slept)   # esperou o cooldown antes da sonda
+    assert c.breaker.state == "closed"
+
+def test_client_does_not_retry_client_errors(clock):
+    c = _client(clock, [404])
+    assert c.get("u").status_code == 404
+    assert c.session.calls == 1 and c.stats.retries == 0
+
+def test_client_returns_last_response_when_retries_run_out(clock):
+    c = _client(clock, [503, 503], max_retries=1,
+                breaker=CircuitBreaker(failure_threshold=10))
+    assert c.get("u").status_code == 503
+    assert c.session.calls == 2